@@ -0,0 +1,389 @@
+"""
+Command line tools for building the stack templates, e.g.::
+
+    USE_ECS=on python -m stack render >ecs.yaml
+    python -m stack build-all --output-dir content
+    python -m stack build-environments ecs-nat environments/ --output-dir content/environments
+    python -m stack build-config ecs-lean.toml --output-dir content
+    python -m stack benchmark --output benchmark.json
+    python -m stack sizes ecs-nat
+    python -m stack critical-path ecs-nat
+    python -m stack changes old-content content
+    python -m stack validate ecs-nat environments/
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from .build import (
+    OUTPUT_FORMATS,
+    VARIANTS,
+    build_all,
+    build_environments,
+    build_template,
+    formats_from_environ,
+    render_from_environ
+)
+from .build_cache import TemplateCache
+from .changes import IMPACTS
+from .minify import strip_from_environ
+from .specialize import specialize, values_from_environ
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m stack")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    subparsers.add_parser(
+        "render",
+        help="Build the template selected by the USE_* environment variables and write it to standard output "
+             "(see also OUTPUT_FORMAT, DEFAULTS_FILE, MINIFY, SPECIALIZE and STACK_PROFILE).",
+    )
+
+    build_all_parser = subparsers.add_parser(
+        "build-all",
+        help="Build all (or the given) template variants in a single process.",
+    )
+    build_all_parser.add_argument(
+        "variants",
+        nargs="*",
+        metavar="VARIANT",
+        help="Variant(s) to build (default: all). Choices: %s" % ", ".join(VARIANTS),
+    )
+    build_all_parser.add_argument(
+        "--output-dir",
+        default="content",
+        help="Directory in which to write <variant>.<format> (default: content)",
+    )
+    build_all_parser.add_argument(
+        "--format",
+        dest="formats",
+        action="append",
+        choices=OUTPUT_FORMATS,
+        help="Format to write each variant in; may be given more than once to write several "
+             "formats from a single build (default: OUTPUT_FORMAT, or yaml)",
+    )
+    build_all_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes to build variants in (default: 1; 0 for one per CPU)",
+    )
+    build_all_parser.add_argument(
+        "--cache-dir",
+        help="Reuse previously built templates stored in (and store new ones in) this directory",
+    )
+    build_all_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only rebuild the variants that import a stack module that changed since they were "
+             "last built (uses --cache-dir, or .build-cache by default)",
+    )
+    build_all_parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="Identify the build in the template header by a hash of its sources rather than the "
+             "current time (SOURCE_DATE_EPOCH, if set, takes precedence)",
+    )
+
+    environments_parser = subparsers.add_parser(
+        "build-environments",
+        help="Build a template variant once and write a parameters file (and optionally a specialized "
+             "template) for each defaults file in a directory.",
+    )
+    environments_parser.add_argument("variant", choices=VARIANTS, metavar="VARIANT", help="Variant to build")
+    environments_parser.add_argument("defaults_dir", help="Directory of defaults files (<environment>.json)")
+    environments_parser.add_argument(
+        "--output-dir",
+        default="content",
+        help="Directory in which to write <environment>.parameters.json (default: content)",
+    )
+    environments_parser.add_argument(
+        "--specialize",
+        action="store_true",
+        help="Also write <environment>.<format>, the template specialized for each environment's values",
+    )
+    environments_parser.add_argument(
+        "--format",
+        dest="formats",
+        action="append",
+        choices=OUTPUT_FORMATS,
+        help="Format to write the specialized templates in; may be given more than once "
+             "(default: OUTPUT_FORMAT, or yaml)",
+    )
+    environments_parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="Identify the build in the template header by a hash of its sources rather than the current time",
+    )
+
+    config_parser = subparsers.add_parser(
+        "build-config",
+        help="Build templates composed of the components listed in configuration files (TOML or YAML).",
+    )
+    config_parser.add_argument("configs", nargs="+", metavar="CONFIG", help="Configuration file(s)")
+    config_parser.add_argument(
+        "--output-dir",
+        default="content",
+        help="Directory in which to write <config name>.<format> (default: content)",
+    )
+    config_parser.add_argument(
+        "--format",
+        dest="formats",
+        action="append",
+        choices=OUTPUT_FORMATS,
+        help="Format to write each template in; may be given more than once (default: OUTPUT_FORMAT, or yaml)",
+    )
+    config_parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="Identify the build in the template header by a hash of its sources rather than the current time",
+    )
+
+    benchmark_parser = subparsers.add_parser(
+        "benchmark",
+        help="Measure the time and memory used to generate each template variant.",
+    )
+    benchmark_parser.add_argument(
+        "variants",
+        nargs="*",
+        metavar="VARIANT",
+        help="Variant(s) to measure (default: all)",
+    )
+    benchmark_parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of times to build each variant; the best result is reported (default: 3)",
+    )
+    benchmark_parser.add_argument(
+        "--output",
+        help="File to write the results to as JSON (default: standard output)",
+    )
+    benchmark_parser.add_argument(
+        "--compare",
+        metavar="JSON_FILE",
+        help="Results of an earlier run to compare with",
+    )
+    # Used internally to measure a single variant in a fresh process
+    benchmark_parser.add_argument("--worker", help=argparse.SUPPRESS)
+
+    sizes_parser = subparsers.add_parser(
+        "sizes",
+        help="Break the size of each template variant down by the stack module that added each part.",
+    )
+    sizes_parser.add_argument(
+        "variants",
+        nargs="*",
+        metavar="VARIANT",
+        help="Variant(s) to report on (default: all)",
+    )
+    sizes_parser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="Number of the largest items and repeated subexpressions to list (default: 10)",
+    )
+
+    critical_path_parser = subparsers.add_parser(
+        "critical-path",
+        help="Estimate the time to create a stack and report the longest chain of resource dependencies.",
+    )
+    critical_path_parser.add_argument(
+        "templates",
+        nargs="*",
+        metavar="TEMPLATE",
+        help="Template file(s) (JSON or YAML) or variant(s) to analyze (default: all variants)",
+    )
+
+    changes_parser = subparsers.add_parser(
+        "changes",
+        help="Predict whether deploying new builds of templates updates, interrupts or replaces each resource.",
+    )
+    changes_parser.add_argument("old", help="Previously deployed template, or directory of templates")
+    changes_parser.add_argument("new", help="New template, or directory of templates with the same names")
+    changes_parser.add_argument(
+        "--fail-on",
+        choices=IMPACTS,
+        help="Exit with status 1 if any resource change has at least this impact (removing a resource "
+             "counts as a replacement)",
+    )
+
+    update_spec_parser = subparsers.add_parser(
+        "update-resource-spec",
+        help="Update the trimmed CloudFormation resource specification used by the changes command.",
+    )
+    update_spec_parser.add_argument("spec", help="CloudFormationResourceSpecification.json, as published by AWS")
+
+    validate_parser = subparsers.add_parser(
+        "validate",
+        help="Check defaults or parameters files against the constraints on a template's parameters.",
+    )
+    validate_parser.add_argument("template", help="Variant, or template file (JSON or YAML), to validate against")
+    validate_parser.add_argument(
+        "files",
+        nargs="+",
+        metavar="FILE",
+        help="Defaults or parameters file(s) to validate, or directories of them (*.json)",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "render":
+        try:
+            render_from_environ()
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.command == "build-all":
+        if args.incremental and not args.cache_dir:
+            args.cache_dir = ".build-cache"
+        try:
+            build_all(
+                args.output_dir,
+                args.variants,
+                jobs=args.jobs or os.cpu_count(),
+                cache=TemplateCache(args.cache_dir) if args.cache_dir else None,
+                reproducible=args.reproducible,
+                formats=args.formats or formats_from_environ(),
+            )
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.command == "build-environments":
+        try:
+            build_environments(
+                args.variant,
+                args.defaults_dir,
+                args.output_dir,
+                specialized=args.specialize,
+                formats=args.formats or formats_from_environ(),
+                reproducible=args.reproducible,
+            )
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    elif args.command == "build-config":
+        # Each command's modules are imported by the command, so that render
+        # doesn't pay for them
+        from . import config
+        try:
+            config.build_configs(
+                args.configs,
+                args.output_dir,
+                formats=args.formats or formats_from_environ(),
+                reproducible=args.reproducible,
+            )
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    elif args.command == "benchmark":
+        from . import benchmark
+        if args.worker:
+            json.dump(benchmark.measure(VARIANTS[args.worker]), sys.stdout)
+            return 0
+        unknown = [v for v in args.variants if v not in VARIANTS]
+        if unknown:
+            parser.error("Unknown variant(s): %s" % ", ".join(unknown))
+        baseline = None
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+        results = benchmark.run_benchmarks(args.variants, repeat=args.repeat)
+        sys.stderr.write(benchmark.format_table(results, baseline))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+        else:
+            json.dump(results, sys.stdout, indent=2, sort_keys=True)
+            sys.stdout.write("\n")
+    elif args.command == "sizes":
+        from . import sizes
+        unknown = [v for v in args.variants if v not in VARIANTS]
+        if unknown:
+            parser.error("Unknown variant(s): %s" % ", ".join(unknown))
+        for variant in args.variants or VARIANTS:
+            template = build_template(VARIANTS[variant])
+            items, total_bytes, repeated = sizes.measure(template, strip_from_environ(), values_from_environ())
+            sys.stdout.write("%s: %d bytes\n\n" % (variant, total_bytes))
+            sys.stdout.write(sizes.format_report(items, total_bytes, repeated, top=args.top))
+            sys.stdout.write("\n")
+    elif args.command == "critical-path":
+        from . import critical_path
+        unknown = [t for t in args.templates if t not in VARIANTS and not os.path.isfile(t)]
+        if unknown:
+            parser.error("Unknown variant(s) or missing file(s): %s" % ", ".join(unknown))
+        for name in args.templates or VARIANTS:
+            if name in VARIANTS:
+                data = build_template(VARIANTS[name]).to_dict()
+                constants = values_from_environ()
+                if constants is not None:
+                    data = specialize(data, constants)[0]
+            else:
+                data = critical_path.load_template(name)
+            sys.stdout.write("%s: " % name)
+            sys.stdout.write(critical_path.format_report(critical_path.analyze(data)))
+            sys.stdout.write("\n")
+    elif args.command == "changes":
+        from . import changes, critical_path
+        if os.path.isdir(args.old) != os.path.isdir(args.new):
+            parser.error("Compare two template files or two directories")
+        spec = changes.load_spec()
+        status = 0
+        for label, old, new in changes.template_pairs(args.old, args.new):
+            result = changes.compare(
+                critical_path.load_template(old), critical_path.load_template(new), spec
+            )
+            sys.stdout.write("%s: %s" % (label, changes.format_report(result)))
+            impacts = [impact for _, _, impact, _ in result["changed"]] + ["replacement"] * len(result["removed"])
+            if args.fail_on and impacts and changes.IMPACTS.index(changes.worst(impacts)) >= \
+                    changes.IMPACTS.index(args.fail_on):
+                status = 1
+        return status
+    elif args.command == "validate":
+        from . import critical_path, validate
+        if args.template in VARIANTS:
+            data = build_template(VARIANTS[args.template]).to_dict()
+        elif os.path.isfile(args.template):
+            data = critical_path.load_template(args.template)
+        else:
+            parser.error("Unknown variant or missing file: %s" % args.template)
+        validator = validate.ParameterValidator(data)
+        paths = []
+        for path in args.files:
+            if os.path.isdir(path):
+                paths.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(".json"))
+            else:
+                paths.append(path)
+        invalid = 0
+        for path in paths:
+            values, strict = validate.read_values(path)
+            errors = validator.validate(values, strict)
+            if errors:
+                invalid += 1
+                sys.stdout.write(validate.format_errors(path, errors))
+        sys.stderr.write("Validated %d file(s): %d invalid\n" % (len(paths), invalid))
+        return 1 if invalid else 0
+    elif args.command == "update-resource-spec":
+        from . import changes
+        with open(args.spec) as f:
+            spec = json.load(f)
+        resource_types = set()
+        # also the optional ALB mode for ECS, which isn't published as a variant
+        for flags in list(VARIANTS.values()) + [VARIANTS["ecs-nat"] + ["USE_ALB"]]:
+            resources = build_template(flags).to_dict()["Resources"]
+            resource_types.update(resource["Type"] for resource in resources.values())
+        try:
+            trimmed = changes.trim_spec(spec, resource_types)
+        except ValueError as e:
+            parser.error(str(e))
+        with open(changes.SPEC_PATH, "w") as f:
+            json.dump(trimmed, f, indent=2, sort_keys=True)
+            f.write("\n")
+        sys.stderr.write("Wrote %d resource types from resource specification version %s to %s\n" % (
+            len(trimmed["ResourceTypes"]), trimmed["ResourceSpecificationVersion"], changes.SPEC_PATH
+        ))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
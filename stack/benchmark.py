@@ -0,0 +1,224 @@
+"""
+Benchmark template generation for each of the build-all variants.
+
+Each variant is built in a fresh Python process (so that import costs and peak
+memory use are measured for that variant alone), which reports:
+
+* import_seconds: time spent importing troposphere, awacs and the stack
+  modules, including the troposphere and awacs modules that are only imported
+  when the template is first built (see lazy.py). It's measured in another
+  fresh process that only imports the variant's stack modules and builds it
+  (minus construction_seconds), as this one has already imported some of the
+  same modules (e.g., cfn-flip) for the build tooling.
+* construction_seconds: time spent creating the troposphere objects and
+  adding them to the template (a second build, once everything is imported)
+* to_dict_seconds: time spent in InterfaceTemplate.to_dict()
+* to_yaml_seconds: time spent in InterfaceTemplate.to_yaml(), which calls
+  to_dict() and then converts the result to YAML with cfn-flip
+* to_json_seconds: time spent calling to_dict() and rendering the result as
+  compact JSON (OUTPUT_FORMAT=json), without cfn-flip
+* peak_rss_bytes: the peak resident set size of the process
+* resources and yaml_bytes: the size of the generated template
+
+Results are written as JSON and can be compared with those of an earlier run.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from .build import FLAGS, VARIANTS, build_template, render_json
+from .build_cache import DEPENDENCIES, STACK_DIR, package_version
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Metrics reported for each run, in the order they're displayed
+METRICS = [
+    "import_seconds",
+    "construction_seconds",
+    "to_dict_seconds",
+    "to_yaml_seconds",
+    "to_json_seconds",
+    "peak_rss_bytes",
+    "resources",
+    "yaml_bytes",
+]
+
+
+def peak_rss():
+    """
+    Return the peak resident set size of this process, in bytes (or None if
+    it's unknown on this platform).
+    """
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def python_environ(flags=None):
+    """
+    Return the environment for a Python process that can import this package,
+    with the given USE_* flags (if any) turned on and the others off.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.dirname(STACK_DIR), env.get("PYTHONPATH")]))
+    if flags is not None:
+        for flag in FLAGS:
+            env.pop(flag, None)
+        env.update((flag, "on") for flag in flags)
+    return env
+
+
+def import_and_build_seconds(flags, modules):
+    """
+    Return the time a fresh Python process takes to import the given stack
+    modules and build the template for the given USE_* flags, not counting the
+    time it takes to import the build tooling.
+    """
+    package = os.path.basename(STACK_DIR)
+    code = "\n".join([
+        "import importlib, time",
+        "start = time.perf_counter()",
+        "for name in %r:" % (["%s.template" % package, "%s.utils" % package] + modules),
+        "    importlib.import_module(name)",
+        "seconds = time.perf_counter() - start",
+        "from %s.build import build_template" % package,
+        "start = time.perf_counter()",
+        "build_template(%r)" % list(flags),
+        "print(seconds + time.perf_counter() - start)",
+    ])
+    # read from stdin rather than run with -c, which would also render the template
+    # (see stack/__init__.py)
+    output = subprocess.check_output([sys.executable, "-"], input=code.encode(), env=python_environ(flags))
+    return float(output.decode())
+
+
+def measure(flags):
+    """
+    Build the template for the given USE_* flags in this process and return a
+    dictionary of METRICS. Only meaningful in a fresh process.
+    """
+    build_template(flags)
+
+    start = time.perf_counter()
+    template = build_template(flags)
+    construction = time.perf_counter() - start
+
+    start = time.perf_counter()
+    template.to_dict()
+    to_dict = time.perf_counter() - start
+
+    start = time.perf_counter()
+    yaml = template.to_yaml()
+    to_yaml = time.perf_counter() - start
+
+    start = time.perf_counter()
+    render_json(template.to_dict())
+    to_json = time.perf_counter() - start
+
+    return {
+        "import_seconds": max(import_and_build_seconds(flags, template.modules) - construction, 0.0),
+        "construction_seconds": construction,
+        "to_dict_seconds": to_dict,
+        "to_yaml_seconds": to_yaml,
+        "to_json_seconds": to_json,
+        "peak_rss_bytes": peak_rss(),
+        "resources": len(template.resources),
+        "yaml_bytes": len(yaml.encode()),
+    }
+
+
+def measure_in_subprocess(variant):
+    """
+    Run measure() for the named variant in a fresh Python process.
+    """
+    output = subprocess.check_output(
+        [sys.executable, "-m", "stack", "benchmark", "--worker", variant],
+        env=python_environ(),
+    )
+    return json.loads(output.decode())
+
+
+def summarize(runs):
+    """
+    Combine several runs of the same variant: the fastest time and the largest
+    peak memory use.
+    """
+    summary = {}
+    for metric in METRICS:
+        values = [run[metric] for run in runs if run[metric] is not None]
+        if not values:
+            summary[metric] = None
+        elif metric == "peak_rss_bytes":
+            summary[metric] = max(values)
+        else:
+            summary[metric] = min(values)
+    return summary
+
+
+def run_benchmarks(variants=None, repeat=1, stream=None):
+    """
+    Measure each of the given variants (all of VARIANTS by default) repeat
+    times and return the results as a JSON-serializable dictionary.
+    """
+    stream = stream or sys.stderr
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dependencies": dict((name, package_version(name)) for name in DEPENDENCIES),
+        "defaults_file": os.environ.get("DEFAULTS_FILE"),
+        "repeat": repeat,
+        "variants": {},
+    }
+    for variant in variants or VARIANTS:
+        runs = []
+        for i in range(repeat):
+            runs.append(measure_in_subprocess(variant))
+            stream.write(".")
+            stream.flush()
+        results["variants"][variant] = {"runs": runs, "best": summarize(runs)}
+    stream.write("\n")
+    return results
+
+
+def format_value(metric, value):
+    if value is None:
+        return "-"
+    if metric.endswith("_seconds"):
+        return "%.1fms" % (value * 1000)
+    if metric.endswith("_bytes"):
+        return "%.1fK" % (value / 1024.0)
+    return str(value)
+
+
+def format_table(results, baseline=None):
+    """
+    Return a text table of the best result for each variant, including the
+    percentage change from the baseline results (if given) for each variant
+    in both.
+    """
+    headers = ["variant"] + METRICS
+    rows = []
+    for variant, result in results["variants"].items():
+        before = (baseline or {}).get("variants", {}).get(variant, {}).get("best", {})
+        row = [variant]
+        for metric in METRICS:
+            value = result["best"][metric]
+            cell = format_value(metric, value)
+            if before.get(metric) and value is not None:
+                cell += " (%+.0f%%)" % ((value - before[metric]) * 100.0 / before[metric])
+            row.append(cell)
+        rows.append(row)
+    widths = [max(len(str(row[i])) for row in [headers] + rows) for i in range(len(headers))]
+    lines = []
+    for row in [headers] + rows:
+        lines.append("  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)).rstrip())
+    return "\n".join(lines) + "\n"
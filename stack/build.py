@@ -0,0 +1,583 @@
+"""
+Build one or more stack template variants in the current Python process.
+
+Each stack module has an add_<name>() function that adds its part of the stack
+(parameters, resources, etc.) to a template, choosing what to add based on the
+USE_* flags it's built for (see StackBuild). build_template() calls them for
+the chosen components into a new template, so any number of variants can be
+built in the same process, one after another or at the same time.
+"""
+
+import datetime
+import importlib
+import json
+import os
+import sys
+from collections import OrderedDict
+from contextlib import ExitStack
+from functools import partial
+from operator import itemgetter
+
+import cfn_flip
+
+from .minify import minify, size_report, strip_from_environ
+from .specialize import specialize, specialize_report, values_from_environ
+from .template import new_template
+from .utils import ParameterWithDefaults, parameter_defaults
+
+FLAGS = [
+    "USE_ALB",
+    "USE_CLOUDFRONT",
+    "USE_DOKKU",
+    "USE_EB",
+    "USE_EC2",
+    "USE_ECS",
+    "USE_EKS",
+    "USE_GOVCLOUD",
+    "USE_NAT_GATEWAY",
+]
+
+# The templates published by `make templates`, keyed by output file name (sans .yaml)
+VARIANTS = OrderedDict([
+    ("ec2-no-nat", ["USE_EC2"]),
+    ("ec2-nat", ["USE_EC2", "USE_NAT_GATEWAY"]),
+    ("eb-no-nat", ["USE_EB"]),
+    ("eb-nat", ["USE_EB", "USE_NAT_GATEWAY"]),
+    ("ecs-no-nat", ["USE_ECS"]),
+    ("ecs-nat", ["USE_ECS", "USE_NAT_GATEWAY"]),
+    ("eks-no-nat", ["USE_EKS"]),
+    ("eks-nat", ["USE_EKS", "USE_NAT_GATEWAY"]),
+    ("dokku-no-nat", ["USE_DOKKU"]),
+    # dokku-nat is disabled; need to SSH to instance to deploy
+    ("gc-no-nat", ["USE_GOVCLOUD"]),
+    ("gc-nat", ["USE_GOVCLOUD", "USE_NAT_GATEWAY"]),
+    ("cloudfront", ["USE_CLOUDFRONT"]),
+])
+
+# The formats templates can be rendered in, which are also their file extensions
+OUTPUT_FORMATS = ["yaml", "json"]
+
+# The stack modules that each add a part of the stack to the template (see build_template())
+COMPONENTS = [
+    "assets",
+    "bastion",
+    "cache",
+    "cdn",
+    "database",
+    "dokku",
+    "eb",
+    "ecs_cluster",
+    "eks",
+    "instances",
+    "logs",
+    "repository",
+    "search",
+    "sftp",
+    "vpc",
+]
+
+# Settings (besides the USE_* flags) that affect a template, listed in its YAML header
+HEADER_SETTINGS = ["DEFAULTS_FILE", "MINIFY", "SPECIALIZE"]
+
+# Modules that every build depends on, in addition to the stack modules whose parts it
+# adds: those that the stack modules use, and those that affect the output (e.g.,
+# template.py folds constants with optimize.py, and render() minifies and specializes),
+# so that changing them invalidates cached templates and reproducible stamps
+_build_modules = [
+    __name__,
+    __package__ + ".constants",
+    __package__ + ".lazy",
+    __package__ + ".minify",
+    __package__ + ".optimize",
+    __package__ + ".specialize",
+    __package__ + ".template",
+    __package__ + ".utils",
+]
+
+
+def flags_from_environ(environ=os.environ):
+    """
+    Return the list of USE_* flags turned "on" in the given environment.
+    """
+    return [flag for flag in FLAGS if environ.get(flag) == "on"]
+
+
+def formats_from_environ(environ=os.environ):
+    """
+    Return the list of output formats named (comma-separated) by OUTPUT_FORMAT in
+    the given environment; ["yaml"] by default.
+    """
+    formats = [fmt.strip().lower() for fmt in environ.get("OUTPUT_FORMAT", "yaml").split(",") if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in OUTPUT_FORMATS]
+    if unknown:
+        raise ValueError("Unknown OUTPUT_FORMAT(s): %s (choices: %s)" % (", ".join(unknown), ", ".join(OUTPUT_FORMATS)))
+    return formats or ["yaml"]
+
+
+def components_for_flags(flags):
+    """
+    Return the names of the stack modules (see COMPONENTS) that make up the
+    template for the given list of USE_* flags, in the order they're imported.
+    """
+    if "USE_CLOUDFRONT" in flags:
+        return ["cdn"]
+    if "USE_EKS" in flags:
+        components = ["assets", "cache", "database", "eks", "logs", "repository", "sftp", "vpc"]
+    else:
+        components = ["assets", "cache", "database", "logs", "sftp", "vpc"]
+    if "USE_GOVCLOUD" not in flags:
+        # make sure this isn't added to the template for GovCloud, as it's not
+        # supported in this region
+        components.append("search")
+    if "USE_NAT_GATEWAY" in flags:
+        components.append("bastion")
+    if "USE_EKS" not in flags:
+        if "USE_ECS" in flags:
+            components += ["ecs_cluster", "repository"]
+        elif "USE_EB" in flags:
+            components += ["eb", "repository"]
+        elif "USE_DOKKU" in flags:
+            components.append("dokku")
+        elif "USE_EC2" in flags or "USE_GOVCLOUD" in flags:
+            # USE_GOVCLOUD and USE_EC2 both provide EC2 instances
+            components.append("instances")
+    return components
+
+
+class StackBuild(object):
+    """
+    One build of a template: the template that the stack modules add their
+    parts to, the USE_* flags and components it's built for, the parameter
+    defaults to use, and the parts added so far.
+
+    Each stack module's add_<name>(build) function adds its part to
+    build.template and returns a dictionary of the values in it (parameters,
+    resources, conditions, etc.) that other modules refer to, if any. Modules
+    get those values with get(), which adds the other module's part first if it
+    hasn't been added yet, so every part is added once, in the order it's first
+    needed.
+    """
+
+    # The profiling.ModuleProfiler timing each part, while one is active (see
+    # profiling.profile_modules())
+    profiler = None
+
+    def __init__(self, template, flags=(), components=(), defaults=None):
+        self.template = template
+        self.flags = frozenset(flags)
+        self.components = list(components)
+        self.defaults = parameter_defaults if defaults is None else defaults
+        # the stack modules use this in place of troposphere's Parameter
+        self.Parameter = partial(ParameterWithDefaults, defaults=self.defaults)
+        # {module name: the values its add_<name>() returned}
+        self.parts = OrderedDict()
+
+    def add(self, name):
+        """
+        Add the named stack module's part to the template, unless it's already
+        been added, and return its values.
+        """
+        if name not in self.parts:
+            module = importlib.import_module("%s.%s" % (__package__, name))
+            self.template.modules.append(module.__name__)
+            profiler = self.profiler
+            if profiler is not None:
+                profiler.enter(module.__name__)
+            try:
+                self.parts[name] = getattr(module, "add_%s" % name)(self)
+            finally:
+                if profiler is not None:
+                    profiler.exit(module.__name__)
+        return self.parts[name]
+
+    def get(self, name, *values):
+        """
+        Return the named value from the named stack module's part, or a tuple
+        of them if more than one is named (as operator.itemgetter() does),
+        adding the part first if necessary (see add()).
+        """
+        return itemgetter(*values)(self.add(name))
+
+
+def build_template(flags=(), components=None, defaults=None, template=None):
+    """
+    Build and return an InterfaceTemplate for the given list of USE_* flags,
+    e.g., ["USE_ECS", "USE_NAT_GATEWAY"].
+
+    components lists the stack modules (see COMPONENTS) to build it from, by
+    default those that make up the variant for the flags (see
+    components_for_flags()). The parts of the modules they depend on, such as
+    vpc.py, are added too, and tags.py tags all of the resources last (see
+    StackBuild). defaults, if given, is a {parameter: default} dictionary that
+    replaces the defaults in DEFAULTS_FILE (see utils.py). The parts are added
+    to the given template, or to a new one (see template.new_template()).
+
+    Nothing is shared between builds, so templates can be built one after
+    another, or in several threads at once, in the same process.
+    """
+    unknown = set(flags) - set(FLAGS)
+    if unknown:
+        raise ValueError("Unknown flag(s): %s" % ", ".join(sorted(unknown)))
+    components = components_for_flags(flags) if components is None else list(components)
+    unknown = set(components) - set(COMPONENTS)
+    if unknown:
+        raise ValueError("Unknown component(s): %s (choices: %s)" % (
+            ", ".join(sorted(unknown)), ", ".join(COMPONENTS)
+        ))
+    build = StackBuild(new_template() if template is None else template, flags, components, defaults)
+    for name in components:
+        build.add(name)
+    # last, to tag all of the resources
+    build.add("tags")
+    return build.template
+
+
+def template_modules(template):
+    """
+    Return the names of the stack modules that a template from build_template()
+    was built from, and those that render it (see _build_modules).
+    """
+    return sorted(set(_build_modules) | set(template.modules))
+
+
+def build_stamp(reproducible=False, modules=None, environ=os.environ):
+    """
+    Return the "at <time>" text that identifies a build in the template header.
+
+    If SOURCE_DATE_EPOCH is set in the environment (see
+    https://reproducible-builds.org/specs/source-date-epoch/), it's used instead
+    of the current time. Otherwise, if reproducible is True, the header
+    identifies the build by a hash of the given stack modules' sources (all of
+    them by default; see build_cache.source_digest()) instead, so that identical
+    inputs always produce identical output.
+    """
+    if environ.get("SOURCE_DATE_EPOCH"):
+        epoch = int(environ["SOURCE_DATE_EPOCH"])
+        return "at %s" % datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc)
+    if reproducible:
+        # imported here because hashing is slow to import and only needed for
+        # reproducible builds
+        from .build_cache import source_digest
+        return "from sources with digest %s" % source_digest(modules)
+    return "at %s" % datetime.datetime.now()
+
+
+def dict_to_yaml(data):
+    """
+    Convert a template dictionary (as returned by to_dict()) to YAML. The result
+    is the same as that of Template.to_yaml(), which calls to_dict() itself.
+    """
+    return cfn_flip.to_yaml(json.dumps(data, sort_keys=True))
+
+
+def render_yaml(template, parameters, stamp=None, data=None):
+    """
+    Return the template as YAML, prefixed with a comment header listing the given
+    parameters (a dictionary of the USE_* and DEFAULTS_FILE settings used) and
+    the build stamp (see build_stamp(); the current time by default). data, if
+    given, is the result of template.to_dict(), to avoid computing it again.
+
+    The template's keys are sorted before it's converted to YAML, so the output
+    depends only on the template's contents.
+    """
+    # Since we're outputting YAML, we can include comments
+    lines = [
+        "# This Cloudformation stack template was generated by",
+        "# https://github.com/caktus/aws-web-stacks",
+        "# %s" % (stamp or build_stamp()),
+        "# with parameters:",
+    ]
+    for parm in sorted(parameters):
+        lines.append("#\t%s = %s" % (parm, parameters[parm]))
+    lines.append("")
+    lines.append(dict_to_yaml(template.to_dict() if data is None else data))
+    return "\n".join(lines) + "\n"
+
+
+def dump_json(data, stream):
+    """
+    Write a template dictionary (as returned by to_dict()) to stream as compact
+    JSON with sorted keys, without converting it to YAML first. JSON can't hold
+    the comment header that YAML templates have, so the output depends only on
+    the template's contents.
+    """
+    json.dump(data, stream, sort_keys=True, separators=(",", ":"))
+    stream.write("\n")
+
+
+def render_json(data):
+    """
+    Return a template dictionary as JSON, as written by dump_json().
+    """
+    return json.dumps(data, sort_keys=True, separators=(",", ":")) + "\n"
+
+
+def render(template, parameters, formats=("yaml",), stamp=None, strip=(), label="template", stream=None,
+           constants=None, data=None):
+    """
+    Return a dictionary mapping each of the given OUTPUT_FORMATS to the template
+    rendered in that format (see render_yaml() and render_json()). The template's
+    to_dict() is only called once, however many formats are requested, and not at
+    all if its result is given as data.
+
+    If constants (a dictionary of parameter values) are given, the template is
+    specialized for them first (see specialize.py). If strip lists any parts of
+    the template to remove (see minify.STRIPPABLE), the template is minified,
+    and the bytes saved in each format are reported (for the given label) on
+    stream, stderr by default.
+    """
+    stream = stream or sys.stderr
+    data = template.to_dict() if data is None else data
+    if constants is not None:
+        data, removed = specialize(data, constants)
+        stream.write(specialize_report(label, removed))
+    original = None
+    if strip:
+        original, data = data, minify(data, strip)
+    rendered = {}
+    for fmt in formats:
+        if fmt == "yaml":
+            rendered[fmt] = render_yaml(template, parameters, stamp, data)
+        elif fmt == "json":
+            rendered[fmt] = render_json(data)
+        else:
+            raise ValueError("Unknown output format: %s" % fmt)
+        if original is not None:
+            before = render_yaml(template, parameters, stamp, original) if fmt == "yaml" else render_json(original)
+            stream.write(
+                size_report("%s (%s)" % (label, fmt), len(before.encode()), len(rendered[fmt].encode()))
+            )
+    return rendered
+
+
+def render_from_environ(stream=None, environ=os.environ):
+    """
+    Build the template selected by the USE_* flags in the given environment and
+    write it to stream (stdout by default), in the format OUTPUT_FORMAT names and
+    with MINIFY, SPECIALIZE (see render()) and STACK_PROFILE (see profiling.py)
+    applied. Raises ValueError if the settings are invalid.
+    """
+    stream = stream or sys.stdout
+    # OUTPUT_FORMAT=json writes compact JSON instead of YAML (see dump_json())
+    formats = formats_from_environ(environ)
+    if len(formats) != 1:
+        raise ValueError("OUTPUT_FORMAT must name a single format; use build-all for more")
+    # MINIFY strips optional parts of the template (see minify.py)
+    strip = strip_from_environ(environ)
+    # SPECIALIZE=on treats the values in DEFAULTS_FILE as constants (see specialize.py)
+    constants = values_from_environ(environ)
+    # imported here because only STACK_PROFILE=1 needs it
+    from .profiling import profile_modules
+    with profile_modules(enabled=environ.get("STACK_PROFILE") == "1"):
+        template = build_template(flags_from_environ(environ))
+    if formats == ["json"] and not strip and constants is None:
+        dump_json(template.to_dict(), stream)
+    else:
+        parameters = dict(
+            (parm, environ[parm]) for parm in sorted(environ) if parm.startswith("USE_") or parm in HEADER_SETTINGS
+        )
+        stream.write(render(template, parameters, formats, strip=strip, constants=constants)[formats[0]])
+
+
+def variant_parameters(flags, environ=os.environ):
+    """
+    Return the header parameters for a variant built from the given flags.
+    """
+    parameters = dict((flag, "on") for flag in flags)
+    for parm in HEADER_SETTINGS:
+        if environ.get(parm):
+            parameters[parm] = environ[parm]
+    return parameters
+
+
+def render_variant(variant, stamp=None, reproducible=False, formats=("yaml",)):
+    """
+    Build the named variant and return a tuple of a dictionary mapping each of
+    the given formats to its rendered content (see render()) and the names of the
+    stack modules it was built from. Unless a stamp is given, the build is
+    stamped per build_stamp().
+    """
+    flags = VARIANTS[variant]
+    template = build_template(flags)
+    modules = template_modules(template)
+    stamp = stamp or build_stamp(reproducible, modules)
+    rendered = render(
+        template,
+        variant_parameters(flags),
+        formats,
+        stamp,
+        strip_from_environ(),
+        variant,
+        constants=values_from_environ(),
+    )
+    return rendered, modules
+
+
+def build_all(output_dir, variants=None, jobs=1, cache=None, reproducible=False, formats=("yaml",), stream=None):
+    """
+    Build each of the given variant names (all of VARIANTS by default) and write
+    it to <output_dir>/<variant>.<format> for each of the given OUTPUT_FORMATS,
+    unless that file is already up to date. Returns the list of output paths.
+
+    If jobs is greater than 1, the variants are built in a pool of that many
+    worker processes. Every variant
+    is stamped with the same generation time, so the output is identical to a
+    serial build. If reproducible is True, each variant is stamped with a hash
+    of the sources it was built from instead (see build_stamp()).
+
+    If a TemplateCache is given, only the variants that aren't in it (in every
+    format), or that import a stack module that has changed since they were
+    cached, are built; the rest are copied from the cache.
+    """
+    stream = stream or sys.stderr
+    variants = list(variants or VARIANTS)
+    unknown = [v for v in variants if v not in VARIANTS]
+    if unknown:
+        raise ValueError("Unknown variant(s): %s" % ", ".join(unknown))
+    unknown = [fmt for fmt in formats if fmt not in OUTPUT_FORMATS]
+    if unknown:
+        raise ValueError("Unknown output format(s): %s" % ", ".join(unknown))
+    os.makedirs(output_dir, exist_ok=True)
+
+    contents = {}
+    if cache is not None:
+        for variant in variants:
+            cached = dict((fmt, cache.get(VARIANTS[variant], fmt=fmt, reproducible=reproducible)) for fmt in formats)
+            if None not in cached.values():
+                contents[variant] = cached
+        stream.write("Cache hits: %s\n" % (", ".join(v for v in variants if v in contents) or "none"))
+        misses = []
+        for variant in variants:
+            if variant not in contents:
+                changed = cache.changed_modules(VARIANTS[variant])
+                misses.append("%s (%s)" % (variant, "changed: %s" % ", ".join(changed) if changed else "not cached"))
+        stream.write("Cache misses: %s\n" % (", ".join(misses) or "none"))
+    misses = [v for v in variants if v not in contents]
+
+    stamp = None if reproducible else build_stamp()
+    with ExitStack() as stack:
+        if jobs > 1 and len(misses) > 1:
+            # imported here because it's slow to import and `python -m stack
+            # render` doesn't need it
+            from concurrent.futures import ProcessPoolExecutor
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=min(jobs, len(misses))))
+            rendered = executor.map(
+                render_variant,
+                misses,
+                [stamp] * len(misses),
+                [reproducible] * len(misses),
+                [formats] * len(misses),
+            )
+        else:
+            rendered = (render_variant(variant, stamp, reproducible, formats) for variant in misses)
+        for variant, (content, modules) in zip(misses, rendered):
+            contents[variant] = content
+            if cache is not None:
+                for fmt in formats:
+                    cache.set(VARIANTS[variant], modules, content[fmt], fmt=fmt, reproducible=reproducible)
+
+    paths = []
+    for variant in variants:
+        for fmt in formats:
+            path = os.path.join(output_dir, "%s.%s" % (variant, fmt))
+            paths.append(path)
+            write_if_changed(path, contents[variant][fmt], stream)
+    return paths
+
+
+def write_if_changed(path, content, stream):
+    """
+    Write content to path, unless the file already has that content.
+    """
+    if os.path.exists(path):
+        with open(path) as f:
+            if f.read() == content:
+                stream.write("Unchanged %s\n" % path)
+                return
+    with open(path, "w") as f:
+        f.write(content)
+    stream.write("Wrote %s\n" % path)
+
+
+def parameter_string(value):
+    """
+    Return a value from a defaults file as a CloudFormation parameter value.
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, list):
+        return ",".join(parameter_string(v) for v in value)
+    return str(value)
+
+
+def parameters_file(data, values):
+    """
+    Return the given {parameter: value} values for the parameters of a template
+    dictionary (as returned by to_dict()) as the contents of a CloudFormation
+    parameters file, for `aws cloudformation create-stack --parameters
+    file://<file>`. Values for parameters the template doesn't have are left out.
+    """
+    parameters = [
+        {"ParameterKey": name, "ParameterValue": parameter_string(values[name])}
+        for name in sorted(values) if name in data.get("Parameters", {})
+    ]
+    return json.dumps(parameters, indent=2, sort_keys=True) + "\n"
+
+
+def build_environments(variant, defaults_dir, output_dir, specialized=False, formats=("yaml",), reproducible=False,
+                       stream=None):
+    """
+    Build the named variant once and, for each defaults file (<name>.json) in
+    defaults_dir, write the parameters file for an environment with those values
+    to <output_dir>/<name>.parameters.json (see parameters_file()). If
+    specialized is True, also write the template specialized for those values
+    (see specialize.py) to <output_dir>/<name>.<format> for each of the given
+    OUTPUT_FORMATS, with a parameters file for just the parameters it still has,
+    stamped per build_stamp(). Returns the list of output paths.
+
+    This is equivalent to, but much faster than, building the variant with
+    DEFAULTS_FILE (and SPECIALIZE=on) set to each file in turn, since the
+    template is only built (and converted with to_dict()) once.
+    """
+    stream = stream or sys.stderr
+    if variant not in VARIANTS:
+        raise ValueError("Unknown variant: %s" % variant)
+    unknown = [fmt for fmt in formats if fmt not in OUTPUT_FORMATS]
+    if unknown:
+        raise ValueError("Unknown output format(s): %s" % ", ".join(unknown))
+    defaults_files = sorted(name for name in os.listdir(defaults_dir) if name.endswith(".json"))
+    if not defaults_files:
+        raise ValueError("No defaults files (*.json) in %s" % defaults_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    flags = VARIANTS[variant]
+    template = build_template(flags)
+    stamp = build_stamp(reproducible, template_modules(template))
+    data = template.to_dict()
+    strip = strip_from_environ()
+    paths = []
+    for filename in defaults_files:
+        name = filename[:-len(".json")]
+        defaults_file = os.path.join(defaults_dir, filename)
+        with open(defaults_file) as f:
+            values = json.load(f)
+        ignored = sorted(set(values) - set(data.get("Parameters", {})))
+        if ignored:
+            stream.write("Ignored %s from %s: not parameters of %s\n" % (", ".join(ignored), defaults_file, variant))
+        outputs = {}
+        environment_data = data
+        if specialized:
+            label = "%s (%s)" % (variant, name)
+            environment_data, removed = specialize(data, values)
+            stream.write(specialize_report(label, removed))
+            environ = dict(os.environ, DEFAULTS_FILE=defaults_file, SPECIALIZE="on")
+            rendered = render(template, variant_parameters(flags, environ), formats, stamp, strip, label, stream,
+                              data=environment_data)
+            for fmt in formats:
+                outputs["%s.%s" % (name, fmt)] = rendered[fmt]
+        outputs["%s.parameters.json" % name] = parameters_file(environment_data, values)
+        for output in sorted(outputs):
+            path = os.path.join(output_dir, output)
+            paths.append(path)
+            write_if_changed(path, outputs[output], stream)
+    return paths
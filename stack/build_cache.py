@@ -0,0 +1,175 @@
+"""
+A content-addressed cache of rendered templates for build-all.
+
+A template is fully determined by the sources of the stack modules it's built
+from, the installed troposphere and awacs versions, the USE_* flags, MINIFY,
+SPECIALIZE and the DEFAULTS_FILE (both its name, which appears in the YAML
+header, and its contents), so the cache key is a hash of those. The modules
+each set of flags was built from the last time are recorded in an index in the
+cache directory, so editing a module (e.g., eks.py) only invalidates the
+variants that use it. On a cache hit the previously
+rendered YAML is reused as-is, including the stamp in its header, so the key
+also covers how the build is stamped (see build.build_stamp()): with
+SOURCE_DATE_EPOCH, with a digest of the sources (--reproducible), or with the
+time.
+"""
+
+import glob
+import hashlib
+import json
+import os
+
+STACK_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE = os.path.basename(STACK_DIR)
+
+# Installed packages whose version affects the generated templates
+DEPENDENCIES = ["troposphere", "awacs", "cfn-flip"]
+
+
+def package_version(name):
+    # importlib.metadata is slow to import and only needed for cache keys,
+    # reproducible stamps and benchmarks, so don't import it with the package
+    from importlib.metadata import PackageNotFoundError, version
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return ""
+
+
+def module_path(name):
+    """
+    Return the path to the source of the given stack module, e.g., "stack.eks".
+    """
+    if name == PACKAGE:
+        return os.path.join(STACK_DIR, "__init__.py")
+    return os.path.join(STACK_DIR, "%s.py" % name.split(".", 1)[1])
+
+
+def all_modules():
+    """
+    Return the names of all of the stack modules.
+    """
+    names = []
+    for path in sorted(glob.glob(os.path.join(STACK_DIR, "*.py"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        names.append(PACKAGE if name == "__init__" else "%s.%s" % (PACKAGE, name))
+    return names
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def source_digest(modules=None, digests=None):
+    """
+    Return a hash of the sources of the given stack modules (all of them by
+    default) and the installed versions of the DEPENDENCIES. digests, if given,
+    maps module names to their file_digest().
+    """
+    digest = hashlib.sha256()
+    for name in sorted(modules or all_modules()):
+        digest.update(name.encode())
+        digest.update(((digests[name] or "") if digests else file_digest(module_path(name))).encode())
+    for name in DEPENDENCIES:
+        digest.update(("%s==%s" % (name, package_version(name))).encode())
+    return digest.hexdigest()
+
+
+class TemplateCache(object):
+    """
+    Rendered templates stored in a directory as <key>.<format> (see
+    build.OUTPUT_FORMATS), along with an index
+    (modules.json) of the stack modules each set of flags was last built from.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "modules.json")
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except FileNotFoundError:
+            self.index = {}
+        # Module sources don't change during a build, so hash each one only once
+        self._digests = {}
+
+    def module_digests(self, modules):
+        """
+        Return a dictionary mapping each module to the current file_digest() of
+        its source (None if it no longer exists).
+        """
+        for name in modules:
+            if name not in self._digests:
+                try:
+                    self._digests[name] = file_digest(module_path(name))
+                except FileNotFoundError:
+                    self._digests[name] = None
+        return dict((name, self._digests[name]) for name in modules)
+
+    def key(self, flags, modules, environ=os.environ, reproducible=False):
+        """
+        Return the cache key for a variant built from the given USE_* flags and
+        stack modules, and stamped as build.build_stamp() does for reproducible.
+        """
+        digest = hashlib.sha256(source_digest(modules, self.module_digests(modules)).encode())
+        digest.update(("flags=%s" % ",".join(sorted(flags))).encode())
+        if environ.get("SOURCE_DATE_EPOCH"):
+            digest.update(("SOURCE_DATE_EPOCH=%s" % environ["SOURCE_DATE_EPOCH"]).encode())
+        elif reproducible:
+            digest.update(b"reproducible")
+        for parm in ["MINIFY", "SPECIALIZE"]:
+            if environ.get(parm):
+                digest.update(("%s=%s" % (parm, environ[parm])).encode())
+        defaults_file = environ.get("DEFAULTS_FILE")
+        if defaults_file:
+            digest.update(("DEFAULTS_FILE=%s" % defaults_file).encode())
+            digest.update(file_digest(defaults_file).encode())
+        return digest.hexdigest()
+
+    def path(self, key, fmt="yaml"):
+        return os.path.join(self.directory, "%s.%s" % (key, fmt))
+
+    def get(self, flags, environ=os.environ, fmt="yaml", reproducible=False):
+        """
+        Return the cached template for the given USE_* flags in the given format
+        (and stamped for reproducible), or None if it isn't in the cache or any of
+        its inputs have changed.
+        """
+        entry = self.index.get(",".join(sorted(flags)))
+        if entry is None:
+            return None
+        try:
+            with open(self.path(self.key(flags, entry["modules"], environ, reproducible), fmt)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def changed_modules(self, flags):
+        """
+        Return the modules that the given USE_* flags were last built from whose
+        sources have changed since.
+        """
+        entry = self.index.get(",".join(sorted(flags)))
+        if entry is None:
+            return []
+        current = self.module_digests(entry["modules"])
+        return sorted(name for name, digest in entry["modules"].items() if current[name] != digest)
+
+    def set(self, flags, modules, content, environ=os.environ, fmt="yaml", reproducible=False):
+        """
+        Store a template built from the given USE_* flags and stack modules, in
+        the given format (and stamped for reproducible).
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._write(self.path(self.key(flags, modules, environ, reproducible), fmt), content)
+        self.index[",".join(sorted(flags))] = {"modules": self.module_digests(modules)}
+        self._write(self.index_path, json.dumps(self.index, indent=2, sort_keys=True))
+
+    def _write(self, path, content):
+        # write to a temporary file first so an interrupted build can't leave
+        # a partial file in the cache
+        tmp_path = "%s.%s.tmp" % (path, os.getpid())
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
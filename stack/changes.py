@@ -0,0 +1,233 @@
+"""
+Predict the impact of deploying a new build of a template on an existing stack,
+without CloudFormation, by comparing it with the previous build resource by
+resource::
+
+    python -m stack changes old-content/ content/
+    python -m stack changes old-content/ecs-nat.json content/ecs-nat.json
+
+Each property that changed is classified, from the bundled (trimmed) copy of the
+CloudFormation resource specification in resource_spec.json, as:
+
+* no-interruption: the resource is updated in place
+* some-interruption: the resource is updated in place, but is unavailable for a
+  while, e.g., while an RDS instance reboots to change its DBInstanceClass
+* replacement: a new resource is created and the old one deleted, e.g., when the
+  Port of a Redis replication group changes; properties whose update may or may
+  not replace the resource (UpdateType "Conditional"), or that aren't in the
+  specification, are assumed to
+
+When a resource is replaced, its physical ID changes, so the properties of other
+resources that refer to it change too, and are classified in the same way.
+
+The specification only says whether a property is mutable, so the mutable
+properties that the CloudFormation documentation says cause some interruption
+are listed in SOME_INTERRUPTION. resource_spec.json is generated from the
+specification for your region (CloudFormationResourceSpecification.json), with
+all of the properties of every resource type the templates use and the
+specification's version (in ResourceSpecificationVersion), by::
+
+    python -m stack update-resource-spec CloudFormationResourceSpecification.json
+
+Run it again to pick up new properties and resource types.
+
+Changes to the values of parameters aren't part of a template; to include them,
+compare templates specialized for an environment (see specialize.py).
+"""
+
+import json
+import os
+
+from .specialize import references
+
+SPEC_PATH = os.path.join(os.path.dirname(__file__), "resource_spec.json")
+
+# Impacts of a change, from least to most disruptive
+IMPACTS = ["no-interruption", "some-interruption", "replacement"]
+
+# Mutable properties whose update causes some interruption, by resource type.
+# (Some properties that can cause an interruption, such as an EC2 instance's
+# InstanceType, are "Conditional" in the specification, so they're assumed to
+# replace the resource.)
+SOME_INTERRUPTION = {
+    "AWS::ElastiCache::CacheCluster": ["CacheNodeType", "EngineVersion"],
+    "AWS::ElastiCache::ReplicationGroup": ["CacheNodeType", "EngineVersion"],
+    "AWS::ElasticBeanstalk::Environment": ["OptionSettings"],
+    "AWS::RDS::DBInstance": ["AllocatedStorage", "DBInstanceClass", "EngineVersion"],
+}
+
+# Resource attributes other than Type and Properties, changes to which don't
+# affect the resource itself
+ATTRIBUTES = ["Condition", "CreationPolicy", "DeletionPolicy", "DependsOn", "Metadata", "UpdatePolicy",
+              "UpdateReplacePolicy"]
+
+
+def load_spec(path=SPEC_PATH):
+    """
+    Return a {resource type: {property: UpdateType}} dictionary from a
+    CloudFormation resource specification.
+    """
+    with open(path) as f:
+        spec = json.load(f)
+    return dict(
+        (resource_type, dict((name, prop.get("UpdateType")) for name, prop in definition["Properties"].items()))
+        for resource_type, definition in spec["ResourceTypes"].items()
+    )
+
+
+def trim_spec(spec, resource_types):
+    """
+    Return a copy of a CloudFormation resource specification with just its
+    version and the UpdateType of the properties of the given resource types.
+    Raises ValueError if any of them aren't in the specification.
+    """
+    missing = sorted(set(resource_types) - set(spec["ResourceTypes"]))
+    if missing:
+        raise ValueError("Resource type(s) not in the specification: %s" % ", ".join(missing))
+    return {
+        "ResourceSpecificationVersion": spec.get("ResourceSpecificationVersion"),
+        "ResourceTypes": dict(
+            (resource_type, {
+                "Properties": dict(
+                    (name, {"UpdateType": prop["UpdateType"]})
+                    for name, prop in spec["ResourceTypes"][resource_type]["Properties"].items()
+                )
+            })
+            for resource_type in sorted(resource_types)
+        )
+    }
+
+
+def property_impact(spec, resource_type, name):
+    """
+    Return a tuple of the impact (see IMPACTS) of changing the named property of a
+    resource of the given type and a note explaining it, if needed.
+    """
+    update_type = spec.get(resource_type, {}).get(name)
+    if update_type == "Mutable":
+        if name in SOME_INTERRUPTION.get(resource_type, ()):
+            return "some-interruption", ""
+        return "no-interruption", ""
+    if update_type == "Immutable":
+        return "replacement", ""
+    if update_type == "Conditional":
+        return "replacement", "conditional"
+    return "replacement", "not in the resource specification"
+
+
+def worst(impacts):
+    return max(impacts, key=IMPACTS.index) if impacts else None
+
+
+def compare(old, new, spec):
+    """
+    Compare the resources in two template dictionaries and return a dictionary
+    of:
+
+    * changed: a list of (resource, type, impact, properties) tuples for the
+      resources that changed, most disruptive first, where properties is a list
+      of (property, impact, note) tuples
+    * added: a list of (resource, type) tuples for the resources only in new
+    * removed: a list of (resource, type) tuples for the resources only in old,
+      which would be deleted
+    """
+    old_resources = old.get("Resources", {})
+    new_resources = new.get("Resources", {})
+    common = sorted(set(old_resources) & set(new_resources))
+    changes = {}
+    for name in common:
+        before, after = old_resources[name], new_resources[name]
+        if before.get("Type") != after.get("Type"):
+            changes[name] = {"Type": ("replacement", "")}
+            continue
+        properties = {}
+        old_properties, new_properties = before.get("Properties", {}), after.get("Properties", {})
+        for prop in set(old_properties) | set(new_properties):
+            if old_properties.get(prop) != new_properties.get(prop):
+                properties[prop] = property_impact(spec, after.get("Type"), prop)
+        for attribute in ATTRIBUTES:
+            if before.get(attribute) != after.get(attribute):
+                properties[attribute] = ("no-interruption", "")
+        if properties:
+            changes[name] = properties
+
+    # resources that refer to a replaced resource see a new physical ID
+    replaced = [name for name, properties in changes.items()
+                if worst([impact for impact, _ in properties.values()]) == "replacement"]
+    pending = list(replaced)
+    while pending:
+        target = pending.pop()
+        for name in common:
+            properties = changes.setdefault(name, {})
+            if "Type" in properties:
+                continue
+            for prop, value in new_resources[name].get("Properties", {}).items():
+                if prop in properties or target not in references(value)[0]:
+                    continue
+                impact, note = property_impact(spec, new_resources[name].get("Type"), prop)
+                properties[prop] = (impact, "; ".join(n for n in [note, "%s is replaced" % target] if n))
+                if impact == "replacement" and name not in replaced:
+                    replaced.append(name)
+                    pending.append(name)
+
+    changed = []
+    for name, properties in changes.items():
+        if properties:
+            impact = worst([impact for impact, _ in properties.values()])
+            changed.append((name, new_resources[name].get("Type"), impact,
+                            [(prop, p_impact, note) for prop, (p_impact, note) in sorted(properties.items())]))
+    return {
+        "changed": sorted(changed, key=lambda change: (-IMPACTS.index(change[2]), change[0])),
+        "added": [(name, new_resources[name].get("Type")) for name in sorted(set(new_resources) - set(old_resources))],
+        "removed": [(name, old_resources[name].get("Type"))
+                    for name in sorted(set(old_resources) - set(new_resources))],
+    }
+
+
+def template_pairs(old, new):
+    """
+    Return a list of (label, old path, new path) tuples for the templates to
+    compare: the two given files, or the templates with the same name in two
+    directories (as written by build-all), preferring JSON to YAML.
+    """
+    if not os.path.isdir(old):
+        return [(new, old, new)]
+
+    def templates(directory):
+        paths = {}
+        for filename in sorted(os.listdir(directory)):
+            stem, extension = os.path.splitext(filename)
+            if extension in (".json", ".yaml") and (stem not in paths or extension == ".json"):
+                paths[stem] = os.path.join(directory, filename)
+        return paths
+
+    old_paths, new_paths = templates(old), templates(new)
+    return [(stem, old_paths[stem], new_paths[stem]) for stem in sorted(set(old_paths) & set(new_paths))]
+
+
+def summary(result):
+    counts = dict((impact, 0) for impact in IMPACTS)
+    for _, _, impact, _ in result["changed"]:
+        counts[impact] += 1
+    return "%d replaced, %d interrupted, %d updated without interruption, %d added, %d removed" % (
+        counts["replacement"],
+        counts["some-interruption"],
+        counts["no-interruption"],
+        len(result["added"]),
+        len(result["removed"]),
+    )
+
+
+def format_report(result):
+    """
+    Return the results of compare() as text.
+    """
+    report = summary(result) + "\n"
+    for name, resource_type, impact, properties in result["changed"]:
+        report += "  %s: %s (%s)\n" % (impact, name, resource_type)
+        for prop, prop_impact, note in properties:
+            report += "      %s: %s%s\n" % (prop, prop_impact, " (%s)" % note if note else "")
+    for label, resources in (("added", result["added"]), ("removed", result["removed"])):
+        for name, resource_type in resources:
+            report += "  %s: %s (%s)\n" % (label, name, resource_type)
+    return report
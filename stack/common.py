@@ -1,73 +1,92 @@
-import os
-
-from troposphere import AWS_REGION, Equals, If, Not, Ref
-
-from . import USE_DOKKU, USE_EB, USE_EC2, USE_ECS, USE_GOVCLOUD
-from .template import template
-from .utils import ParameterWithDefaults as Parameter
+from troposphere import AWS_PARTITION, Equals, Join, Not, Ref
 
 dont_create_value = "(none)"
 
-# TODO: clean up naming for this role so it's the same for all configurations
-if os.environ.get('USE_EB') == 'on':
-    instance_role = "WebServerRole"
-else:
-    instance_role = "ContainerInstanceRole"
 
-in_govcloud_region = "InGovCloudRegion"
-template.add_condition(in_govcloud_region, Equals(Ref(AWS_REGION), "us-gov-west-1"))
-arn_prefix = If(in_govcloud_region, "arn:aws-us-gov", "arn:aws")
+def add_common(build):
+    """
+    Add the parameters and conditions that the other stack modules share to the
+    template and return their values.
+    """
+    template = build.template
+    Parameter = build.Parameter
+    use_dokku = "USE_DOKKU" in build.flags
+    use_eb = "USE_EB" in build.flags
+    use_ec2 = "USE_EC2" in build.flags
+    use_ecs = "USE_ECS" in build.flags
+    use_govcloud = "USE_GOVCLOUD" in build.flags
+
+    # TODO: clean up naming for this role so it's the same for all configurations
+    if use_eb:
+        instance_role = "WebServerRole"
+    else:
+        instance_role = "ContainerInstanceRole"
 
-administrator_ip_address = Ref(template.add_parameter(
-    Parameter(
-        "AdministratorIPAddress",
-        Description="The IP address allowed to access containers. "
-                    "Defaults to TEST-NET-1 (ie, no valid IP)",
-        Type="String",
-        # RFC5737 - TEST-NET-1 reserved for documentation
-        Default="192.0.2.0/24",
-    ),
-    group="Application Server",
-    label="Admin IP Address",
-))
+    # "arn:aws", or "arn:aws-us-gov" in GovCloud
+    arn_prefix = Join("", ["arn:", Ref(AWS_PARTITION)])
 
-if any([USE_DOKKU, USE_EB, USE_ECS, USE_EC2, USE_GOVCLOUD]):
-    secret_key = Ref(template.add_parameter(
+    administrator_ip_address = Ref(template.add_parameter(
         Parameter(
-            "SecretKey",
-            Description="Application secret key for this stack (optional)",
+            "AdministratorIPAddress",
+            Description="The IP address allowed to access containers. "
+                        "Defaults to TEST-NET-1 (ie, no valid IP)",
             Type="String",
-            NoEcho=True,
+            # RFC5737 - TEST-NET-1 reserved for documentation
+            Default="192.0.2.0/24",
         ),
         group="Application Server",
-        label="Secret Key",
+        label="Admin IP Address",
+    ))
+
+    secret_key = None
+    if any([use_dokku, use_eb, use_ecs, use_ec2, use_govcloud]):
+        secret_key = Ref(template.add_parameter(
+            Parameter(
+                "SecretKey",
+                Description="Application secret key for this stack (optional)",
+                Type="String",
+                NoEcho=True,
+            ),
+            group="Application Server",
+            label="Secret Key",
+        ))
+
+    use_aes256_encryption = Ref(template.add_parameter(
+        Parameter(
+            "UseAES256Encryption",
+            Description="Whether or not to use server side encryption for S3, EBS, and RDS. "
+                        "When true, encryption is enabled for all resources.",
+            Type="String",
+            AllowedValues=["true", "false"],
+            Default="false",
+        ),
+        group="Global",
+        label="Enable Encryption",
     ))
+    use_aes256_encryption_cond = "UseAES256EncryptionCond"
+    template.add_condition(use_aes256_encryption_cond, Equals(use_aes256_encryption, "true"))
 
-use_aes256_encryption = Ref(template.add_parameter(
-    Parameter(
-        "UseAES256Encryption",
-        Description="Whether or not to use server side encryption for S3, EBS, and RDS. "
-                    "When true, encryption is enabled for all resources.",
-        Type="String",
-        AllowedValues=["true", "false"],
-        Default="false",
-    ),
-    group="Global",
-    label="Enable Encryption",
-))
-use_aes256_encryption_cond = "UseAES256EncryptionCond"
-template.add_condition(use_aes256_encryption_cond, Equals(use_aes256_encryption, "true"))
+    cmk_arn = template.add_parameter(
+        Parameter(
+            "CustomerManagedCmkArn",
+            Description="KMS CMK ARN to encrypt stack resources (except for public buckets).",
+            Type="String",
+            Default="",
+        ),
+        group="Global",
+        label="Customer managed key ARN",
+    )
 
-cmk_arn = template.add_parameter(
-    Parameter(
-        "CustomerManagedCmkArn",
-        Description="KMS CMK ARN to encrypt stack resources (except for public buckets).",
-        Type="String",
-        Default="",
-    ),
-    group="Global",
-    label="Customer managed key ARN",
-)
+    use_cmk_arn = "CmkArnCondition"
+    template.add_condition(use_cmk_arn, Not(Equals(Ref(cmk_arn), "")))
 
-use_cmk_arn = "CmkArnCondition"
-template.add_condition(use_cmk_arn, Not(Equals(Ref(cmk_arn), "")))
+    return dict(
+        administrator_ip_address=administrator_ip_address,
+        arn_prefix=arn_prefix,
+        cmk_arn=cmk_arn,
+        instance_role=instance_role,
+        secret_key=secret_key,
+        use_aes256_encryption=use_aes256_encryption,
+        use_aes256_encryption_cond=use_aes256_encryption_cond,
+        use_cmk_arn=use_cmk_arn,
+    )
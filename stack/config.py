@@ -0,0 +1,124 @@
+"""
+Compose a stack from a configuration file, rather than from the fixed
+combinations of components that the USE_* flags select::
+
+    python -m stack build-config ecs-lean.toml --output-dir content
+
+The file (TOML, which requires Python 3.11 or later, or YAML) lists the USE_*
+flags (which, as with environment variables, select the platform, NAT gateway,
+load balancer and GovCloud options), the stack modules to build the template from (see
+build.COMPONENTS; the modules they depend on, such as vpc, are included
+automatically) and, optionally, parameter defaults, e.g.::
+
+    flags = ["USE_ECS", "USE_NAT_GATEWAY"]
+    components = ["assets", "database", "logs", "bastion", "ecs_cluster", "repository"]
+
+    [defaults]
+    DatabaseClass = "db.t3.small"
+
+Instead of components, exclude can list the components to leave out of those
+the flags select (see build.components_for_flags()), e.g., exclude = ["sftp",
+"search"]. Leaving out sftp also leaves out the SFTP bucket and the policies and
+role for it that assets.py adds, and leaving out database, cache or search also
+leaves out the environment variables for them that environment.py adds.
+"""
+
+import os
+import sys
+
+from .build import (
+    COMPONENTS,
+    FLAGS,
+    build_stamp,
+    build_template,
+    components_for_flags,
+    render,
+    template_modules,
+    variant_parameters,
+    write_if_changed
+)
+from .minify import strip_from_environ
+from .specialize import values_from_environ
+
+# The keys a configuration file can have
+CONFIG_KEYS = ["components", "defaults", "exclude", "flags"]
+
+
+def read_config(path):
+    """
+    Return the contents of a TOML or YAML configuration file as a dictionary.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".toml":
+        try:
+            import tomllib
+        except ImportError:
+            raise ValueError("Reading %s requires Python 3.11 or later; use a YAML file instead" % path)
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    if extension in (".yaml", ".yml"):
+        # PyYAML is installed with cfn-flip
+        import yaml
+        with open(path) as f:
+            return yaml.safe_load(f) or {}
+    raise ValueError("Unknown configuration file type: %s (use .toml or .yaml)" % path)
+
+
+def load_config(path):
+    """
+    Return a tuple of the flags, components and parameter defaults (or None) in
+    a configuration file, for build_template(). Raises ValueError if the file
+    isn't valid.
+    """
+    config = read_config(path)
+    unknown = sorted(set(config) - set(CONFIG_KEYS))
+    if unknown:
+        raise ValueError("Unknown key(s) in %s: %s (choices: %s)" % (path, ", ".join(unknown), ", ".join(CONFIG_KEYS)))
+    flags = list(config.get("flags", []))
+    unknown = sorted(set(flags) - set(FLAGS))
+    if unknown:
+        raise ValueError("Unknown flag(s) in %s: %s" % (path, ", ".join(unknown)))
+    if "components" in config and "exclude" in config:
+        raise ValueError("%s can list components or exclude, not both" % path)
+    if "components" in config:
+        components = list(config["components"])
+    else:
+        components = [c for c in components_for_flags(flags) if c not in config.get("exclude", [])]
+    unknown = sorted(set(components + list(config.get("exclude", []))) - set(COMPONENTS))
+    if unknown:
+        raise ValueError("Unknown component(s) in %s: %s (choices: %s)" % (
+            path, ", ".join(unknown), ", ".join(COMPONENTS)
+        ))
+    return flags, components, config.get("defaults")
+
+
+def build_configs(paths, output_dir, formats=("yaml",), reproducible=False, stream=None):
+    """
+    Build the template described by each of the given configuration files and
+    write it to <output_dir>/<name>.<format> (where name is the file's name
+    without its extension) for each of the given OUTPUT_FORMATS. Returns the list
+    of output paths.
+    """
+    stream = stream or sys.stderr
+    os.makedirs(output_dir, exist_ok=True)
+    output_paths = []
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        flags, components, defaults = load_config(path)
+        template = build_template(flags, components, defaults)
+        parameters = dict(variant_parameters(flags), STACK_CONFIG=path)
+        rendered = render(
+            template,
+            parameters,
+            formats,
+            build_stamp(reproducible, template_modules(template)),
+            strip_from_environ(),
+            name,
+            stream,
+            values_from_environ(),
+        )
+        for fmt in formats:
+            output_path = os.path.join(output_dir, "%s.%s" % (name, fmt))
+            output_paths.append(output_path)
+            write_if_changed(output_path, rendered[fmt], stream)
+    return output_paths
@@ -0,0 +1,237 @@
+"""
+Estimate how long CloudFormation takes to create a stack from a generated
+template, and what keeps it from creating more resources in parallel::
+
+    python -m stack critical-path content/ecs-nat.yaml
+    python -m stack critical-path eks-nat
+
+CloudFormation creates a resource once all of the resources it depends on exist:
+those it refers to with Ref, Fn::GetAtt or Fn::Sub, and those listed in its
+DependsOn. Given an estimated creation time for each resource type (see
+PROVISIONING_SECONDS), the longest chain of dependencies (the critical path)
+bounds the time it takes to create the stack. Every resource is assumed to be
+created, whatever its Condition.
+
+Each DependsOn is also checked: one whose resource is already a (direct or
+indirect) dependency through a reference is redundant, and one that lies on the
+critical path lengthens it by making CloudFormation wait for a resource that
+isn't referenced, which may not be necessary.
+"""
+
+import cfn_flip
+
+from .sizes import format_rows
+from .specialize import references
+
+# Rough times, in seconds, that CloudFormation takes to create a resource of each
+# type, from experience and AWS documentation. They're only meant to show which
+# resources dominate the creation of a stack.
+PROVISIONING_SECONDS = {
+    "AWS::ApplicationAutoScaling::ScalableTarget": 10,
+    "AWS::ApplicationAutoScaling::ScalingPolicy": 5,
+    "AWS::AutoScaling::AutoScalingGroup": 120,
+    "AWS::AutoScaling::LaunchConfiguration": 5,
+    "AWS::CertificateManager::Certificate": 180,
+    "AWS::CloudFront::CachePolicy": 5,
+    "AWS::CloudFront::Distribution": 900,
+    "AWS::EC2::EIP": 10,
+    "AWS::EC2::EIPAssociation": 15,
+    "AWS::EC2::Instance": 90,
+    "AWS::EC2::InternetGateway": 15,
+    "AWS::EC2::LaunchTemplate": 5,
+    "AWS::EC2::NatGateway": 120,
+    "AWS::EC2::Route": 5,
+    "AWS::EC2::RouteTable": 10,
+    "AWS::EC2::SecurityGroup": 10,
+    "AWS::EC2::SecurityGroupIngress": 5,
+    "AWS::EC2::Subnet": 10,
+    "AWS::EC2::SubnetRouteTableAssociation": 5,
+    "AWS::EC2::VPC": 15,
+    "AWS::EC2::VPCEndpoint": 90,
+    "AWS::EC2::VPCGatewayAttachment": 20,
+    "AWS::ECR::Repository": 5,
+    "AWS::ECS::CapacityProvider": 5,
+    "AWS::ECS::Cluster": 10,
+    "AWS::ECS::ClusterCapacityProviderAssociations": 30,
+    "AWS::ECS::Service": 180,
+    "AWS::ECS::TaskDefinition": 5,
+    "AWS::EKS::Cluster": 600,
+    "AWS::EKS::Nodegroup": 240,
+    "AWS::ElastiCache::CacheCluster": 420,
+    "AWS::ElastiCache::ReplicationGroup": 600,
+    "AWS::ElastiCache::SubnetGroup": 10,
+    "AWS::ElasticBeanstalk::Application": 5,
+    "AWS::ElasticBeanstalk::Environment": 420,
+    "AWS::ElasticLoadBalancing::LoadBalancer": 30,
+    "AWS::ElasticLoadBalancingV2::Listener": 5,
+    "AWS::ElasticLoadBalancingV2::ListenerRule": 5,
+    "AWS::ElasticLoadBalancingV2::LoadBalancer": 180,
+    "AWS::ElasticLoadBalancingV2::TargetGroup": 15,
+    "AWS::Elasticsearch::Domain": 900,
+    "AWS::IAM::InstanceProfile": 120,
+    "AWS::IAM::ManagedPolicy": 15,
+    "AWS::IAM::Policy": 15,
+    "AWS::IAM::Role": 15,
+    "AWS::Logs::LogGroup": 5,
+    "AWS::RDS::DBInstance": 600,
+    "AWS::RDS::DBParameterGroup": 10,
+    "AWS::RDS::DBSubnetGroup": 10,
+    "AWS::S3::Bucket": 20,
+    "AWS::SSM::Parameter": 5,
+    "AWS::Transfer::Server": 120,
+}
+
+# Used for resource types that aren't in PROVISIONING_SECONDS
+DEFAULT_PROVISIONING_SECONDS = 30
+
+
+def load_template(path):
+    """
+    Return the template in the given JSON or YAML file as a dictionary.
+    """
+    with open(path) as f:
+        return cfn_flip.load(f.read())[0]
+
+
+def dependency_graph(resources):
+    """
+    Return a tuple of two dictionaries mapping each resource name to the set of
+    resources it refers to, and to the list of resources in its DependsOn.
+    """
+    referenced = {}
+    depends_on = {}
+    for name, resource in resources.items():
+        refs, _ = references(dict((k, v) for k, v in resource.items() if k != "DependsOn"))
+        referenced[name] = set(ref for ref in refs if ref in resources and ref != name)
+        dependencies = resource.get("DependsOn", [])
+        depends_on[name] = [dependencies] if isinstance(dependencies, str) else list(dependencies)
+    return referenced, depends_on
+
+
+def provisioning_seconds(resource):
+    return PROVISIONING_SECONDS.get(resource.get("Type"), DEFAULT_PROVISIONING_SECONDS)
+
+
+def finish_times(resources, edges):
+    """
+    Return a dictionary of the estimated time, in seconds from the start of the
+    stack's creation, at which each resource is created, given a dictionary
+    mapping each resource to the set of resources it depends on.
+    """
+    finish = {}
+
+    def visit(name, path=()):
+        if name not in finish:
+            if name in path:
+                raise ValueError("Circular dependency: %s" % " -> ".join(path + (name,)))
+            start = max([visit(dep, path + (name,)) for dep in edges[name]] or [0])
+            finish[name] = start + provisioning_seconds(resources[name])
+        return finish[name]
+
+    for name in resources:
+        visit(name)
+    return finish
+
+
+def critical_path(resources, edges, finish=None):
+    """
+    Return the resources on the longest chain of dependencies, first to last.
+    """
+    finish = finish or finish_times(resources, edges)
+    if not finish:
+        return []
+    path = [max(finish, key=lambda name: (finish[name], name))]
+    while edges[path[-1]]:
+        path.append(max(edges[path[-1]], key=lambda name: (finish[name], name)))
+    return list(reversed(path))
+
+
+def reachable(edges, start, skip_edge):
+    """
+    Return whether any dependency of start (other than the dependency through
+    skip_edge, a (resource, dependency) tuple) depends, directly or not, on
+    skip_edge's dependency.
+    """
+    target = skip_edge[1]
+    seen = set()
+    stack = [dep for dep in edges[start] if (start, dep) != skip_edge]
+    while stack:
+        name = stack.pop()
+        if name == target:
+            return True
+        if name not in seen:
+            seen.add(name)
+            stack.extend(edges[name])
+    return False
+
+
+def analyze(data):
+    """
+    Analyze the resources in a template dictionary and return a dictionary of:
+
+    * total_seconds: the estimated time to create all of the resources
+    * serial_seconds: the time if the resources were created one at a time
+    * path: a list of (resource, type, start seconds, seconds) tuples for the
+      resources on the critical path
+    * depends_on: a list of (resource, dependency, kind, seconds saved) tuples
+      for each DependsOn, where kind is "redundant", "critical" (i.e., it
+      lengthens the critical path by the seconds saved by removing it) or "ok"
+    """
+    resources = data.get("Resources", {})
+    referenced, depends_on = dependency_graph(resources)
+    edges = dict(
+        (name, referenced[name] | set(dep for dep in depends_on[name] if dep in resources)) for name in resources
+    )
+    finish = finish_times(resources, edges)
+    total = max(finish.values() or [0])
+    path = []
+    for name in critical_path(resources, edges, finish):
+        seconds = provisioning_seconds(resources[name])
+        path.append((name, resources[name].get("Type"), finish[name] - seconds, seconds))
+
+    checks = []
+    for name in resources:
+        for dep in depends_on[name]:
+            if dep not in resources:
+                continue
+            if dep in referenced[name] or reachable(edges, name, (name, dep)):
+                checks.append((name, dep, "redundant", 0))
+                continue
+            without = dict(edges, **{name: edges[name] - {dep}})
+            saved = total - max(finish_times(resources, without).values())
+            checks.append((name, dep, "critical" if saved > 0 else "ok", saved))
+    return {
+        "total_seconds": total,
+        "serial_seconds": sum(provisioning_seconds(resource) for resource in resources.values()),
+        "path": path,
+        "depends_on": checks,
+    }
+
+
+def format_seconds(seconds):
+    return "%dm%02ds" % divmod(seconds, 60)
+
+
+def format_report(analysis):
+    """
+    Return the results of analyze() as text.
+    """
+    report = "Estimated creation time: %s (%s if created one at a time)\n\n" % (
+        format_seconds(analysis["total_seconds"]),
+        format_seconds(analysis["serial_seconds"]),
+    )
+    rows = [["start", "time", "resource", "type"]]
+    for name, resource_type, start, seconds in analysis["path"]:
+        rows.append([format_seconds(start), format_seconds(seconds), name, resource_type or ""])
+    report += format_rows(rows, left=4)
+    if analysis["depends_on"]:
+        report += "\nDependsOn:\n"
+    for name, dep, kind, saved in analysis["depends_on"]:
+        if kind == "redundant":
+            note = "redundant, it's already a dependency through a reference"
+        elif kind == "critical":
+            note = "on the critical path; without it, the estimate drops by %s" % format_seconds(saved)
+        else:
+            note = "doesn't lengthen the critical path"
+        report += "  %s -> %s: %s\n" % (name, dep, note)
+    return report
@@ -1,46 +1,59 @@
 from troposphere import Equals, If, Join, Ref, Split
 
-from .template import template
-from .utils import ParameterWithDefaults as Parameter
 
-domain_name = Ref(template.add_parameter(
-    Parameter(
-        "DomainName",
-        Description="The fully-qualified domain name for the application.",
-        Type="String",
-    ),
-    group="Global",
-    label="Domain Name",
-))
+def add_domain(build):
+    """
+    Add the domain name parameters to the template and return the values that
+    other stack modules use.
+    """
+    template = build.template
+    Parameter = build.Parameter
 
-domain_name_alternates = Ref(template.add_parameter(
-    Parameter(
-        "DomainNameAlternates",
-        Description="A comma-separated list of Alternate FQDNs to be included in "
-                    "the Subject Alternative Name extension of the SSL certificate.",
-        Type="CommaDelimitedList",
-    ),
-    group="Global",
-    label="Alternate Domain Names",
-))
+    domain_name = Ref(template.add_parameter(
+        Parameter(
+            "DomainName",
+            Description="The fully-qualified domain name for the application.",
+            Type="String",
+        ),
+        group="Global",
+        label="Domain Name",
+    ))
 
-no_alt_domains = "NoAlternateDomains"
-template.add_condition(
-    no_alt_domains,
-    # Equals() only supports strings, so convert domain_name_alternates to one first
-    Equals(Join("", domain_name_alternates), ""),
-)
+    domain_name_alternates = Ref(template.add_parameter(
+        Parameter(
+            "DomainNameAlternates",
+            Description="A comma-separated list of Alternate FQDNs to be included in "
+                        "the Subject Alternative Name extension of the SSL certificate.",
+            Type="CommaDelimitedList",
+        ),
+        group="Global",
+        label="Alternate Domain Names",
+    ))
 
-all_domains_list = Split(";", Join("", [
-    domain_name,
-    If(
+    no_alt_domains = "NoAlternateDomains"
+    template.add_condition(
         no_alt_domains,
-        # if we don't have any alternate domains, return an empty string
-        "",
-        # otherwise, return the ';' that will be needed by the first domain
-        ";",
-    ),
-    # then, add all the alternate domains, joined together with ';
-    Join(";", domain_name_alternates),
-    # now that we have a string of origins separated by ';', Split() is used to make it into a list again
-]))
+        # Equals() only supports strings, so convert domain_name_alternates to one first
+        Equals(Join("", domain_name_alternates), ""),
+    )
+
+    all_domains_list = Split(";", Join("", [
+        domain_name,
+        If(
+            no_alt_domains,
+            # if we don't have any alternate domains, return an empty string
+            "",
+            # otherwise, return the ';' that will be needed by the first domain
+            ";",
+        ),
+        # then, add all the alternate domains, joined together with ';
+        Join(";", domain_name_alternates),
+        # now that we have a string of origins separated by ';', Split() is used to make it into a list again
+    ]))
+
+    return dict(
+        all_domains_list=all_domains_list,
+        domain_name=domain_name,
+        domain_name_alternates=domain_name_alternates,
+        no_alt_domains=no_alt_domains,
+    )
@@ -3,303 +3,753 @@ from troposphere import (
     AWS_REGION,
     AWS_STACK_ID,
     AWS_STACK_NAME,
+    And,
     Base64,
+    Condition,
     Equals,
-    FindInMap,
+    GetAtt,
+    If,
     Join,
     Not,
+    NoValue,
+    Or,
     Ref,
+    applicationautoscaling,
     autoscaling,
     cloudformation,
+    ec2,
     iam
 )
 from troposphere.ecs import (
+    AutoScalingGroupProvider,
+    CapacityProvider,
+    CapacityProviderStrategy,
+    CapacityProviderStrategyItem,
     Cluster,
+    ClusterCapacityProviderAssociations,
     ContainerDefinition,
     Environment,
     LoadBalancer,
     LogConfiguration,
+    ManagedScaling,
+    PlacementStrategy,
     PortMapping,
     Service,
     TaskDefinition
 )
 
-from .containers import (
-    container_instance_profile,
-    container_instance_type,
-    desired_container_instances,
-    max_container_instances
-)
-from .environment import environment_variables
-from .load_balancer import load_balancer, web_worker_port
-from .logs import container_log_group
-from .repository import repository
-from .security_groups import container_security_group
-from .template import template
-from .utils import ParameterWithDefaults as Parameter
-from .vpc import private_subnet_a, private_subnet_b
-
-web_worker_cpu = Ref(template.add_parameter(
-    Parameter(
-        "WebWorkerCPU",
-        Description="Web worker CPU units",
-        Type="Number",
-        Default="512",
-    ),
-    group="Application Server",
-    label="Web Worker CPU",
-))
-
-
-web_worker_memory = Ref(template.add_parameter(
-    Parameter(
-        "WebWorkerMemory",
-        Description="Web worker memory",
-        Type="Number",
-        Default="700",
-    ),
-    group="Application Server",
-    label="Web Worker Memory",
-))
-
-
-web_worker_desired_count = Ref(template.add_parameter(
-    Parameter(
-        "WebWorkerDesiredCount",
-        Description="Web worker task instance count",
-        Type="Number",
-        Default="2",
-    ),
-    group="Application Server",
-    label="Web Worker Count",
-))
-
-app_revision = Ref(template.add_parameter(
-    Parameter(
-        "WebAppRevision",
-        Description="An optional docker app revision to deploy",
-        Type="String",
-        Default="",
-    ),
-    group="Application Server",
-    label="App Revision",
-))
-
-deploy_condition = "Deploy"
-template.add_condition(deploy_condition, Not(Equals(app_revision, "")))
-
-template.add_mapping("ECSRegionMap", {
-    "us-east-1": {"AMI": "ami-eca289fb"},
-    "us-east-2": {"AMI": "ami-446f3521"},
-    "us-west-1": {"AMI": "ami-9fadf8ff"},
-    "us-west-2": {"AMI": "ami-7abc111a"},
-    "eu-west-1": {"AMI": "ami-a1491ad2"},
-    "eu-central-1": {"AMI": "ami-54f5303b"},
-    "ap-northeast-1": {"AMI": "ami-9cd57ffd"},
-    "ap-southeast-1": {"AMI": "ami-a900a3ca"},
-    "ap-southeast-2": {"AMI": "ami-5781be34"},
-})
-
-# ECS cluster
-cluster = Cluster(
-    "Cluster",
-    template=template,
-)
+from .containers import arm64_instance_types
+from .template import Contains
 
-container_instance_configuration_name = "ContainerLaunchConfiguration"
-
-autoscaling_group_name = "AutoScalingGroup"
-
-container_instance_configuration = autoscaling.LaunchConfiguration(
-    container_instance_configuration_name,
-    template=template,
-    Metadata=autoscaling.Metadata(
-        cloudformation.Init(dict(
-            config=cloudformation.InitConfig(
-                commands=dict(
-                    register_cluster=dict(command=Join("", [
-                        "#!/bin/bash\n",
-                        # Register the cluster
-                        "echo ECS_CLUSTER=",
-                        Ref(cluster),
-                        " >> /etc/ecs/ecs.config\n",
-                        # Enable CloudWatch docker logging
-                        'echo \'ECS_AVAILABLE_LOGGING_DRIVERS=',
-                        '["json-file","awslogs"]\'',
-                        " >> /etc/ecs/ecs.config\n",
-                    ]))
-                ),
-                files=cloudformation.InitFiles({
-                    "/etc/cfn/cfn-hup.conf": cloudformation.InitFile(
-                        content=Join("", [
-                            "[main]\n",
-                            "stack=",
-                            Ref(AWS_STACK_ID),
-                            "\n",
-                            "region=",
-                            Ref(AWS_REGION),
-                            "\n",
-                        ]),
-                        mode="000400",
-                        owner="root",
-                        group="root",
+
+def add_ecs_cluster(build):
+    """
+    Add the ECS cluster, its container instances and the web worker service to
+    the template.
+    """
+    template = build.template
+    Parameter = build.Parameter
+    (
+        arn_prefix,
+        cmk_arn,
+        use_aes256_encryption,
+        use_cmk_arn,
+    ) = build.get(
+        "common",
+        "arn_prefix",
+        "cmk_arn",
+        "use_aes256_encryption",
+        "use_cmk_arn",
+    )
+    (
+        container_instance_profile,
+        container_instance_type,
+        container_instance_types,
+        container_volume_size,
+        max_container_instances,
+    ) = build.get(
+        "containers",
+        "container_instance_profile",
+        "container_instance_type",
+        "container_instance_types",
+        "container_volume_size",
+        "max_container_instances",
+    )
+    environment_variables = build.get("environment", "environment_variables")
+    load_balancer, use_alb, web_worker_port = build.get("load_balancer", "load_balancer", "use_alb", "web_worker_port")
+    container_log_group = build.get("logs", "container_log_group")
+    repository = build.get("repository", "repository")
+    container_security_group = build.get("security_groups", "container_security_group")
+    private_subnet_a, private_subnet_b = build.get("vpc", "private_subnet_a", "private_subnet_b")
+
+    web_worker_cpu = Ref(template.add_parameter(
+        Parameter(
+            "WebWorkerCPU",
+            Description="Web worker CPU units",
+            Type="Number",
+            Default="512",
+        ),
+        group="Application Server",
+        label="Web Worker CPU",
+    ))
+
+    web_worker_memory = Ref(template.add_parameter(
+        Parameter(
+            "WebWorkerMemory",
+            Description="Web worker memory",
+            Type="Number",
+            Default="700",
+        ),
+        group="Application Server",
+        label="Web Worker Memory",
+    ))
+
+    web_worker_desired_count = Ref(template.add_parameter(
+        Parameter(
+            "WebWorkerDesiredCount",
+            Description="Web worker task instance count",
+            Type="Number",
+            Default="2",
+        ),
+        group="Application Server",
+        label="Web Worker Count",
+    ))
+
+    web_worker_max_count = Ref(template.add_parameter(
+        Parameter(
+            "WebWorkerMaxCount",
+            Description="Maximum number of web worker tasks to scale out to, or 0 to run "
+                        "WebWorkerDesiredCount tasks without auto scaling. Unless the stack uses an "
+                        "Application Load Balancer, each container instance can run one web worker task.",
+            Type="Number",
+            Default="0",
+            MinValue="0",
+        ),
+        group="Application Server",
+        label="Web Worker Maximum Count",
+    ))
+
+    web_worker_min_count = Ref(template.add_parameter(
+        Parameter(
+            "WebWorkerMinCount",
+            Description="Minimum number of web worker tasks to scale in to, if WebWorkerMaxCount is set",
+            Type="Number",
+            Default="1",
+            MinValue="1",
+        ),
+        group="Application Server",
+        label="Web Worker Minimum Count",
+    ))
+
+    web_worker_cpu_target = Ref(template.add_parameter(
+        Parameter(
+            "WebWorkerCPUTarget",
+            Description="Average CPU utilization (percent) of the web worker tasks to keep the task "
+                        "count at, or 0 to not scale on CPU",
+            Type="Number",
+            Default="60",
+            MinValue="0",
+            MaxValue="100",
+        ),
+        group="Application Server",
+        label="Web Worker CPU Target",
+    ))
+
+    web_worker_memory_target = Ref(template.add_parameter(
+        Parameter(
+            "WebWorkerMemoryTarget",
+            Description="Average memory utilization (percent) of the web worker tasks to keep the "
+                        "task count at, or 0 to not scale on memory",
+            Type="Number",
+            Default="0",
+            MinValue="0",
+            MaxValue="100",
+        ),
+        group="Application Server",
+        label="Web Worker Memory Target",
+    ))
+
+    min_container_instances = Ref(template.add_parameter(
+        Parameter(
+            "MinScale",
+            Description="Minimum container instances count; the cluster's capacity provider scales the "
+                        "instances between this and MaxScale to fit the tasks",
+            Type="Number",
+            Default="1",
+        ),
+        group="Application Server",
+        label="Minimum Instance Count",
+    ))
+
+    container_target_capacity = Ref(template.add_parameter(
+        Parameter(
+            "ContainerTargetCapacity",
+            Description="Percentage of the container instances' capacity the tasks should use; less "
+                        "than 100 keeps spare instances ready to place new tasks on",
+            Type="Number",
+            Default="100",
+            MinValue="1",
+            MaxValue="100",
+        ),
+        group="Application Server",
+        label="Target Capacity",
+    ))
+
+    # Instance types the Auto Scaling group can launch in addition to
+    # ContainerInstanceType, which should have similar CPU and memory
+    container_alternate_instance_types = [
+        Ref(template.add_parameter(
+            Parameter(
+                "ContainerInstanceType%d" % number,
+                Description="An alternative instance type to launch when ContainerInstanceType "
+                            "isn't available, or is more expensive as a spot instance (optional)",
+                Type="String",
+                Default="",
+                AllowedValues=[""] + container_instance_types,
+            ),
+            group="Application Server",
+            label="Instance Type %d" % number,
+        ))
+        for number in (2, 3)
+    ]
+
+    container_on_demand_base_capacity = Ref(template.add_parameter(
+        Parameter(
+            "ContainerOnDemandBaseCapacity",
+            Description="Number of container instances to always launch as on-demand instances",
+            Type="Number",
+            Default="0",
+            MinValue="0",
+        ),
+        group="Application Server",
+        label="On-Demand Base Capacity",
+    ))
+
+    container_on_demand_percentage = Ref(template.add_parameter(
+        Parameter(
+            "ContainerOnDemandPercentage",
+            Description="Percentage of the container instances beyond ContainerOnDemandBaseCapacity "
+                        "to launch as on-demand instances; the rest are spot instances",
+            Type="Number",
+            Default="100",
+            MinValue="0",
+            MaxValue="100",
+        ),
+        group="Application Server",
+        label="On-Demand Percentage",
+    ))
+
+    container_architecture = Ref(template.add_parameter(
+        Parameter(
+            "ContainerArchitecture",
+            Description="The processor architecture of the container instances, and so of the AMI they "
+                        "launch from and their instance types (arm64 requires Graviton instance types)",
+            Type="String",
+            Default="x86_64",
+            AllowedValues=["x86_64", "arm64"],
+        ),
+        group="Application Server",
+        label="Architecture",
+    ))
+
+    # The current Amazon Linux 2023 ECS-optimized AMIs, looked up whenever the stack
+    # is created or updated; to pin an AMI, use a Systems Manager parameter of your own
+    # https://docs.aws.amazon.com/AmazonECS/latest/developerguide/retrieve-ecs-optimized_AMI.html
+    container_ami_x86_64, container_ami_arm64 = [
+        Ref(template.add_parameter(
+            Parameter(
+                name,
+                Description="Systems Manager parameter with the ID of the ECS-optimized AMI for %s "
+                            "container instances" % architecture,
+                Type="AWS::SSM::Parameter::Value<AWS::EC2::Image::Id>",
+                Default=default,
+            ),
+            group="Application Server",
+            label="%s AMI" % architecture,
+        ))
+        for name, architecture, default in [
+            ("ContainerAmiX86", "x86_64", "/aws/service/ecs/optimized-ami/amazon-linux-2023/recommended/image_id"),
+            (
+                "ContainerAmiArm64",
+                "arm64",
+                "/aws/service/ecs/optimized-ami/amazon-linux-2023/arm64/recommended/image_id",
+            ),
+        ]
+    ]
+
+    app_revision = Ref(template.add_parameter(
+        Parameter(
+            "WebAppRevision",
+            Description="An optional docker app revision to deploy",
+            Type="String",
+            Default="",
+        ),
+        group="Application Server",
+        label="App Revision",
+    ))
+
+    deploy_condition = "Deploy"
+    template.add_condition(deploy_condition, Not(Equals(app_revision, "")))
+
+    web_worker_scaling_condition = "WebWorkerScaling"
+    template.add_condition(web_worker_scaling_condition, And(
+        Condition(deploy_condition),
+        Not(Equals(web_worker_max_count, "0")),
+    ))
+
+    web_worker_cpu_scaling_condition = "WebWorkerCPUScaling"
+    template.add_condition(web_worker_cpu_scaling_condition, And(
+        Condition(web_worker_scaling_condition),
+        Not(Equals(web_worker_cpu_target, "0")),
+    ))
+
+    web_worker_memory_scaling_condition = "WebWorkerMemoryScaling"
+    template.add_condition(web_worker_memory_scaling_condition, And(
+        Condition(web_worker_scaling_condition),
+        Not(Equals(web_worker_memory_target, "0")),
+    ))
+
+    if use_alb:
+        web_worker_request_count_target = Ref(template.add_parameter(
+            Parameter(
+                "WebWorkerRequestCountTarget",
+                Description="Number of requests per minute per web worker task to keep the task count "
+                            "at, or 0 to not scale on requests",
+                Type="Number",
+                Default="0",
+                MinValue="0",
+            ),
+            group="Application Server",
+            label="Web Worker Request Count Target",
+        ))
+
+        web_worker_request_count_scaling_condition = "WebWorkerRequestCountScaling"
+        template.add_condition(web_worker_request_count_scaling_condition, And(
+            Condition(web_worker_scaling_condition),
+            Not(Equals(web_worker_request_count_target, "0")),
+        ))
+
+    container_alternate_instance_type_conditions = []
+    for number, instance_type in zip((2, 3), container_alternate_instance_types):
+        condition = "ContainerInstanceType%dCondition" % number
+        template.add_condition(condition, Not(Equals(instance_type, "")))
+        container_alternate_instance_type_conditions.append(condition)
+
+    # Instance types that can't be launched EBS-optimized
+    # https://docs.aws.amazon.com/AWSEC2/latest/UserGuide/ebs-optimized.html
+    not_ebs_optimized_instance_types = [
+        t for t in container_instance_types
+        if t.startswith("t2.") or t in ("c3.large", "c3.8xlarge", "g2.8xlarge", "m3.medium", "m3.large",
+                                        "r3.large", "r3.8xlarge")
+    ]
+
+    # The launch template only asks for EBS optimization if all of the instance
+    # types support it (Fn::Or takes at most 10 conditions, so they're compared in
+    # groups)
+    container_ebs_optimized_condition = "ContainerEbsOptimized"
+    template.add_condition(container_ebs_optimized_condition, Not(Or(*[
+        Or(*[Equals(ref, t) for t in not_ebs_optimized_instance_types[i:i + 10]])
+        for ref in [container_instance_type] + container_alternate_instance_types
+        for i in range(0, len(not_ebs_optimized_instance_types), 10)
+    ])))
+
+    container_architecture_arm64_condition = "ContainerArchitectureArm64"
+    template.add_condition(container_architecture_arm64_condition, Equals(container_architecture, "arm64"))
+
+    # The instance types must suit the AMI's architecture
+    container_instance_type_refs = [container_instance_type] + container_alternate_instance_types
+    template.add_assertion(
+        "Arm64ContainerInstanceTypes",
+        And(*[Contains([""] + arm64_instance_types, ref) for ref in container_instance_type_refs]),
+        "The container instance types must be Graviton instance types for the arm64 architecture",
+        condition=Equals(container_architecture, "arm64"),
+    )
+    template.add_assertion(
+        "X86ContainerInstanceTypes",
+        And(*[Not(Contains(arm64_instance_types, ref)) for ref in container_instance_type_refs]),
+        "The container instance types can't be Graviton instance types for the x86_64 architecture",
+        condition=Equals(container_architecture, "x86_64"),
+    )
+
+    # ECS cluster
+    cluster = Cluster(
+        "Cluster",
+        template=template,
+    )
+
+    container_instance_configuration_name = "ContainerLaunchTemplate"
+
+    autoscaling_group_name = "AutoScalingGroup"
+
+    container_instance_configuration = ec2.LaunchTemplate(
+        container_instance_configuration_name,
+        template=template,
+        Metadata=autoscaling.Metadata(
+            cloudformation.Init(dict(
+                config=cloudformation.InitConfig(
+                    commands=dict(
+                        register_cluster=dict(command=Join("", [
+                            "#!/bin/bash\n",
+                            # Register the cluster
+                            "echo ECS_CLUSTER=",
+                            Ref(cluster),
+                            " >> /etc/ecs/ecs.config\n",
+                            # Enable CloudWatch docker logging
+                            'echo \'ECS_AVAILABLE_LOGGING_DRIVERS=',
+                            '["json-file","awslogs"]\'',
+                            " >> /etc/ecs/ecs.config\n",
+                            # Drain the tasks from spot instances that are about
+                            # to be interrupted
+                            "echo ECS_ENABLE_SPOT_INSTANCE_DRAINING=true",
+                            " >> /etc/ecs/ecs.config\n",
+                        ]))
                     ),
-                    "/etc/cfn/hooks.d/cfn-auto-reloader.conf":
-                    cloudformation.InitFile(
-                        content=Join("", [
-                            "[cfn-auto-reloader-hook]\n",
-                            "triggers=post.update\n",
-                            "path=Resources.%s."
-                            % container_instance_configuration_name,
-                            "Metadata.AWS::CloudFormation::Init\n",
-                            "action=/opt/aws/bin/cfn-init -v ",
-                            "         --stack ",
-                            Ref(AWS_STACK_NAME),
-                            "         --resource %s"
-                            % container_instance_configuration_name,
-                            "         --region ",
-                            Ref("AWS::Region"),
-                            "\n",
-                            "runas=root\n",
-                        ])
-                    )
-                }),
-                services=dict(
-                    sysvinit=cloudformation.InitServices({
-                        'cfn-hup': cloudformation.InitService(
-                            enabled=True,
-                            ensureRunning=True,
-                            files=[
-                                "/etc/cfn/cfn-hup.conf",
-                                "/etc/cfn/hooks.d/cfn-auto-reloader.conf",
-                            ]
+                    files=cloudformation.InitFiles({
+                        "/etc/cfn/cfn-hup.conf": cloudformation.InitFile(
+                            content=Join("", [
+                                "[main]\n",
+                                "stack=",
+                                Ref(AWS_STACK_ID),
+                                "\n",
+                                "region=",
+                                Ref(AWS_REGION),
+                                "\n",
+                            ]),
+                            mode="000400",
+                            owner="root",
+                            group="root",
+                        ),
+                        "/etc/systemd/system/cfn-hup.service": cloudformation.InitFile(
+                            content=Join("", [
+                                "[Unit]\n",
+                                "Description=cfn-hup daemon\n",
+                                "[Service]\n",
+                                "Type=simple\n",
+                                "ExecStart=/opt/aws/bin/cfn-hup\n",
+                                "Restart=always\n",
+                                "[Install]\n",
+                                "WantedBy=multi-user.target\n",
+                            ]),
+                            mode="000644",
+                            owner="root",
+                            group="root",
                         ),
-                    })
+                        "/etc/cfn/hooks.d/cfn-auto-reloader.conf":
+                        cloudformation.InitFile(
+                            content=Join("", [
+                                "[cfn-auto-reloader-hook]\n",
+                                "triggers=post.update\n",
+                                "path=Resources.%s."
+                                % container_instance_configuration_name,
+                                "Metadata.AWS::CloudFormation::Init\n",
+                                "action=/opt/aws/bin/cfn-init -v ",
+                                "         --stack ",
+                                Ref(AWS_STACK_NAME),
+                                "         --resource %s"
+                                % container_instance_configuration_name,
+                                "         --region ",
+                                Ref("AWS::Region"),
+                                "\n",
+                                "runas=root\n",
+                            ])
+                        )
+                    }),
+                    services=dict(
+                        # Amazon Linux 2023 uses systemd rather than SysV init
+                        systemd=cloudformation.InitServices({
+                            'cfn-hup': cloudformation.InitService(
+                                enabled=True,
+                                ensureRunning=True,
+                                files=[
+                                    "/etc/cfn/cfn-hup.conf",
+                                    "/etc/cfn/hooks.d/cfn-auto-reloader.conf",
+                                ]
+                            ),
+                        })
+                    )
                 )
+            ))
+        ),
+        LaunchTemplateData=ec2.LaunchTemplateData(
+            SecurityGroupIds=[Ref(container_security_group)],
+            ImageId=If(container_architecture_arm64_condition, container_ami_arm64, container_ami_x86_64),
+            IamInstanceProfile=ec2.IamInstanceProfile(Arn=GetAtt(container_instance_profile, "Arn")),
+            BlockDeviceMappings=[
+                ec2.LaunchTemplateBlockDeviceMapping(
+                    DeviceName="/dev/xvda",
+                    Ebs=ec2.EBSBlockDevice(
+                        DeleteOnTermination=True,
+                        Encrypted=use_aes256_encryption,
+                        KmsKeyId=If(use_cmk_arn, Ref(cmk_arn), NoValue),
+                        VolumeType="gp3",
+                        VolumeSize=container_volume_size,
+                    ),
+                ),
+            ],
+            EbsOptimized=If(container_ebs_optimized_condition, True, NoValue),
+            Monitoring=ec2.Monitoring(Enabled=True),
+            MetadataOptions=ec2.MetadataOptions(
+                HttpTokens="required",
+                # Allow one more hop for containers using bridge networking
+                HttpPutResponseHopLimit=2,
+            ),
+            UserData=Base64(Join('', [
+                "#!/bin/bash -xe\n",
+                "yum install -y aws-cfn-bootstrap\n",
+                "/opt/aws/bin/cfn-init -v ",
+                "         --stack ", Ref(AWS_STACK_NAME),
+                "         --resource %s " % container_instance_configuration_name,
+                "         --region ", Ref(AWS_REGION), "\n",
+                "/opt/aws/bin/cfn-signal -e $? ",
+                "         --stack ", Ref(AWS_STACK_NAME),
+                "         --resource %s " % container_instance_configuration_name,
+                "         --region ", Ref(AWS_REGION), "\n",
+            ])),
+        ),
+    )
+
+    autoscaling_group = autoscaling.AutoScalingGroup(
+        autoscaling_group_name,
+        template=template,
+        VPCZoneIdentifier=[Ref(private_subnet_a), Ref(private_subnet_b)],
+        MinSize=min_container_instances,
+        MaxSize=max_container_instances,
+        # DesiredCapacity is left to the capacity provider; setting it here would
+        # reset the group to it on every stack update
+        # Required by the capacity provider's managed termination protection, so
+        # that only instances without tasks are scaled in
+        NewInstancesProtectedFromScaleIn=True,
+        MixedInstancesPolicy=autoscaling.MixedInstancesPolicy(
+            InstancesDistribution=autoscaling.InstancesDistribution(
+                OnDemandBaseCapacity=container_on_demand_base_capacity,
+                OnDemandPercentageAboveBaseCapacity=container_on_demand_percentage,
+                SpotAllocationStrategy="price-capacity-optimized",
+            ),
+            LaunchTemplate=autoscaling.LaunchTemplate(
+                LaunchTemplateSpecification=autoscaling.LaunchTemplateSpecification(
+                    LaunchTemplateId=Ref(container_instance_configuration),
+                    Version=GetAtt(container_instance_configuration, "LatestVersionNumber"),
+                ),
+                Overrides=[autoscaling.LaunchTemplateOverrides(InstanceType=container_instance_type)] + [
+                    If(condition, autoscaling.LaunchTemplateOverrides(InstanceType=instance_type), NoValue)
+                    for condition, instance_type in zip(
+                        container_alternate_instance_type_conditions, container_alternate_instance_types
+                    )
+                ],
+            ),
+        ),
+        # With an ALB, ECS registers the tasks (rather than the instances) with it
+        **({} if use_alb else dict(LoadBalancerNames=[Ref(load_balancer)])),
+        # Since one instance within the group is a reserved slot
+        # for rolling ECS service upgrade, it's not possible to rely
+        # on a "dockerized" `ELB` health-check, else this reserved
+        # instance will be flagged as `unhealthy` and won't stop respawning'
+        HealthCheckType="EC2",
+        HealthCheckGracePeriod=300,
+    )
+
+    # Scale the container instances with the tasks placed on them
+    capacity_provider = CapacityProvider(
+        "ContainerCapacityProvider",
+        template=template,
+        AutoScalingGroupProvider=AutoScalingGroupProvider(
+            AutoScalingGroupArn=Ref(autoscaling_group),
+            ManagedScaling=ManagedScaling(
+                Status="ENABLED",
+                TargetCapacity=container_target_capacity,
+                MinimumScalingStepSize=1,
+                MaximumScalingStepSize=10,
+                InstanceWarmupPeriod=300,
+            ),
+            ManagedTerminationProtection="ENABLED",
+        ),
+    )
+
+    capacity_provider_associations_name = "ClusterCapacityProviders"
+
+    # A separate resource, because the cluster's instances (and so the capacity
+    # provider) refer to the cluster
+    ClusterCapacityProviderAssociations(
+        capacity_provider_associations_name,
+        template=template,
+        Cluster=Ref(cluster),
+        CapacityProviders=[Ref(capacity_provider)],
+        DefaultCapacityProviderStrategy=[CapacityProviderStrategy(
+            CapacityProvider=Ref(capacity_provider),
+            Weight=1,
+        )],
+    )
+
+    # ECS task
+    web_task_definition = TaskDefinition(
+        "WebTask",
+        template=template,
+        Condition=deploy_condition,
+        ContainerDefinitions=[
+            ContainerDefinition(
+                Name="WebWorker",
+                #  1024 is full CPU
+                Cpu=web_worker_cpu,
+                Memory=web_worker_memory,
+                Essential=True,
+                Image=Join("", [
+                    Ref(AWS_ACCOUNT_ID),
+                    ".dkr.ecr.",
+                    Ref(AWS_REGION),
+                    ".amazonaws.com/",
+                    Ref(repository),
+                    ":",
+                    app_revision,
+                ]),
+                PortMappings=[PortMapping(
+                    ContainerPort=web_worker_port,
+                    # 0 lets Docker choose a free host port, so that several
+                    # tasks can run on an instance behind an ALB
+                    HostPort=0 if use_alb else web_worker_port,
+                )],
+                LogConfiguration=LogConfiguration(
+                    LogDriver="awslogs",
+                    Options={
+                        'awslogs-group': Ref(container_log_group),
+                        'awslogs-region': Ref(AWS_REGION),
+                        'awslogs-stream-prefix': Ref(AWS_STACK_NAME),
+                    }
+                ),
+                Environment=[
+                    Environment(Name=k, Value=v)
+                    for k, v in environment_variables
+                ] + [
+                    Environment(Name="PORT", Value=web_worker_port),
+                ],
             )
-        ))
-    ),
-    SecurityGroups=[Ref(container_security_group)],
-    InstanceType=container_instance_type,
-    ImageId=FindInMap("ECSRegionMap", Ref(AWS_REGION), "AMI"),
-    IamInstanceProfile=Ref(container_instance_profile),
-    UserData=Base64(Join('', [
-        "#!/bin/bash -xe\n",
-        "yum install -y aws-cfn-bootstrap\n",
-        "/opt/aws/bin/cfn-init -v ",
-        "         --stack ", Ref(AWS_STACK_NAME),
-        "         --resource %s " % container_instance_configuration_name,
-        "         --region ", Ref(AWS_REGION), "\n",
-        "/opt/aws/bin/cfn-signal -e $? ",
-        "         --stack ", Ref(AWS_STACK_NAME),
-        "         --resource %s " % container_instance_configuration_name,
-        "         --region ", Ref(AWS_REGION), "\n",
-    ])),
-)
+        ],
+    )
 
-autoscaling_group = autoscaling.AutoScalingGroup(
-    autoscaling_group_name,
-    template=template,
-    VPCZoneIdentifier=[Ref(private_subnet_a), Ref(private_subnet_b)],
-    MinSize=desired_container_instances,
-    MaxSize=max_container_instances,
-    DesiredCapacity=desired_container_instances,
-    LaunchConfigurationName=Ref(container_instance_configuration),
-    LoadBalancerNames=[Ref(load_balancer)],
-    # Since one instance within the group is a reserved slot
-    # for rolling ECS service upgrade, it's not possible to rely
-    # on a "dockerized" `ELB` health-check, else this reserved
-    # instance will be flagged as `unhealthy` and won't stop respawning'
-    HealthCheckType="EC2",
-    HealthCheckGracePeriod=300,
-)
+    if use_alb:
+        listener_name, target_group = build.get("load_balancer", "listener_name", "target_group")
 
-# ECS task
-web_task_definition = TaskDefinition(
-    "WebTask",
-    template=template,
-    Condition=deploy_condition,
-    ContainerDefinitions=[
-        ContainerDefinition(
-            Name="WebWorker",
-            #  1024 is full CPU
-            Cpu=web_worker_cpu,
-            Memory=web_worker_memory,
-            Essential=True,
-            Image=Join("", [
-                Ref(AWS_ACCOUNT_ID),
-                ".dkr.ecr.",
-                Ref(AWS_REGION),
-                ".amazonaws.com/",
-                Ref(repository),
-                ":",
-                app_revision,
-            ]),
-            PortMappings=[PortMapping(
+        app_service_options = dict(
+            DependsOn=[capacity_provider_associations_name, listener_name],
+            LoadBalancers=[LoadBalancer(
+                ContainerName="WebWorker",
                 ContainerPort=web_worker_port,
-                HostPort=web_worker_port,
+                TargetGroupArn=Ref(target_group),
             )],
-            LogConfiguration=LogConfiguration(
-                LogDriver="awslogs",
-                Options={
-                    'awslogs-group': Ref(container_log_group),
-                    'awslogs-region': Ref(AWS_REGION),
-                    'awslogs-stream-prefix': Ref(AWS_STACK_NAME),
-                }
-            ),
-            Environment=[
-                Environment(Name=k, Value=v)
-                for k, v in environment_variables
-            ] + [
-                Environment(Name="PORT", Value=web_worker_port),
+            # Spread the tasks across the availability zones, then pack them onto as
+            # few instances as their memory allows, so that the capacity provider
+            # can scale in the instances left idle
+            PlacementStrategies=[
+                PlacementStrategy(Type="spread", Field="attribute:ecs.availability-zone"),
+                PlacementStrategy(Type="binpack", Field="memory"),
             ],
+            # ECS uses its service-linked role to register the tasks
+        )
+    else:
+        app_service_role = iam.Role(
+            "AppServiceRole",
+            template=template,
+            AssumeRolePolicyDocument=dict(Statement=[dict(
+                Effect="Allow",
+                Principal=dict(Service=["ecs.amazonaws.com"]),
+                Action=["sts:AssumeRole"],
+            )]),
+            Path="/",
+            Policies=[
+                iam.Policy(
+                    PolicyName="WebServicePolicy",
+                    PolicyDocument=dict(
+                        Statement=[dict(
+                            Effect="Allow",
+                            Action=[
+                                "elasticloadbalancing:Describe*",
+                                "elasticloadbalancing"
+                                ":DeregisterInstancesFromLoadBalancer",
+                                "elasticloadbalancing"
+                                ":RegisterInstancesWithLoadBalancer",
+                                "ec2:Describe*",
+                                "ec2:AuthorizeSecurityGroupIngress",
+                            ],
+                            Resource="*",
+                        )],
+                    ),
+                ),
+            ]
         )
-    ],
-)
 
-app_service_role = iam.Role(
-    "AppServiceRole",
-    template=template,
-    AssumeRolePolicyDocument=dict(Statement=[dict(
-        Effect="Allow",
-        Principal=dict(Service=["ecs.amazonaws.com"]),
-        Action=["sts:AssumeRole"],
-    )]),
-    Path="/",
-    Policies=[
-        iam.Policy(
-            PolicyName="WebServicePolicy",
-            PolicyDocument=dict(
-                Statement=[dict(
-                    Effect="Allow",
-                    Action=[
-                        "elasticloadbalancing:Describe*",
-                        "elasticloadbalancing"
-                        ":DeregisterInstancesFromLoadBalancer",
-                        "elasticloadbalancing"
-                        ":RegisterInstancesWithLoadBalancer",
-                        "ec2:Describe*",
-                        "ec2:AuthorizeSecurityGroupIngress",
-                    ],
-                    Resource="*",
-                )],
-            ),
-        ),
+        app_service_options = dict(
+            DependsOn=[capacity_provider_associations_name],
+            LoadBalancers=[LoadBalancer(
+                ContainerName="WebWorker",
+                ContainerPort=web_worker_port,
+                LoadBalancerName=Ref(load_balancer),
+            )],
+            Role=Ref(app_service_role),
+        )
+
+    app_service = Service(
+        "AppService",
+        template=template,
+        Cluster=Ref(cluster),
+        Condition=deploy_condition,
+        DesiredCount=If(web_worker_scaling_condition, NoValue, web_worker_desired_count),
+        CapacityProviderStrategy=[CapacityProviderStrategyItem(
+            CapacityProvider=Ref(capacity_provider),
+            Weight=1,
+        )],
+        TaskDefinition=Ref(web_task_definition),
+        **app_service_options
+    )
+
+    # Application Auto Scaling of the number of web worker tasks
+    app_service_scalable_target = applicationautoscaling.ScalableTarget(
+        "AppServiceScalableTarget",
+        template=template,
+        Condition=web_worker_scaling_condition,
+        ServiceNamespace="ecs",
+        ScalableDimension="ecs:service:DesiredCount",
+        ResourceId=Join("/", ["service", Ref(cluster), GetAtt(app_service, "Name")]),
+        MinCapacity=web_worker_min_count,
+        MaxCapacity=web_worker_max_count,
+        # The service-linked role, which Application Auto Scaling creates if needed
+        RoleARN=Join("", [
+            arn_prefix,
+            ":iam::",
+            Ref(AWS_ACCOUNT_ID),
+            ":role/aws-service-role/ecs.application-autoscaling.amazonaws.com/",
+            "AWSServiceRoleForApplicationAutoScaling_ECSService",
+        ]),
+    )
+
+    scaling_policies = [
+        ("AppServiceCPUScalingPolicy", web_worker_cpu_scaling_condition,
+         "ECSServiceAverageCPUUtilization", web_worker_cpu_target, None),
+        ("AppServiceMemoryScalingPolicy", web_worker_memory_scaling_condition,
+         "ECSServiceAverageMemoryUtilization", web_worker_memory_target, None),
     ]
-)
 
-app_service = Service(
-    "AppService",
-    template=template,
-    Cluster=Ref(cluster),
-    Condition=deploy_condition,
-    DependsOn=[autoscaling_group_name],
-    DesiredCount=web_worker_desired_count,
-    LoadBalancers=[LoadBalancer(
-        ContainerName="WebWorker",
-        ContainerPort=web_worker_port,
-        LoadBalancerName=Ref(load_balancer),
-    )],
-    TaskDefinition=Ref(web_task_definition),
-    Role=Ref(app_service_role),
-)
+    if use_alb:
+        scaling_policies.append(
+            ("AppServiceRequestCountScalingPolicy", web_worker_request_count_scaling_condition,
+             "ALBRequestCountPerTarget", web_worker_request_count_target,
+             # app/<load balancer name>/<id>/targetgroup/<target group name>/<id>
+             Join("/", [GetAtt(load_balancer, "LoadBalancerFullName"), GetAtt(target_group, "TargetGroupFullName")])),
+        )
+
+    for name, condition, metric_type, target_value, resource_label in scaling_policies:
+        applicationautoscaling.ScalingPolicy(
+            name,
+            template=template,
+            Condition=condition,
+            PolicyName=Join("-", [Ref(AWS_STACK_NAME), name]),
+            PolicyType="TargetTrackingScaling",
+            ScalingTargetId=Ref(app_service_scalable_target),
+            TargetTrackingScalingPolicyConfiguration=applicationautoscaling.TargetTrackingScalingPolicyConfiguration(
+                PredefinedMetricSpecification=applicationautoscaling.PredefinedMetricSpecification(
+                    PredefinedMetricType=metric_type,
+                    **({} if resource_label is None else dict(ResourceLabel=resource_label))
+                ),
+                TargetValue=target_value,
+                ScaleOutCooldown=60,
+                ScaleInCooldown=300,
+            ),
+        )
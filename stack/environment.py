@@ -1,100 +1,136 @@
 from troposphere import AWS_REGION, GetAtt, If, Join, Ref
 
-from . import USE_GOVCLOUD
-from .assets import (
-    assets_bucket,
-    assets_cloudfront_domain,
-    assets_custom_domain_condition,
-    assets_use_cloudfront_condition,
-    distribution,
-    private_assets_bucket
-)
-from .cache import cache_url, redis_url
-from .common import secret_key
-from .database import (
-    db_condition,
-    db_engine,
-    db_instance,
-    db_name,
-    db_password,
-    db_replica,
-    db_replication_condition,
-    db_user
-)
-from .domain import domain_name, domain_name_alternates
 
-if not USE_GOVCLOUD:
-    # not supported by GovCloud, so add it only if it was created (and in this
-    # case we want to avoid importing if it's not needed)
-    from .search import es_condition, es_domain
-else:
-    es_domain = None
-
-environment_variables = [
-    ("AWS_REGION", Ref(AWS_REGION)),
-    ("AWS_STORAGE_BUCKET_NAME", Ref(assets_bucket)),
-    ("AWS_PRIVATE_STORAGE_BUCKET_NAME", Ref(private_assets_bucket)),
-    ("DOMAIN_NAME", domain_name),
-    ("ALTERNATE_DOMAIN_NAMES", Join(',', domain_name_alternates)),
-    ("SECRET_KEY", secret_key),
-    ("DATABASE_URL", If(
-        db_condition,
-        Join("", [
-            Ref(db_engine),
-            "://",
-            Ref(db_user),
-            ":",
-            Ref(db_password),
-            "@",
-            GetAtt(db_instance, 'Endpoint.Address'),
-            ":",
-            GetAtt(db_instance, 'Endpoint.Port'),
-            "/",
-            Ref(db_name),
-        ]),
-        "",  # defaults to empty string if no DB was created
-    )),
-    ("DATABASE_REPLICA_URL", If(
-        db_replication_condition,
-        Join("", [
-            Ref(db_engine),
-            "://",
-            Ref(db_user),
-            ":",
-            Ref(db_password),
-            "@",
-            GetAtt(db_replica, 'Endpoint.Address'),
-            ":",
-            GetAtt(db_replica, 'Endpoint.Port'),
-            "/",
-            Ref(db_name),
-        ]),
-        "",  # defaults to empty string if no DB was created
-    )),
-    ("CACHE_URL", cache_url),
-    ("REDIS_URL", redis_url),
-]
-
-if distribution:
-    # not supported by GovCloud, so add it only if it was created
-    environment_variables.append(
-        ("CDN_DOMAIN_NAME", If(
-            assets_use_cloudfront_condition,
-            If(
-                # use the custom domain passed into the stack, otherwise fallback to the default domain
-                assets_custom_domain_condition,
-                Ref(assets_cloudfront_domain),
-                GetAtt(distribution, "DomainName"),
-            ),
-            "",
-        )),
+def add_environment(build):
+    """
+    Return the application's environment variables, as a list of (name, value)
+    tuples, for the stack modules that run it.
+    """
+    use_govcloud = "USE_GOVCLOUD" in build.flags
+    (
+        assets_bucket,
+        assets_cloudfront_domain,
+        assets_custom_domain_condition,
+        assets_use_cloudfront_condition,
+        distribution,
+        private_assets_bucket,
+    ) = build.get(
+        "assets",
+        "assets_bucket",
+        "assets_cloudfront_domain",
+        "assets_custom_domain_condition",
+        "assets_use_cloudfront_condition",
+        "distribution",
+        "private_assets_bucket",
     )
+    secret_key = build.get("common", "secret_key")
+    domain_name, domain_name_alternates = build.get("domain", "domain_name", "domain_name_alternates")
+
+    if not use_govcloud and "search" in build.components:
+        # not supported by GovCloud, so add it only if it was created (and in this
+        # case we want to avoid adding it if it's not needed)
+        es_condition, es_domain = build.get("search", "es_condition", "es_domain")
+    else:
+        es_domain = None
 
-if es_domain:
-    # not supported by GovCloud, so add it only if it was created
-    environment_variables += [
-        ("ELASTICSEARCH_ENDPOINT", If(es_condition, GetAtt(es_domain, "DomainEndpoint"), "")),
-        ("ELASTICSEARCH_PORT", If(es_condition, "443", "")),
-        ("ELASTICSEARCH_USE_SSL", If(es_condition, "on", "")),
-        ("ELASTICSEARCH_VERIFY_CERTS", If(es_condition, "on", "")),
+    environment_variables = [
+        ("AWS_REGION", Ref(AWS_REGION)),
+        ("AWS_STORAGE_BUCKET_NAME", Ref(assets_bucket)),
+        ("AWS_PRIVATE_STORAGE_BUCKET_NAME", Ref(private_assets_bucket)),
+        ("DOMAIN_NAME", domain_name),
+        ("ALTERNATE_DOMAIN_NAMES", Join(',', domain_name_alternates)),
+        ("SECRET_KEY", secret_key),
     ]
+
+    if "database" in build.components:
+        (
+            db_condition,
+            db_engine,
+            db_instance,
+            db_name,
+            db_password,
+            db_replica,
+            db_replication_condition,
+            db_user,
+        ) = build.get(
+            "database",
+            "db_condition",
+            "db_engine",
+            "db_instance",
+            "db_name",
+            "db_password",
+            "db_replica",
+            "db_replication_condition",
+            "db_user",
+        )
+
+        environment_variables += [
+            ("DATABASE_URL", If(
+                db_condition,
+                Join("", [
+                    Ref(db_engine),
+                    "://",
+                    Ref(db_user),
+                    ":",
+                    Ref(db_password),
+                    "@",
+                    GetAtt(db_instance, 'Endpoint.Address'),
+                    ":",
+                    GetAtt(db_instance, 'Endpoint.Port'),
+                    "/",
+                    Ref(db_name),
+                ]),
+                "",  # defaults to empty string if no DB was created
+            )),
+            ("DATABASE_REPLICA_URL", If(
+                db_replication_condition,
+                Join("", [
+                    Ref(db_engine),
+                    "://",
+                    Ref(db_user),
+                    ":",
+                    Ref(db_password),
+                    "@",
+                    GetAtt(db_replica, 'Endpoint.Address'),
+                    ":",
+                    GetAtt(db_replica, 'Endpoint.Port'),
+                    "/",
+                    Ref(db_name),
+                ]),
+                "",  # defaults to empty string if no DB was created
+            )),
+        ]
+
+    if "cache" in build.components:
+        cache_url, redis_url = build.get("cache", "cache_url", "redis_url")
+
+        environment_variables += [
+            ("CACHE_URL", cache_url),
+            ("REDIS_URL", redis_url),
+        ]
+
+    if distribution:
+        # not supported by GovCloud, so add it only if it was created
+        environment_variables.append(
+            ("CDN_DOMAIN_NAME", If(
+                assets_use_cloudfront_condition,
+                If(
+                    # use the custom domain passed into the stack, otherwise fallback to the default domain
+                    assets_custom_domain_condition,
+                    Ref(assets_cloudfront_domain),
+                    GetAtt(distribution, "DomainName"),
+                ),
+                "",
+            )),
+        )
+
+    if es_domain:
+        # not supported by GovCloud, so add it only if it was created
+        environment_variables += [
+            ("ELASTICSEARCH_ENDPOINT", If(es_condition, GetAtt(es_domain, "DomainEndpoint"), "")),
+            ("ELASTICSEARCH_PORT", If(es_condition, "443", "")),
+            ("ELASTICSEARCH_USE_SSL", If(es_condition, "on", "")),
+            ("ELASTICSEARCH_VERIFY_CERTS", If(es_condition, "on", "")),
+        ]
+
+    return dict(environment_variables=environment_variables)
@@ -1,95 +1,108 @@
 from troposphere import AWS_STACK_NAME, Equals, Join, Ref, autoscaling
 
-from .common import use_aes256_encryption
-from .containers import (
-    container_instance_profile,
-    container_instance_type,
-    container_volume_size,
-    desired_container_instances,
-    max_container_instances
-)
-from .load_balancer import load_balancer, web_worker_health_check
-from .security_groups import container_security_group
-from .template import template
-from .utils import ParameterWithDefaults as Parameter
-from .vpc import private_subnet_a, private_subnet_b
 
-ami = Ref(template.add_parameter(
-    Parameter(
-        "AMI",
-        Description="The Amazon Machine Image (AMI) to use for instances. Make "
-                    "sure to use the correct AMI for your region and instance "
-                    "type (t2 instances require HVM AMIs).",
-        Type="String",
-        Default="",
-    ),
-    group="Application Server",
-    label="Amazon Machine Image (AMI)",
-))
+def add_instances(build):
+    """
+    Add the autoscaling group of EC2 instances that run the application to the
+    template.
+    """
+    template = build.template
+    Parameter = build.Parameter
+    use_aes256_encryption = build.get("common", "use_aes256_encryption")
+    (
+        container_instance_profile,
+        container_instance_type,
+        container_volume_size,
+        desired_container_instances,
+        max_container_instances,
+    ) = build.get(
+        "containers",
+        "container_instance_profile",
+        "container_instance_type",
+        "container_volume_size",
+        "desired_container_instances",
+        "max_container_instances",
+    )
+    load_balancer, web_worker_health_check = build.get("load_balancer", "load_balancer", "web_worker_health_check")
+    container_security_group = build.get("security_groups", "container_security_group")
+    private_subnet_a, private_subnet_b = build.get("vpc", "private_subnet_a", "private_subnet_b")
 
-key_name = template.add_parameter(
-    Parameter(
-        "KeyName",
-        Description="Name of an existing EC2 KeyPair to enable SSH access to "
-                    "the AWS EC2 instances",
-        Type="AWS::EC2::KeyPair::KeyName",
-        ConstraintDescription="must be the name of an existing EC2 KeyPair."
-    ),
-    group="Application Server",
-    label="SSH Key Name",
-)
+    ami = Ref(template.add_parameter(
+        Parameter(
+            "AMI",
+            Description="The Amazon Machine Image (AMI) to use for instances. Make "
+                        "sure to use the correct AMI for your region and instance "
+                        "type (t2 instances require HVM AMIs).",
+            Type="String",
+            Default="",
+        ),
+        group="Application Server",
+        label="Amazon Machine Image (AMI)",
+    ))
+
+    key_name = template.add_parameter(
+        Parameter(
+            "KeyName",
+            Description="Name of an existing EC2 KeyPair to enable SSH access to "
+                        "the AWS EC2 instances",
+            Type="AWS::EC2::KeyPair::KeyName",
+            ConstraintDescription="must be the name of an existing EC2 KeyPair."
+        ),
+        group="Application Server",
+        label="SSH Key Name",
+    )
 
-tcp_health_check_condition = "TcpHealthCheck"
-template.add_condition(
-    tcp_health_check_condition,
-    Equals(web_worker_health_check, ""),
-)
+    tcp_health_check_condition = "TcpHealthCheck"
+    template.add_condition(
+        tcp_health_check_condition,
+        Equals(web_worker_health_check, ""),
+    )
 
-instance_configuration_name = "LaunchConfiguration"
+    instance_configuration_name = "LaunchConfiguration"
 
-autoscaling_group_name = "AutoScalingGroup"
+    autoscaling_group_name = "AutoScalingGroup"
 
-container_instance_configuration = autoscaling.LaunchConfiguration(
-    instance_configuration_name,
-    template=template,
-    SecurityGroups=[Ref(container_security_group)],
-    InstanceType=container_instance_type,
-    ImageId=ami,
-    IamInstanceProfile=Ref(container_instance_profile),
-    BlockDeviceMappings=[
-        autoscaling.BlockDeviceMapping(
-            DeviceName="/dev/sda1",
-            Ebs=autoscaling.EBSBlockDevice(
-                VolumeType="gp2",
-                VolumeSize=container_volume_size,
-                Encrypted=use_aes256_encryption,
-            )
-        ),
-    ],
-    KeyName=Ref(key_name),
-)
+    container_instance_configuration = autoscaling.LaunchConfiguration(
+        instance_configuration_name,
+        template=template,
+        SecurityGroups=[Ref(container_security_group)],
+        InstanceType=container_instance_type,
+        ImageId=ami,
+        IamInstanceProfile=Ref(container_instance_profile),
+        BlockDeviceMappings=[
+            autoscaling.BlockDeviceMapping(
+                DeviceName="/dev/sda1",
+                Ebs=autoscaling.EBSBlockDevice(
+                    VolumeType="gp2",
+                    VolumeSize=container_volume_size,
+                    Encrypted=use_aes256_encryption,
+                )
+            ),
+        ],
+        KeyName=Ref(key_name),
+    )
 
-autoscaling_group = autoscaling.AutoScalingGroup(
-    autoscaling_group_name,
-    template=template,
-    VPCZoneIdentifier=[Ref(private_subnet_a), Ref(private_subnet_b)],
-    MinSize=desired_container_instances,
-    MaxSize=max_container_instances,
-    DesiredCapacity=desired_container_instances,
-    LaunchConfigurationName=Ref(container_instance_configuration),
-    LoadBalancerNames=[Ref(load_balancer)],
-    HealthCheckType="EC2",
-    HealthCheckGracePeriod=300,
-    Tags=[
-        {
-            "Key": "Name",
-            "Value": Join("-", [Ref(AWS_STACK_NAME), "web_worker"]),
-            "PropagateAtLaunch": True,
-        },
-        {
-            "Key": "aws-web-stacks:role",
-            "Value": "worker",
-            "PropagateAtLaunch": True,
-        },
-    ],
-)
+    autoscaling.AutoScalingGroup(
+        autoscaling_group_name,
+        template=template,
+        VPCZoneIdentifier=[Ref(private_subnet_a), Ref(private_subnet_b)],
+        MinSize=desired_container_instances,
+        MaxSize=max_container_instances,
+        DesiredCapacity=desired_container_instances,
+        LaunchConfigurationName=Ref(container_instance_configuration),
+        LoadBalancerNames=[Ref(load_balancer)],
+        HealthCheckType="EC2",
+        HealthCheckGracePeriod=300,
+        Tags=[
+            {
+                "Key": "Name",
+                "Value": Join("-", [Ref(AWS_STACK_NAME), "web_worker"]),
+                "PropagateAtLaunch": True,
+            },
+            {
+                "Key": "aws-web-stacks:role",
+                "Value": "worker",
+                "PropagateAtLaunch": True,
+            },
+        ],
+    )
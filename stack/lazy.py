@@ -0,0 +1,52 @@
+"""
+Lazily imported troposphere and awacs service modules.
+
+Importing a troposphere or awacs service module defines a class for every
+resource and property type in that service, which adds up when a stack module
+imports several services but only builds resources from some of them, e.g.,
+assets.py only creates a CloudFront distribution outside of GovCloud. A module
+returned by lazy_import() isn't imported until one of its attributes is first
+used::
+
+    cloudfront = lazy_import("troposphere.cloudfront")
+
+    def add_assets(build):
+        if "USE_GOVCLOUD" not in build.flags:
+            distribution = cloudfront.Distribution(...)  # imported here
+"""
+
+import importlib
+import importlib.util
+import sys
+
+
+class LazyModule(object):
+    """
+    Stands in for a module until one of its attributes is first used, and then
+    imports it. Unlike importlib.util.LazyLoader, this is safe to use from
+    several threads at once (e.g., while building templates in each; see
+    build.build_template()), since the import system serializes imports.
+    """
+
+    def __init__(self, name):
+        self.__name__ = name
+
+    def __getattr__(self, name):
+        # returns the module from sys.modules once it's imported
+        return getattr(importlib.import_module(self.__name__), name)
+
+    def __repr__(self):
+        return "<lazily imported module %r>" % self.__name__
+
+
+def lazy_import(name):
+    """
+    Return the named module, deferring its import until one of its attributes
+    is accessed (see LazyModule). If the module has already been imported it's
+    returned as-is.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name) is None:
+        raise ImportError("No module named %r" % name, name=name)
+    return LazyModule(name)
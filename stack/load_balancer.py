@@ -1,152 +1,246 @@
-from troposphere import GetAtt, If, Join, Output, Ref
+from troposphere import Equals, GetAtt, If, Join, Output, Ref
 from troposphere import elasticloadbalancing as elb
 
-from . import USE_ECS, USE_GOVCLOUD
-from .security_groups import load_balancer_security_group
-from .template import template
-from .utils import ParameterWithDefaults as Parameter
-from .vpc import public_subnet_a, public_subnet_b
+from .lazy import lazy_import
 
-# Web worker
+# Only used for ECS with USE_ALB
+elbv2 = lazy_import("troposphere.elasticloadbalancingv2")
 
-if USE_ECS:
-    web_worker_port = Ref(template.add_parameter(
+
+def add_load_balancer(build):
+    """
+    Add the load balancer for the web workers to the template and return it and
+    the web worker settings that other stack modules use.
+    """
+    template = build.template
+    Parameter = build.Parameter
+    use_ecs = "USE_ECS" in build.flags
+    use_govcloud = "USE_GOVCLOUD" in build.flags
+    load_balancer_security_group = build.get("security_groups", "load_balancer_security_group")
+    public_subnet_a, public_subnet_b, vpc = build.get("vpc", "public_subnet_a", "public_subnet_b", "vpc")
+
+    # With USE_ALB, ECS registers each web worker task with an Application Load
+    # Balancer target group on the host port Docker assigns it, so several tasks can
+    # run on each container instance
+    use_alb = use_ecs and "USE_ALB" in build.flags
+
+    # Web worker
+
+    if use_ecs:
+        web_worker_port = Ref(template.add_parameter(
+            Parameter(
+                "WebWorkerPort",
+                Description="Web worker container exposed port",
+                Type="Number",
+                Default="8000",
+            ),
+            group="Load Balancer",
+            label="Web Worker Port",
+        ))
+    else:
+        # default to port 80 for EC2 and Elastic Beanstalk options
+        web_worker_port = Ref(template.add_parameter(
+            Parameter(
+                "WebWorkerPort",
+                Description="Default web worker exposed port (non-HTTPS)",
+                Type="Number",
+                Default="80",
+            ),
+            group="Load Balancer",
+            label="Web Worker Port",
+        ))
+
+    web_worker_protocol = Ref(template.add_parameter(
         Parameter(
-            "WebWorkerPort",
-            Description="Web worker container exposed port",
-            Type="Number",
-            Default="8000",
+            "WebWorkerProtocol",
+            Description="Web worker instance protocol",
+            Type="String",
+            Default="HTTP",
+            AllowedValues=["HTTP", "HTTPS"],
         ),
         group="Load Balancer",
-        label="Web Worker Port",
+        label="Web Worker Protocol",
     ))
-else:
-    # default to port 80 for EC2 and Elastic Beanstalk options
-    web_worker_port = Ref(template.add_parameter(
+
+    # Web worker health check
+
+    web_worker_health_check_protocol = Ref(template.add_parameter(
         Parameter(
-            "WebWorkerPort",
-            Description="Default web worker exposed port (non-HTTPS)",
-            Type="Number",
-            Default="80",
+            "WebWorkerHealthCheckProtocol",
+            Description="Web worker health check protocol",
+            Type="String",
+            # target groups can only check HTTP(S)
+            Default="HTTP" if use_alb else "TCP",
+            AllowedValues=["HTTP", "HTTPS"] if use_alb else ["TCP", "HTTP", "HTTPS"],
         ),
         group="Load Balancer",
-        label="Web Worker Port",
+        label="Health Check: Protocol",
     ))
 
-web_worker_protocol = Ref(template.add_parameter(
-    Parameter(
-        "WebWorkerProtocol",
-        Description="Web worker instance protocol",
-        Type="String",
-        Default="HTTP",
-        AllowedValues=["HTTP", "HTTPS"],
-    ),
-    group="Load Balancer",
-    label="Web Worker Protocol",
-))
-
-# Web worker health check
-
-web_worker_health_check_protocol = Ref(template.add_parameter(
-    Parameter(
-        "WebWorkerHealthCheckProtocol",
-        Description="Web worker health check protocol",
-        Type="String",
-        Default="TCP",
-        AllowedValues=["TCP", "HTTP", "HTTPS"],
-    ),
-    group="Load Balancer",
-    label="Health Check: Protocol",
-))
-
-web_worker_health_check_port = Ref(template.add_parameter(
-    Parameter(
-        "WebWorkerHealthCheckPort",
-        Description="Web worker health check port",
-        Type="Number",
-        Default="80",
-    ),
-    group="Load Balancer",
-    label="Health Check: Port",
-))
-
-web_worker_health_check = Ref(template.add_parameter(
-    Parameter(
-        "WebWorkerHealthCheck",
-        Description="Web worker health check URL path, e.g., \"/health-check\"; "
-                    "required unless WebWorkerHealthCheckProtocol is TCP",
-        Type="String",
-        Default="",
-    ),
-    group="Load Balancer",
-    label="Health Check: URL",
-))
-
-# Web load balancer
-
-listeners = [
-    elb.Listener(
-        LoadBalancerPort=80,
-        InstanceProtocol=web_worker_protocol,
-        InstancePort=web_worker_port,
-        Protocol='HTTP',
-    )
-]
-
-if USE_GOVCLOUD:
-    # configure the default HTTPS listener to pass TCP traffic directly,
-    # since GovCloud doesn't support the Certificate Manager (this can be
-    # modified to enable SSL termination at the load balancer via the AWS
-    # console, if needed)
-    listeners.append(elb.Listener(
-        LoadBalancerPort=443,
-        InstanceProtocol='TCP',
-        InstancePort=443,
-        Protocol='TCP',
+    if not use_alb:
+        # a target group checks each task on the port it receives traffic on
+        web_worker_health_check_port = Ref(template.add_parameter(
+            Parameter(
+                "WebWorkerHealthCheckPort",
+                Description="Web worker health check port",
+                Type="Number",
+                Default="80",
+            ),
+            group="Load Balancer",
+            label="Health Check: Port",
+        ))
+
+    web_worker_health_check = Ref(template.add_parameter(
+        Parameter(
+            "WebWorkerHealthCheck",
+            Description="Web worker health check URL path, e.g., \"/health-check\"; "
+                        "required unless WebWorkerHealthCheckProtocol is TCP",
+            Type="String",
+            Default="",
+        ),
+        group="Load Balancer",
+        label="Health Check: URL",
     ))
-else:
-    from .certificates import application as application_certificate
-    from .certificates import cert_condition
-    listeners.append(If(cert_condition, elb.Listener(
-        LoadBalancerPort=443,
-        InstanceProtocol=web_worker_protocol,
-        InstancePort=web_worker_port,
-        Protocol='HTTPS',
-        SSLCertificateId=application_certificate,
-    ), Ref("AWS::NoValue")))
-
-load_balancer = elb.LoadBalancer(
-    'LoadBalancer',
-    template=template,
-    Subnets=[
-        Ref(public_subnet_a),
-        Ref(public_subnet_b),
-    ],
-    SecurityGroups=[Ref(load_balancer_security_group)],
-    Listeners=listeners,
-    HealthCheck=elb.HealthCheck(
-        Target=Join("", [
-            web_worker_health_check_protocol,
-            ":",
-            web_worker_health_check_port,
-            web_worker_health_check,
-        ]),
-        HealthyThreshold="2",
-        UnhealthyThreshold="2",
-        Interval="100",
-        Timeout="10",
-    ),
-    CrossZone=True,
-)
-
-template.add_output(Output(
-    "LoadBalancerDNSName",
-    Description="Loadbalancer DNS",
-    Value=GetAtt(load_balancer, "DNSName")
-))
-
-template.add_output(Output(
-    "LoadBalancerHostedZoneID",
-    Description="Loadbalancer hosted zone",
-    Value=GetAtt(load_balancer, "CanonicalHostedZoneNameID")
-))
+
+    # Web load balancer
+
+    if use_alb:
+        web_worker_health_check_path_condition = "WebWorkerHealthCheckPathCondition"
+        template.add_condition(web_worker_health_check_path_condition, Equals(web_worker_health_check, ""))
+
+        load_balancer = elbv2.LoadBalancer(
+            "ApplicationLoadBalancer",
+            template=template,
+            Type="application",
+            Scheme="internet-facing",
+            Subnets=[
+                Ref(public_subnet_a),
+                Ref(public_subnet_b),
+            ],
+            SecurityGroups=[Ref(load_balancer_security_group)],
+        )
+
+        target_group = elbv2.TargetGroup(
+            "WebWorkerTargetGroup",
+            template=template,
+            VpcId=Ref(vpc),
+            TargetType="instance",
+            # ECS registers each task with its own (dynamic) host port
+            Port=web_worker_port,
+            Protocol=web_worker_protocol,
+            HealthCheckProtocol=web_worker_health_check_protocol,
+            HealthCheckPort="traffic-port",
+            HealthCheckPath=If(web_worker_health_check_path_condition, "/", web_worker_health_check),
+            HealthyThresholdCount=2,
+            UnhealthyThresholdCount=2,
+            HealthCheckIntervalSeconds=30,
+            HealthCheckTimeoutSeconds=10,
+            TargetGroupAttributes=[
+                elbv2.TargetGroupAttribute(Key="deregistration_delay.timeout_seconds", Value="30"),
+            ],
+        )
+
+        listener_name = "HttpListener"
+
+        elbv2.Listener(
+            listener_name,
+            template=template,
+            LoadBalancerArn=Ref(load_balancer),
+            Port=80,
+            Protocol="HTTP",
+            DefaultActions=[elbv2.Action(Type="forward", TargetGroupArn=Ref(target_group))],
+        )
+
+        application_certificate, cert_condition = build.get("certificates", "application", "cert_condition")
+
+        elbv2.Listener(
+            "HttpsListener",
+            template=template,
+            Condition=cert_condition,
+            LoadBalancerArn=Ref(load_balancer),
+            Port=443,
+            Protocol="HTTPS",
+            Certificates=[elbv2.Certificate(CertificateArn=application_certificate)],
+            DefaultActions=[elbv2.Action(Type="forward", TargetGroupArn=Ref(target_group))],
+        )
+
+        load_balancer_hosted_zone_attribute = "CanonicalHostedZoneID"
+    else:
+        target_group = listener_name = None
+
+        listeners = [
+            elb.Listener(
+                LoadBalancerPort=80,
+                InstanceProtocol=web_worker_protocol,
+                InstancePort=web_worker_port,
+                Protocol='HTTP',
+            )
+        ]
+
+        if use_govcloud:
+            # configure the default HTTPS listener to pass TCP traffic directly,
+            # since GovCloud doesn't support the Certificate Manager (this can be
+            # modified to enable SSL termination at the load balancer via the AWS
+            # console, if needed)
+            listeners.append(elb.Listener(
+                LoadBalancerPort=443,
+                InstanceProtocol='TCP',
+                InstancePort=443,
+                Protocol='TCP',
+            ))
+        else:
+            application_certificate, cert_condition = build.get("certificates", "application", "cert_condition")
+            listeners.append(If(cert_condition, elb.Listener(
+                LoadBalancerPort=443,
+                InstanceProtocol=web_worker_protocol,
+                InstancePort=web_worker_port,
+                Protocol='HTTPS',
+                SSLCertificateId=application_certificate,
+            ), Ref("AWS::NoValue")))
+
+        load_balancer = elb.LoadBalancer(
+            'LoadBalancer',
+            template=template,
+            Subnets=[
+                Ref(public_subnet_a),
+                Ref(public_subnet_b),
+            ],
+            SecurityGroups=[Ref(load_balancer_security_group)],
+            Listeners=listeners,
+            HealthCheck=elb.HealthCheck(
+                Target=Join("", [
+                    web_worker_health_check_protocol,
+                    ":",
+                    web_worker_health_check_port,
+                    web_worker_health_check,
+                ]),
+                HealthyThreshold="2",
+                UnhealthyThreshold="2",
+                Interval="100",
+                Timeout="10",
+            ),
+            CrossZone=True,
+        )
+
+        load_balancer_hosted_zone_attribute = "CanonicalHostedZoneNameID"
+
+    template.add_output(Output(
+        "LoadBalancerDNSName",
+        Description="Loadbalancer DNS",
+        Value=GetAtt(load_balancer, "DNSName")
+    ))
+
+    template.add_output(Output(
+        "LoadBalancerHostedZoneID",
+        Description="Loadbalancer hosted zone",
+        Value=GetAtt(load_balancer, load_balancer_hosted_zone_attribute)
+    ))
+
+    return dict(
+        listener_name=listener_name,
+        load_balancer=load_balancer,
+        target_group=target_group,
+        use_alb=use_alb,
+        web_worker_health_check=web_worker_health_check,
+        web_worker_port=web_worker_port,
+    )
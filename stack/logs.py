@@ -1,32 +1,39 @@
 from troposphere import Join, iam, logs
 
-from .common import arn_prefix
-from .template import template
 
-container_log_group = logs.LogGroup(
-    "ContainerLogs",
-    template=template,
-    RetentionInDays=365,
-    DeletionPolicy="Retain",
-)
+def add_logs(build):
+    """
+    Add the container log group to the template and return it and the policy
+    that allows writing to it.
+    """
+    template = build.template
+    arn_prefix = build.get("common", "arn_prefix")
 
+    container_log_group = logs.LogGroup(
+        "ContainerLogs",
+        template=template,
+        RetentionInDays=365,
+        DeletionPolicy="Retain",
+    )
 
-logging_policy = iam.Policy(
-    PolicyName="LoggingPolicy",
-    PolicyDocument=dict(
-        Statement=[dict(
-            Effect="Allow",
-            Action=[
-                "logs:Create*",
-                "logs:PutLogEvents",
-                # Needed by aws-for-fluent-bit:
-                "logs:DescribeLogGroups",
-                "logs:DescribeLogStreams",
-            ],
-            Resource=Join("", [
-                arn_prefix,
-                ":logs:*:*:*",  # allow logging to any log group
-            ]),
-        )],
-    ),
-)
+    logging_policy = iam.Policy(
+        PolicyName="LoggingPolicy",
+        PolicyDocument=dict(
+            Statement=[dict(
+                Effect="Allow",
+                Action=[
+                    "logs:Create*",
+                    "logs:PutLogEvents",
+                    # Needed by aws-for-fluent-bit:
+                    "logs:DescribeLogGroups",
+                    "logs:DescribeLogStreams",
+                ],
+                Resource=Join("", [
+                    arn_prefix,
+                    ":logs:*:*:*",  # allow logging to any log group
+                ]),
+            )],
+        ),
+    )
+
+    return dict(container_log_group=container_log_group, logging_policy=logging_policy)
@@ -0,0 +1,104 @@
+"""
+Minify templates to keep them under the size limit for template bodies passed
+inline to CloudFormation (TemplateBody), rather than uploaded to S3 first.
+
+Set MINIFY to a comma-separated list of the optional parts of the template to
+strip (see STRIPPABLE), or to "on" for just the metadata::
+
+    USE_ECS=on OUTPUT_FORMAT=json MINIFY=metadata,descriptions python -m stack render
+
+* metadata: the template's Metadata, i.e., the AWS::CloudFormation::Interface
+  parameter groups and labels that InterfaceTemplate adds for the console.
+  Resource Metadata (e.g., the cfn-init configuration in dokku.py) is used when
+  the stack is created, so it's always kept.
+* descriptions: the Description (and ConstraintDescription) of the template,
+  its parameters and outputs, and the AssertDescription of its rule assertions.
+* allowed-values: the AllowedValues of the parameters. This removes the
+  console's validation of, e.g., instance classes; an invalid value then only
+  fails when the resource that uses it is created.
+
+The size of each template before and after minification is reported on
+stderr, with a warning if it's still too large to pass inline.
+"""
+
+import os
+
+# The largest template body that can be passed to CloudFormation inline, in bytes
+INLINE_TEMPLATE_BODY_LIMIT = 51200
+
+# The optional parts of a template that minify() can strip
+STRIPPABLE = ["metadata", "descriptions", "allowed-values"]
+
+
+def strip_from_environ(environ=os.environ):
+    """
+    Return the list of STRIPPABLE parts named by MINIFY in the given environment
+    (empty if it isn't set).
+    """
+    value = environ.get("MINIFY", "").strip().lower()
+    if value == "on":
+        return ["metadata"]
+    parts = [part.strip() for part in value.split(",") if part.strip()]
+    unknown = [part for part in parts if part not in STRIPPABLE]
+    if unknown:
+        raise ValueError("Unknown MINIFY part(s): %s (choices: on, %s)" % (", ".join(unknown), ", ".join(STRIPPABLE)))
+    return parts
+
+
+def _without(d, keys):
+    return dict((key, value) for key, value in d.items() if key not in keys)
+
+
+def minify(data, strip=("metadata",)):
+    """
+    Return a copy of a template dictionary (as returned by to_dict()) without
+    the given STRIPPABLE parts. The original dictionary isn't modified.
+    """
+    unknown = [part for part in strip if part not in STRIPPABLE]
+    if unknown:
+        raise ValueError("Unknown part(s) to strip: %s" % ", ".join(unknown))
+    data = dict(data)
+    if "metadata" in strip:
+        data.pop("Metadata", None)
+    parameter_keys = []
+    if "descriptions" in strip:
+        data.pop("Description", None)
+        parameter_keys += ["Description", "ConstraintDescription"]
+        if "Outputs" in data:
+            data["Outputs"] = dict(
+                (name, _without(output, ["Description"])) for name, output in data["Outputs"].items()
+            )
+        if "Rules" in data:
+            rules = {}
+            for name, rule in data["Rules"].items():
+                if "Assertions" in rule:
+                    rule = dict(rule, Assertions=[_without(a, ["AssertDescription"]) for a in rule["Assertions"]])
+                rules[name] = rule
+            data["Rules"] = rules
+    if "allowed-values" in strip:
+        parameter_keys.append("AllowedValues")
+    if parameter_keys and "Parameters" in data:
+        data["Parameters"] = dict(
+            (name, _without(parameter, parameter_keys)) for name, parameter in data["Parameters"].items()
+        )
+    return data
+
+
+def size_report(label, original_bytes, minified_bytes):
+    """
+    Return a line describing the bytes saved by minifying a template, and whether
+    it's small enough to pass to CloudFormation inline.
+    """
+    saved = original_bytes - minified_bytes
+    line = "Minified %s: %d -> %d bytes (saved %d, %.0f%%)" % (
+        label,
+        original_bytes,
+        minified_bytes,
+        saved,
+        saved * 100.0 / original_bytes if original_bytes else 0,
+    )
+    if minified_bytes > INLINE_TEMPLATE_BODY_LIMIT:
+        line += "; still over the %d-byte limit for inline template bodies, so upload it to S3" % (
+            INLINE_TEMPLATE_BODY_LIMIT
+        )
+    return line + "\n"
@@ -0,0 +1,221 @@
+"""
+Optimizations of the template dictionary returned by InterfaceTemplate.to_dict().
+
+ConstantFolder folds the intrinsic functions whose result is known when the
+template is generated into literals, e.g., Join("", ["arn:aws:s3:::", "bucket"])
+into "arn:aws:s3:::bucket" and Select(0, Split(",", "a,b")) into "a". A Join
+that also has dynamic parts has any nested Join with the same delimiter spliced
+into it and its adjacent literal parts joined into one. specialize.py
+extends it to also know the values of some parameters and conditions.
+
+CloudFormation has no way to define a value once and refer to it elsewhere, so
+repeated subexpressions can't be hoisted out of the template itself;
+repeated_subexpressions() finds them (see `python -m stack sizes`), so that
+they can be replaced at the source, e.g., with a parameter, an output of a
+nested stack or a simpler expression.
+"""
+
+import json
+
+NO_VALUE = {"Ref": "AWS::NoValue"}
+
+
+def single_key(value):
+    """
+    Return the key of a dictionary with just one key (e.g., the name of the
+    intrinsic function in {"Fn::Join": [...]}), otherwise None.
+    """
+    if isinstance(value, dict) and len(value) == 1:
+        return next(iter(value))
+    return None
+
+
+class ConstantFolder(object):
+    """
+    Folds the intrinsic functions in a template value (as returned by to_dict())
+    whose results are known. Subclasses can provide the values of references and
+    conditions by overriding ref() and condition().
+    """
+
+    def ref(self, name):
+        """
+        Return a tuple of whether the value of a Ref to name is known, and that
+        value.
+        """
+        return False, None
+
+    def condition(self, name):
+        """
+        Return the value of the named condition: True, False, or None if it isn't
+        known.
+        """
+        return None
+
+    def constant(self, expr):
+        """
+        Return a tuple of whether the given expression has a known value, and that
+        value.
+        """
+        if isinstance(expr, bool):
+            return True, "true" if expr else "false"
+        if isinstance(expr, (str, int, float)):
+            return True, str(expr)
+        if isinstance(expr, list):
+            items = [self.constant(item) for item in expr]
+            if all(known for known, _ in items):
+                return True, [value for _, value in items]
+            return False, None
+        key = single_key(expr)
+        if key == "Ref":
+            return self.ref(expr[key])
+        if key == "Fn::Join":
+            delimiter, items = expr[key]
+            known, items = self.constant(items)
+            if known and isinstance(items, list) and all(isinstance(item, str) for item in items):
+                return True, delimiter.join(items)
+        elif key == "Fn::Split":
+            delimiter, source = expr[key]
+            known, source = self.constant(source)
+            if known and isinstance(source, str):
+                return True, source.split(delimiter)
+        elif key == "Fn::Select":
+            index, items = expr[key]
+            known_index, index = self.constant(index)
+            known, items = self.constant(items)
+            if known_index and known and isinstance(items, list) and int(index) < len(items):
+                return True, items[int(index)]
+        elif key == "Fn::If":
+            name, if_true, if_false = expr[key]
+            value = self.condition(name)
+            if value is not None:
+                return self.constant(if_true if value else if_false)
+        return False, None
+
+    def fold_join(self, expr):
+        """
+        Return a Fn::Join expression (whose arguments have been folded) with the
+        parts of any nested Fn::Join with the same delimiter spliced in and its
+        adjacent literal parts joined, or a literal if all of them are.
+        """
+        delimiter, items = expr["Fn::Join"]
+        if not isinstance(items, list):
+            return expr
+        spliced = []
+        for item in items:
+            if single_key(item) == "Fn::Join" and item["Fn::Join"][0] == delimiter \
+                    and isinstance(item["Fn::Join"][1], list) and item["Fn::Join"][1]:
+                spliced.extend(item["Fn::Join"][1])
+            else:
+                spliced.append(item)
+        parts = []
+        literal = False  # whether parts[-1] is a literal
+        for item in spliced:
+            if isinstance(item, str) and literal:
+                parts[-1] += delimiter + item
+            else:
+                parts.append(item)
+                literal = isinstance(item, str)
+        if not parts:
+            return ""
+        if len(parts) == 1 and literal:
+            return parts[0]
+        return {"Fn::Join": [delimiter, parts]}
+
+    def fold(self, value):
+        """
+        Return the value with the intrinsic functions whose results are known
+        replaced by their results. Properties that fold to AWS::NoValue are
+        removed.
+        """
+        if isinstance(value, list):
+            items = [self.fold(item) for item in value]
+            return [item for item in items if item != NO_VALUE]
+        if not isinstance(value, dict):
+            return value
+        key = single_key(value)
+        if key == "Ref":
+            known, constant = self.ref(value[key])
+            return constant if known else value
+        if key == "Fn::If":
+            name, if_true, if_false = value[key]
+            condition = self.condition(name)
+            if condition is not None:
+                return self.fold(if_true if condition else if_false)
+            # either branch may be AWS::NoValue, so don't remove it
+            return {key: [name, self.fold(if_true), self.fold(if_false)]}
+        folded = {}
+        for k, v in value.items():
+            v = self.fold(v)
+            if v != NO_VALUE:
+                folded[k] = v
+        if key == "Fn::Join":
+            return self.fold_join(folded)
+        if key in ("Fn::Split", "Fn::Select"):
+            known, constant = self.constant(folded)
+            if known:
+                return constant
+        return folded
+
+
+def fold_constants(data):
+    """
+    Return a copy of a template dictionary with its constant intrinsic functions
+    folded (see ConstantFolder).
+    """
+    return ConstantFolder().fold(data)
+
+
+def _expression_text(value):
+    """
+    Return the canonical JSON of a value if it's a non-trivial intrinsic function
+    expression, otherwise None.
+    """
+    key = single_key(value)
+    if key is not None and key.startswith("Fn::"):
+        return json.dumps(value, sort_keys=True, separators=(",", ":"))
+    return None
+
+
+def _walk(value, visit):
+    """
+    Call visit(text) for each intrinsic function expression in the value (see
+    _expression_text()), outermost first, not descending into the expression if
+    it returns True.
+    """
+    if isinstance(value, list):
+        for item in value:
+            _walk(item, visit)
+    elif isinstance(value, dict):
+        text = _expression_text(value)
+        if text is not None and visit(text):
+            return
+        for item in value.values():
+            _walk(item, visit)
+
+
+def repeated_subexpressions(data):
+    """
+    Return a list of (expression JSON, count, bytes) tuples for the intrinsic
+    function expressions that appear more than once in a template dictionary,
+    most total bytes first. Expressions that are only repeated as part of a
+    larger repeated expression aren't listed separately.
+    """
+    counts = {}
+
+    def count(text):
+        counts[text] = counts.get(text, 0) + 1
+
+    _walk(data, count)
+
+    # count the occurrences of each repeated expression outside of a larger one
+    outermost = {}
+
+    def count_outermost(text):
+        if counts[text] > 1:
+            outermost[text] = outermost.get(text, 0) + 1
+            return True
+        return False
+
+    _walk(data, count_outermost)
+    repeated = [(text, n, len(text.encode())) for text, n in outermost.items() if n > 1]
+    return sorted(repeated, key=lambda item: (-item[1] * item[2], item[0]))
@@ -0,0 +1,166 @@
+"""
+Per-module profiling of template generation, enabled with STACK_PROFILE=1::
+
+    STACK_PROFILE=1 USE_ECS=on python -m stack render >/dev/null
+
+ModuleProfiler wraps the loader of every module imported while it's active,
+and times each stack module's add_<name>() function (see build.StackBuild), so
+it records, for each stack module:
+
+* the wall time spent importing it and adding its part to the template,
+  including the parts of other stack modules that it adds (total) and
+  excluding them (self)
+* the part of its self time spent importing other (third-party) modules, such
+  as troposphere service modules
+* the number of memory blocks it allocated (and didn't free), from
+  sys.getallocatedblocks()
+
+The table is printed to stderr, so it doesn't mix with the template on stdout.
+"""
+
+import sys
+import time
+from contextlib import contextmanager
+
+
+class _ProfilingLoader(object):
+    """
+    Wraps a module loader to time its exec_module().
+    """
+
+    def __init__(self, loader, profiler):
+        self.loader = loader
+        self.profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        self.profiler.enter(module.__name__)
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.profiler.exit(module.__name__)
+
+
+class ModuleProfiler(object):
+    """
+    An import hook (see sys.meta_path) that records the cost of executing
+    each module in the given package, and of adding its part to a template.
+    """
+
+    def __init__(self, package=__package__):
+        self.package = package
+        self.stats = {}
+        self._stack = []
+        self._finding = set()
+
+    def is_profiled(self, name):
+        return name == self.package or name.startswith(self.package + ".")
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname in self._finding:
+            return None
+        # Find the module with the finders that follow this one
+        self._finding.add(fullname)
+        try:
+            for finder in sys.meta_path[sys.meta_path.index(self) + 1:]:
+                find_spec = getattr(finder, "find_spec", None)
+                spec = find_spec(fullname, path, target) if find_spec else None
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding.discard(fullname)
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _ProfilingLoader(spec.loader, self)
+        return spec
+
+    def enter(self, name):
+        self._stack.append({
+            "name": name,
+            "start": time.perf_counter(),
+            "blocks": sys.getallocatedblocks(),
+            "children_seconds": 0.0,
+            "children_blocks": 0,
+            "import_seconds": 0.0,
+        })
+
+    def exit(self, name):
+        frame = self._stack.pop()
+        total_seconds = time.perf_counter() - frame["start"]
+        total_blocks = sys.getallocatedblocks() - frame["blocks"]
+        profiled = self.is_profiled(name)
+        if profiled:
+            # a stack module is both imported and has its part added
+            stats = self.stats.setdefault(name, dict.fromkeys(
+                ["total_seconds", "self_seconds", "import_seconds", "blocks"], 0
+            ))
+            stats["total_seconds"] += total_seconds
+            stats["self_seconds"] += total_seconds - frame["children_seconds"]
+            stats["import_seconds"] += frame["import_seconds"]
+            stats["blocks"] += total_blocks - frame["children_blocks"]
+        if self._stack:
+            parent = self._stack[-1]
+            if profiled:
+                parent["children_seconds"] += total_seconds
+                parent["children_blocks"] += total_blocks
+            elif self.is_profiled(parent["name"]):
+                # a third-party module imported directly by a stack module (the
+                # modules it imports in turn are included in its total)
+                parent["import_seconds"] += total_seconds
+
+    def format_table(self):
+        """
+        Return the recorded stats as a text table, most expensive (by self
+        time) first.
+        """
+        rows = [("module", "total ms", "self ms", "imports ms", "blocks")]
+        for name, stats in sorted(self.stats.items(), key=lambda item: -item[1]["self_seconds"]):
+            rows.append((
+                name,
+                "%.1f" % (stats["total_seconds"] * 1000),
+                "%.1f" % (stats["self_seconds"] * 1000),
+                "%.1f" % (stats["import_seconds"] * 1000),
+                str(stats["blocks"]),
+            ))
+        rows.append((
+            "(all)",
+            "",
+            "%.1f" % (sum(s["self_seconds"] for s in self.stats.values()) * 1000),
+            "%.1f" % (sum(s["import_seconds"] for s in self.stats.values()) * 1000),
+            str(sum(s["blocks"] for s in self.stats.values())),
+        ))
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        lines = []
+        for row in rows:
+            cells = [row[0].ljust(widths[0])] + [cell.rjust(width) for cell, width in zip(row[1:], widths[1:])]
+            lines.append("  ".join(cells))
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def profile_modules(enabled=True, stream=None):
+    """
+    Profile the stack modules imported, and the templates built, within the
+    context and, on exit, print the results to stream (stderr by default). Does
+    nothing unless enabled.
+    """
+    if not enabled:
+        yield None
+        return
+    # imported here because the build tooling imports this module lazily
+    from .build import StackBuild
+    profiler = ModuleProfiler()
+    sys.meta_path.insert(0, profiler)
+    StackBuild.profiler = profiler
+    try:
+        yield profiler
+    finally:
+        StackBuild.profiler = None
+        sys.meta_path.remove(profiler)
+        (stream or sys.stderr).write(profiler.format_table())
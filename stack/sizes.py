@@ -0,0 +1,132 @@
+"""
+Break the size of a template down by the stack module that added each part of
+it, e.g.::
+
+    python -m stack sizes ecs-nat
+
+InterfaceTemplate records the module that added each parameter, condition,
+resource, output, etc. (see InterfaceTemplate.origins). For each module, the
+report shows the bytes it contributes to the template (as compact JSON, which is
+what counts towards CloudFormation's template size limits) in total and per
+section, the number of resources it adds and the deepest nesting of intrinsic
+functions (Ref, Fn::If, Fn::Join, ...) in what it adds, which is what makes a
+template slow for CloudFormation to validate. Further tables list the largest
+individual items and the largest repeated subexpressions (see
+optimize.repeated_subexpressions()). If SPECIALIZE or MINIFY is set, the
+specialized or minified template is measured.
+"""
+
+import json
+
+from .minify import minify
+from .optimize import repeated_subexpressions
+from .specialize import specialize
+
+# Template sections, in the order they're reported
+SECTIONS = ["Metadata", "Parameters", "Rules", "Mappings", "Conditions", "Resources", "Outputs"]
+
+
+def is_intrinsic(key):
+    return key in ("Ref", "Condition") or key.startswith("Fn::")
+
+
+def intrinsic_depth(value):
+    """
+    Return the deepest nesting of intrinsic functions in a template value (as
+    returned by to_dict()), e.g., 2 for {"Fn::If": ["C", {"Ref": "P"}, ""]}.
+    """
+    if isinstance(value, dict):
+        depth = max([intrinsic_depth(v) for v in value.values()] or [0])
+        if len(value) == 1 and is_intrinsic(next(iter(value))):
+            depth += 1
+        return depth
+    if isinstance(value, list):
+        return max([intrinsic_depth(v) for v in value] or [0])
+    return 0
+
+
+def item_bytes(name, value):
+    """
+    Return the size of a "name": value entry in a template section, as compact
+    JSON.
+    """
+    return len(json.dumps({name: value}, sort_keys=True, separators=(",", ":")).encode()) - 2
+
+
+def measure(template, strip=(), constants=None):
+    """
+    Return a tuple of a list of (section, name, module, bytes, depth) tuples, one
+    for each item in the template, the size of the whole template, and its
+    repeated subexpressions (see optimize.repeated_subexpressions()). The
+    template is specialized first if constants are given (see specialize.py),
+    and minified if strip lists any parts to strip (see minify.STRIPPABLE).
+    """
+    data = template.to_dict()
+    if constants is not None:
+        data = specialize(data, constants)[0]
+    if strip:
+        data = minify(data, strip)
+    items = []
+    for section in SECTIONS:
+        origins = template.origins.get(section, {})
+        for name, value in data.get(section, {}).items():
+            module = origins.get(name) or "(unknown)"
+            items.append((section, name, module, item_bytes(name, value), intrinsic_depth(value)))
+    total_bytes = len(json.dumps(data, sort_keys=True, separators=(",", ":")).encode())
+    return items, total_bytes, repeated_subexpressions(data)
+
+
+def format_rows(rows, left=1):
+    """
+    Format rows of strings as a table, with the first left columns left-justified
+    and the rest right-justified.
+    """
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = []
+    for row in rows:
+        cells = [cell.ljust(width) if i < left else cell.rjust(width)
+                 for i, (cell, width) in enumerate(zip(row, widths))]
+        lines.append("  ".join(cells).rstrip())
+    return "\n".join(lines) + "\n"
+
+
+def format_report(items, total_bytes, repeated=(), top=10):
+    """
+    Return the results of measure() as text tables: the bytes, resources and
+    intrinsic function depth for each module, largest first, followed by the top
+    largest items and repeated subexpressions.
+    """
+    sections = [section for section in SECTIONS if any(item[0] == section for item in items)]
+    modules = {}
+    for section, name, module, size, depth in items:
+        stats = modules.setdefault(module, {"bytes": 0, "resources": 0, "depth": 0, "sections": {}})
+        stats["bytes"] += size
+        stats["resources"] += section == "Resources"
+        stats["depth"] = max(stats["depth"], depth)
+        stats["sections"][section] = stats["sections"].get(section, 0) + size
+
+    def percent(size):
+        return "%.1f%%" % (size * 100.0 / total_bytes) if total_bytes else "-"
+
+    rows = [["module", "bytes", "%", "resources", "depth"] + sections]
+    for module, stats in sorted(modules.items(), key=lambda item: -item[1]["bytes"]):
+        rows.append([module, str(stats["bytes"]), percent(stats["bytes"]), str(stats["resources"]),
+                     str(stats["depth"])] + [str(stats["sections"].get(section, "")) for section in sections])
+    # the total also includes the template's own structure (section names, braces and commas)
+    rows.append(["(all)", str(total_bytes), percent(total_bytes),
+                 str(sum(stats["resources"] for stats in modules.values())),
+                 str(max([stats["depth"] for stats in modules.values()] or [0]))]
+                + [str(sum(item[3] for item in items if item[0] == section)) for section in sections])
+    report = format_rows(rows)
+
+    rows = [["item", "module", "bytes", "%", "depth"]]
+    for section, name, module, size, depth in sorted(items, key=lambda item: -item[3])[:top]:
+        rows.append(["%s.%s" % (section, name), module, str(size), percent(size), str(depth)])
+    report += "\n" + format_rows(rows, left=2)
+
+    if repeated:
+        rows = [["repeated expression", "count", "bytes", "total"]]
+        for text, count, size in repeated[:top]:
+            rows.append([text if len(text) <= 80 else text[:77] + "...", str(count), str(size), str(count * size)])
+        report += "\n" + format_rows(rows)
+    return report
@@ -0,0 +1,282 @@
+"""
+Specialize a template for a single environment by treating the parameter values
+in DEFAULTS_FILE as constants, with SPECIALIZE=on::
+
+    USE_ECS=on DEFAULTS_FILE=production.json SPECIALIZE=on python -m stack render
+
+specialize() replaces references to those parameters with their values and
+removes the parameters, evaluates the conditions (Fn::Equals, Fn::Not, Fn::And,
+Fn::Or and Condition) that no longer depend on anything else, and folds the
+Fn::If expressions that use them. Resources and outputs whose condition is
+false are removed (e.g., the cache cluster when CacheNodeType is "(none)"), as
+are properties that fold to AWS::NoValue. Conditions that depend on a pseudo
+parameter (e.g., AWS::Region) or a parameter that isn't in the file are left for
+CloudFormation to evaluate, simplified where possible. Rules whose assertions
+hold for the constants are removed, and if the constants break one, specialize()
+raises ValueError rather than leave CloudFormation to reject the stack.
+
+The result only works with the given values, so the stack can't be updated with
+different ones; build a specialized template for each environment instead.
+"""
+
+import json
+import os
+
+from .optimize import ConstantFolder, single_key
+
+# Parameter types whose value is a list
+LIST_TYPES = ("CommaDelimitedList", "List<")
+
+
+def values_from_environ(environ=os.environ):
+    """
+    Return the parameter values to specialize templates for, i.e., the contents
+    of DEFAULTS_FILE if SPECIALIZE is "on", otherwise None.
+    """
+    if environ.get("SPECIALIZE") != "on":
+        return None
+    if not environ.get("DEFAULTS_FILE"):
+        raise ValueError("SPECIALIZE=on requires a DEFAULTS_FILE with the parameter values to use")
+    with open(environ["DEFAULTS_FILE"]) as f:
+        return json.load(f)
+
+
+def parameter_value(parameter, value):
+    """
+    Return the value of a Ref to a parameter (as returned by to_dict()) that's
+    given the value from a defaults file: a string, or a list of strings for
+    list parameters.
+    """
+    if isinstance(value, bool):
+        value = "true" if value else "false"
+    if parameter.get("Type", "String").startswith(LIST_TYPES):
+        if isinstance(value, list):
+            return [str(v) for v in value]
+        return [v.strip() for v in str(value).split(",")] if value != "" else []
+    return str(value)
+
+
+class Specializer(ConstantFolder):
+    """
+    Folds a template dictionary (as returned by to_dict()) for the given
+    {parameter: value} constants. See specialize().
+    """
+
+    def __init__(self, data, values):
+        self.data = data
+        parameters = data.get("Parameters", {})
+        self.values = dict(
+            (name, parameter_value(parameters[name], value)) for name, value in values.items() if name in parameters
+        )
+        self.conditions = data.get("Conditions", {})
+        self._condition_values = {}
+
+    def ref(self, name):
+        if name in self.values:
+            return True, self.values[name]
+        return False, None
+
+    def condition(self, name):
+        """
+        Return the value of the named condition: True, False, or None if it can't
+        be determined from the constants.
+        """
+        if name not in self._condition_values:
+            self._condition_values[name] = None  # in case of a cycle
+            self._condition_values[name] = self.evaluate(self.conditions[name])
+        return self._condition_values[name]
+
+    def evaluate(self, expr):
+        """
+        Return the value of a condition expression (or rule function): True,
+        False, or None if it can't be determined from the constants.
+        """
+        key = single_key(expr)
+        if key == "Condition":
+            return self.condition(expr[key])
+        if key == "Fn::Equals":
+            (known_a, a), (known_b, b) = [self.constant(operand) for operand in expr[key]]
+            return a == b if known_a and known_b else None
+        if key == "Fn::Contains":
+            (known_values, values), (known, value) = [self.constant(operand) for operand in expr[key]]
+            return value in values if known_values and known else None
+        if key == "Fn::Not":
+            value = self.evaluate(expr[key][0])
+            return None if value is None else not value
+        if key in ("Fn::And", "Fn::Or"):
+            values = [self.evaluate(operand) for operand in expr[key]]
+            decisive = key == "Fn::Or"  # the value that decides the result on its own
+            if decisive in values:
+                return decisive
+            return None if None in values else not decisive
+        return None
+
+    def simplify(self, expr):
+        """
+        Return a condition expression whose value isn't known, without the parts
+        that are.
+        """
+        key = single_key(expr)
+        if key == "Fn::Not":
+            return {key: [self.simplify(expr[key][0])]}
+        if key in ("Fn::And", "Fn::Or"):
+            # operands that don't affect the result
+            neutral = key == "Fn::And"
+            operands = [self.simplify(o) for o in expr[key] if self.evaluate(o) is not neutral]
+            return {key: operands} if len(operands) > 1 else operands[0]
+        if key in ("Fn::Equals", "Fn::Contains"):
+            return {key: [self.fold(operand) for operand in expr[key]]}
+        return expr
+
+
+def references(value, refs=None, conditions=None):
+    """
+    Return sets of the names referenced (with Ref, Fn::GetAtt or Fn::Sub) and
+    the conditions used (with Condition or Fn::If) in the given value.
+    """
+    refs = set() if refs is None else refs
+    conditions = set() if conditions is None else conditions
+    if isinstance(value, list):
+        for item in value:
+            references(item, refs, conditions)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if key == "Ref" and isinstance(item, str):
+                refs.add(item)
+            elif key == "Fn::GetAtt":
+                refs.add(item[0] if isinstance(item, list) else item.split(".")[0])
+            elif key == "Fn::Sub":
+                template_string = item[0] if isinstance(item, list) else item
+                refs.update(part.split("}")[0].split(".")[0] for part in template_string.split("${")[1:])
+            elif key == "Condition" and isinstance(item, str):
+                conditions.add(item)
+            elif key == "Fn::If":
+                conditions.add(item[0])
+            references(item, refs, conditions)
+    return refs, conditions
+
+
+def specialize_rules(specializer, rules):
+    """
+    Return the rules (the template's Rules section) that still depend on
+    parameters without a constant value, simplified. Raises ValueError if the
+    constants break a rule.
+    """
+    specialized = {}
+    for name, rule in rules.items():
+        condition = specializer.evaluate(rule["RuleCondition"]) if "RuleCondition" in rule else True
+        if condition is False:
+            continue
+        assertions = []
+        for assertion in rule["Assertions"]:
+            value = specializer.evaluate(assertion["Assert"])
+            if value is False and condition:
+                raise ValueError("The parameter values break rule %s: %s" % (
+                    name, assertion.get("AssertDescription", json.dumps(assertion["Assert"]))
+                ))
+            if value is None:
+                assertions.append(dict(assertion, Assert=specializer.simplify(assertion["Assert"])))
+            elif value is False:
+                # it depends on the rule's condition
+                assertions.append(dict(assertion, Assert=specializer.fold(assertion["Assert"])))
+        if assertions:
+            rule = dict(rule, Assertions=assertions)
+            if condition is True:
+                rule.pop("RuleCondition", None)
+            else:
+                rule["RuleCondition"] = specializer.simplify(rule["RuleCondition"])
+            specialized[name] = rule
+    return specialized
+
+
+def specialize(data, values):
+    """
+    Return a copy of a template dictionary (as returned by to_dict()) specialized
+    for the given {parameter: value} constants, and a dictionary of the number of
+    parameters, conditions, resources and outputs removed from each section.
+    """
+    specializer = Specializer(data, values)
+    data = dict(data)
+    removed = {"Parameters": 0, "Rules": 0, "Conditions": 0, "Resources": 0, "Outputs": 0}
+
+    for section in ("Resources", "Outputs"):
+        if section not in data:
+            continue
+        items = {}
+        for name, item in data[section].items():
+            condition = specializer.condition(item["Condition"]) if "Condition" in item else None
+            if condition is False:
+                removed[section] += 1
+                continue
+            if condition:
+                item = dict((k, v) for k, v in item.items() if k != "Condition")
+            items[name] = specializer.fold(item)
+        data[section] = items
+    # drop any dependencies on resources that were removed
+    for resource in data.get("Resources", {}).values():
+        depends_on = resource.get("DependsOn")
+        if depends_on is not None:
+            depends_on = [d for d in ([depends_on] if isinstance(depends_on, str) else depends_on)
+                          if d in data["Resources"]]
+            if depends_on:
+                resource["DependsOn"] = depends_on
+            else:
+                del resource["DependsOn"]
+
+    if "Rules" in data:
+        rules = specialize_rules(specializer, data["Rules"])
+        removed["Rules"] = len(data["Rules"]) - len(rules)
+        if rules:
+            data["Rules"] = rules
+        else:
+            del data["Rules"]
+
+    # Remove the conditions and parameters that are no longer used
+    used_refs, used_conditions = references([data.get(s) for s in ("Resources", "Outputs", "Rules")])
+    conditions = {}
+    for name, expr in specializer.conditions.items():
+        if specializer.condition(name) is None:
+            simplified = specializer.simplify(expr)
+            # a condition must be defined by a function, not just refer to another
+            while single_key(simplified) == "Condition":
+                simplified = specializer.simplify(specializer.conditions[simplified["Condition"]])
+            conditions[name] = simplified
+            references(conditions[name], used_refs, used_conditions)
+    # conditions with a known value may still be referenced by ones without
+    for name, expr in specializer.conditions.items():
+        if name not in conditions and name in used_conditions:
+            conditions[name] = expr
+            references(expr, used_refs, used_conditions)
+    removed["Conditions"] = len(specializer.conditions) - len(conditions)
+    if conditions:
+        data["Conditions"] = conditions
+    else:
+        data.pop("Conditions", None)
+
+    parameters = dict(
+        (name, parameter) for name, parameter in data.get("Parameters", {}).items()
+        if name not in specializer.values or name in used_refs
+    )
+    removed["Parameters"] = len(data.get("Parameters", {})) - len(parameters)
+    if "Parameters" in data:
+        data["Parameters"] = parameters
+    interface = data.get("Metadata", {}).get("AWS::CloudFormation::Interface")
+    if interface:
+        groups = []
+        for group in interface["ParameterGroups"]:
+            names = [name for name in group["Parameters"] if name in parameters]
+            if names:
+                groups.append(dict(group, Parameters=names))
+        labels = dict((name, label) for name, label in interface["ParameterLabels"].items() if name in parameters)
+        data["Metadata"] = dict(
+            data["Metadata"],
+            **{"AWS::CloudFormation::Interface": {"ParameterGroups": groups, "ParameterLabels": labels}}
+        )
+    return data, removed
+
+
+def specialize_report(label, removed):
+    return "Specialized %s: removed %s\n" % (
+        label,
+        ", ".join("%d %s" % (count, section.lower()) for section, count in removed.items()),
+    )
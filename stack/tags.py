@@ -1,6 +1,9 @@
-from troposphere import AWS_STACK_NAME, Ref, Tags, autoscaling
+from troposphere import AWS_STACK_NAME, Ref, Tags
 
-from .template import template
+from .lazy import lazy_import
+
+# Only imported if the template has an autoscaling group (see add_common_tags())
+autoscaling = lazy_import("troposphere.autoscaling")
 
 common_tags = {"aws-web-stacks:stack-name": Ref(AWS_STACK_NAME)}
 
@@ -51,8 +54,6 @@ def add_common_tags(template):
 
         if isinstance(resource.Tags, Tags):
             resource.Tags = Tags(**common_tags) + resource.Tags
-        elif isinstance(resource.Tags, autoscaling.Tags):
-            resource.Tags = autoscaling.Tags(**common_tags) + resource.Tags
         elif isinstance(resource.Tags, dict):
             tags = common_tags.copy()
             tags.update(**resource.Tags)  # override with any tags from this resource.
@@ -61,8 +62,15 @@ def add_common_tags(template):
             tags = tags_type_of_resource(resource)()
             tags.tags = resource.Tags
             resource.Tags = Tags(**common_tags) + tags
+        # checked last, so troposphere.autoscaling isn't imported unless needed
+        elif isinstance(resource.Tags, autoscaling.Tags):
+            resource.Tags = autoscaling.Tags(**common_tags) + resource.Tags
         else:
             raise TypeError("Unknown type %s for Tags on %s" % (type(resource.Tags), resource))
 
 
-add_common_tags(template)
+def add_tags(build):
+    """
+    Tag all of the resources in the template (so it must be added last).
+    """
+    add_common_tags(build.template)
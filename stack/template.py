@@ -1,6 +1,33 @@
+import sys
 from collections import OrderedDict
 
-from troposphere import Template
+from troposphere import AWSHelperFn, Template
+
+from .optimize import fold_constants
+
+
+def calling_module():
+    """
+    Return the name of the innermost stack module, other than this one, in the
+    current call stack (or None if there isn't one).
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        name = frame.f_globals.get("__name__", "")
+        if name.startswith(__package__ + ".") and name != __name__:
+            return name
+        frame = frame.f_back
+    return None
+
+
+class Contains(AWSHelperFn):
+    """
+    The Fn::Contains rule function, which troposphere doesn't provide: whether a
+    string is one of a list of strings.
+    """
+
+    def __init__(self, values, value):
+        self.data = {"Fn::Contains": [values, value]}
 
 
 class InterfaceTemplate(Template):
@@ -8,6 +35,10 @@ class InterfaceTemplate(Template):
     Custom Template class that allows us to optionally define groups and labels for
     CloudFormation Parameters at the time they're added to the template. Groups and
     labels specified, if any, will be added to a custom AWS::CloudFormation::Interface
+
+    Also records which stack module added each parameter, resource, output, etc.,
+    in self.origins (see sizes.py), and the stack modules whose parts were added
+    to it in self.modules (see build.StackBuild).
     """
 
     def __init__(self, *args, **kwargs):
@@ -16,6 +47,54 @@ class InterfaceTemplate(Template):
         self.parameter_groups = OrderedDict()
         self.parameter_labels = {}
         self.group_order = []
+        # {section: {name: module}}, e.g., {'Resources': {'AssetsBucket': 'stack.assets'}}
+        self.origins = {}
+        self.modules = []
+
+    def record_origin(self, section, values):
+        """
+        Record the stack module that added the given item(s) (names, or objects
+        with a title) to the given section of the template.
+        """
+        module = calling_module()
+        for value in values if isinstance(values, list) else [values]:
+            self.origins.setdefault(section, {})[value if isinstance(value, str) else value.title] = module
+
+    def add_resource(self, resource):
+        resource = super(InterfaceTemplate, self).add_resource(resource)
+        self.record_origin('Resources', resource)
+        return resource
+
+    def add_output(self, output):
+        output = super(InterfaceTemplate, self).add_output(output)
+        self.record_origin('Outputs', output)
+        return output
+
+    def add_condition(self, name, condition):
+        name = super(InterfaceTemplate, self).add_condition(name, condition)
+        self.record_origin('Conditions', name)
+        return name
+
+    def add_mapping(self, name, mapping):
+        super(InterfaceTemplate, self).add_mapping(name, mapping)
+        self.record_origin('Mappings', name)
+
+    def add_rule(self, name, rule):
+        super(InterfaceTemplate, self).add_rule(name, rule)
+        self.record_origin('Rules', name)
+
+    def add_assertion(self, name, assertion, description, condition=None):
+        """
+        Add a rule that CloudFormation checks the parameter values against before
+        it creates or updates any resources: the assertion must be true (if the
+        condition, if any, is). Both are rule functions (Equals, Not, And, Or,
+        Contains, etc.) of the parameters, and can't use the template's
+        conditions.
+        """
+        rule = {"Assertions": [{"Assert": assertion, "AssertDescription": description}]}
+        if condition is not None:
+            rule["RuleCondition"] = condition
+        self.add_rule(name, rule)
 
     def add_parameter(self, parameter, group=None, label=None):
         """
@@ -23,6 +102,7 @@ class InterfaceTemplate(Template):
         'AWS::CloudFormation::Interface' in to_dict().
         """
         parameter = super(InterfaceTemplate, self).add_parameter(parameter)
+        self.record_origin('Parameters', parameter)
         if group:
             if group not in self.parameter_groups:
                 self.parameter_groups[group] = []
@@ -42,8 +122,9 @@ class InterfaceTemplate(Template):
     def to_dict(self):
         """
         Overwrite 'AWS::CloudFormation::Interface' key in self.metadata (if any)
-        with the groups and labels defined via add_parameter(), and then call
-        super().to_dict().
+        with the groups and labels defined via add_parameter(), call
+        super().to_dict(), and fold the constant intrinsic functions in the
+        result (see optimize.py).
         """
         # create an ordered list of parameter groups for our interface
         ordered_groups = list(self.group_order)
@@ -68,20 +149,24 @@ class InterfaceTemplate(Template):
                 ]),
             }
         })
-        return super(InterfaceTemplate, self).to_dict()
-
-
-# The CloudFormation template
-template = InterfaceTemplate()
-
-# If you create a new group and care about the order in which it shows up in the
-# CloudFormation interface, add it below.
-template.set_group_order([
-    'Global',
-    'Application Server',
-    'Load Balancer',
-    'Static Media',
-    'Database',
-    'Cache',
-    'Elasticsearch',
-])
+        self.origins.setdefault('Metadata', {})['AWS::CloudFormation::Interface'] = __name__
+        return fold_constants(super(InterfaceTemplate, self).to_dict())
+
+
+def new_template():
+    """
+    Return a new, empty InterfaceTemplate for the stack modules to add to.
+    """
+    template = InterfaceTemplate()
+    # If you create a new group and care about the order in which it shows up in the
+    # CloudFormation interface, add it below.
+    template.set_group_order([
+        'Global',
+        'Application Server',
+        'Load Balancer',
+        'Static Media',
+        'Database',
+        'Cache',
+        'Elasticsearch',
+    ])
+    return template
@@ -22,14 +22,16 @@ parameter_defaults = {}
 class ParameterWithDefaults(TroposphereParameter):
     """
     Like a parameter, but you can change its default value by
-    loading different values in this module.
+    loading different values in this module, or by passing a
+    dictionary of defaults.
     """
-    def __init__(self, title, **kwargs):
+    def __init__(self, title, defaults=None, **kwargs):
+        defaults = parameter_defaults if defaults is None else defaults
         # If the parameter can accept a 'Default' parameter, and
         # we have one configured, use that, overriding whatever was
         # passed in.
-        if 'Default' in self.props and title in parameter_defaults:
-            kwargs['Default'] = parameter_defaults[title]
+        if 'Default' in self.props and title in defaults:
+            kwargs['Default'] = defaults[title]
         super().__init__(title, **kwargs)
 
 
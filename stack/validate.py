@@ -0,0 +1,135 @@
+"""
+Check defaults files (see utils.py) or CloudFormation parameters files (as
+written by build-environments) against the constraints on a template's
+parameters before deploying, rather than waiting for CloudFormation to reject
+them or for a resource to fail to create and roll the stack back::
+
+    python -m stack validate ecs-nat environments/
+    python -m stack validate content/ecs-nat.json production.json
+
+Each value is checked against its parameter's Type (a number for Number),
+AllowedValues, AllowedPattern (which, as in CloudFormation, must match the whole
+value), MinLength and MaxLength, and MinValue and MaxValue; each item of a list
+parameter (CommaDelimitedList or List<...>) is checked separately. Parameters
+without a Default must be given a value, and the template's Rules (evaluated
+with the parameters' defaults for any values not given) must hold. The regular
+expressions are compiled once per template, so validating many files costs
+little more than reading them.
+"""
+
+import json
+import re
+
+from .build import parameter_string
+from .specialize import LIST_TYPES, Specializer
+
+
+def read_values(path):
+    """
+    Return the {parameter: value} values in a defaults file, or a parameters file
+    (a list of {"ParameterKey": ..., "ParameterValue": ...}), and whether it's
+    the latter.
+    """
+    with open(path) as f:
+        values = json.load(f)
+    if isinstance(values, list):
+        return dict((item["ParameterKey"], item.get("ParameterValue", "")) for item in values), True
+    return values, False
+
+
+class ParameterValidator(object):
+    """
+    Validates parameter values against the Parameters and Rules of a template
+    dictionary (as returned by to_dict()).
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.parameters = data.get("Parameters", {})
+        patterns = {}
+        self.patterns = {}
+        for name, parameter in self.parameters.items():
+            if "AllowedPattern" in parameter:
+                pattern = parameter["AllowedPattern"]
+                if pattern not in patterns:
+                    patterns[pattern] = re.compile(pattern)
+                self.patterns[name] = patterns[pattern]
+
+    def check_item(self, name, parameter, value):
+        """
+        Return a list of the ways a (single) value breaks the parameter's
+        constraints.
+        """
+        errors = []
+        if parameter.get("Type", "String") in ("Number", "List<Number>"):
+            try:
+                number = float(value)
+            except ValueError:
+                return ["%r is not a number" % value]
+            if "MinValue" in parameter and number < float(parameter["MinValue"]):
+                errors.append("%s is less than MinValue %s" % (value, parameter["MinValue"]))
+            if "MaxValue" in parameter and number > float(parameter["MaxValue"]):
+                errors.append("%s is greater than MaxValue %s" % (value, parameter["MaxValue"]))
+        if "AllowedValues" in parameter and value not in [parameter_string(v) for v in parameter["AllowedValues"]]:
+            errors.append("%r is not one of AllowedValues" % value)
+        if name in self.patterns and not self.patterns[name].fullmatch(value):
+            errors.append("%r does not match AllowedPattern %s" % (value, parameter["AllowedPattern"]))
+        if "MinLength" in parameter and len(value) < int(parameter["MinLength"]):
+            errors.append("is shorter than MinLength %s" % parameter["MinLength"])
+        if "MaxLength" in parameter and len(value) > int(parameter["MaxLength"]):
+            errors.append("is longer than MaxLength %s" % parameter["MaxLength"])
+        return errors
+
+    def check_rules(self, given):
+        """
+        Return a list of (rule, message) tuples for the template's rules that the
+        given {parameter: value} values (and the defaults of the parameters not
+        given) break.
+        """
+        values = dict(
+            (name, parameter["Default"]) for name, parameter in self.parameters.items() if "Default" in parameter
+        )
+        values.update(given)
+        specializer = Specializer(self.data, values)
+        errors = []
+        for name, rule in sorted(self.data.get("Rules", {}).items()):
+            if "RuleCondition" in rule and specializer.evaluate(rule["RuleCondition"]) is not True:
+                continue
+            for assertion in rule["Assertions"]:
+                if specializer.evaluate(assertion["Assert"]) is False:
+                    errors.append((name, "is broken: %s" % assertion.get("AssertDescription", "")))
+        return errors
+
+    def validate(self, values, strict=False):
+        """
+        Return a list of (parameter or rule, message) tuples describing each way
+        the given {parameter: value} values break the constraints on the
+        template's parameters or its rules. If strict is True (as for a
+        parameters file), values for parameters the template doesn't have are
+        errors, as they are in CloudFormation.
+        """
+        errors = []
+        for name, parameter in sorted(self.parameters.items()):
+            if name not in values:
+                if "Default" not in parameter:
+                    errors.append((name, "is required (it has no Default)"))
+                continue
+            value = parameter_string(values[name])
+            if parameter.get("Type", "String").startswith(LIST_TYPES):
+                items = value.split(",") if value else []
+            else:
+                items = [value]
+            for item in items:
+                messages = self.check_item(name, parameter, item)
+                if messages and parameter.get("ConstraintDescription"):
+                    messages[-1] += " (%s)" % parameter["ConstraintDescription"]
+                errors.extend((name, message) for message in messages)
+        errors.extend(self.check_rules(values))
+        if strict:
+            errors.extend((name, "is not a parameter of the template")
+                          for name in sorted(set(values) - set(self.parameters)))
+        return errors
+
+
+def format_errors(path, errors):
+    return "".join("%s: %s %s\n" % (path, name, message) for name, message in errors)
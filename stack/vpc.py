@@ -1,4 +1,4 @@
-from troposphere import GetAtt, Join, Ref, Sub, Tag, Tags
+from troposphere import Equals, GetAtt, Join, Not, Ref, Sub, Tag, Tags
 from troposphere.ec2 import (
     EIP,
     VPC,
@@ -12,295 +12,309 @@ from troposphere.ec2 import (
     VPCGatewayAttachment
 )
 
-from . import USE_EKS, USE_NAT_GATEWAY
-from .template import template
-from .utils import ParameterWithDefaults as Parameter
-
 # Allows for private IPv4 ranges in the 10.0.0.0/8, 172.16.0.0/12 and 192.168.0.0/16
 # address spaces, with block size between /16 and /28 as allowed by VPCs and subnets.
 PRIVATE_IPV4_CIDR_REGEX = r"^((10\.([0-9]|[1-9][0-9]|1[0-9]{2}|2[0-4][0-9]|25[0-5])\.)|(172\.(1[6-9]|2[0-9]|3[0-1])\.)|192\.168\.)(([0-9]|[1-9][0-9]|1[0-9]{2}|2[0-4][0-9]|25[0-5])\.)([0-9]|[1-9][0-9]|1[0-9]{2}|2[0-4][0-9]|25[0-5])(\/(1[6-9]|2[0-8]))$"  # noqa: E501
 PRIVATE_IPV4_CONSTRAINT = "Must be a private IPv4 range with size /16 and /28."
 
-primary_az = template.add_parameter(
-    Parameter(
-        "PrimaryAZ",
-        Description="The primary availability zone for creating resources.",
-        Type="AWS::EC2::AvailabilityZone::Name",
-    ),
-    group="Global",
-    label="Primary Availability Zone",
-)
-
-
-secondary_az = template.add_parameter(
-    Parameter(
-        "SecondaryAZ",
-        Description="The secondary availability zone for creating resources. Must differ from primary zone.",
-        Type="AWS::EC2::AvailabilityZone::Name",
-    ),
-    group="Global",
-    label="Secondary Availability Zone",
-)
-
-vpc_cidr = template.add_parameter(
-    Parameter(
-        "VpcCidr",
-        Description="The primary IPv4 CIDR block for the VPC. "
-                    "[Possibly not modifiable after stack creation]",
-        Type="String",
-        Default="10.0.0.0/20",
-        AllowedPattern=PRIVATE_IPV4_CIDR_REGEX,
-        ConstraintDescription=PRIVATE_IPV4_CONSTRAINT,
-    ),
-    group="Global",
-    label="VPC IPv4 CIDR Block",
-)
-
-public_subnet_a_cidr = template.add_parameter(
-    Parameter(
-        "PublicSubnetACidr",
-        Description="IPv4 CIDR block for the public subnet in the primary AZ. "
-                    "[Possibly not modifiable after stack creation]",
-        Type="String",
-        Default="10.0.0.0/22",
-        AllowedPattern=PRIVATE_IPV4_CIDR_REGEX,
-        ConstraintDescription=PRIVATE_IPV4_CONSTRAINT,
-    ),
-    group="Global",
-    label="Public Subnet A CIDR Block",
-)
-
-public_subnet_b_cidr = template.add_parameter(
-    Parameter(
-        "PublicSubnetBCidr",
-        Description="IPv4 CIDR block for the public subnet in the secondary AZ. "
-                    "[Possibly not modifiable after stack creation]",
-        Type="String",
-        Default="10.0.4.0/22",
-        AllowedPattern=PRIVATE_IPV4_CIDR_REGEX,
-        ConstraintDescription=PRIVATE_IPV4_CONSTRAINT,
-    ),
-    group="Global",
-    label="Public Subnet B CIDR Block",
-)
 
-private_subnet_a_cidr = template.add_parameter(
-    Parameter(
-        "PrivateSubnetACidr",
-        Description="IPv4 CIDR block for the private subnet in the primary AZ. "
-                    "[Possibly not modifiable after stack creation]",
-        Type="String",
-        Default="10.0.8.0/22",
-        AllowedPattern=PRIVATE_IPV4_CIDR_REGEX,
-        ConstraintDescription=PRIVATE_IPV4_CONSTRAINT,
-    ),
-    group="Global",
-    label="Private Subnet A CIDR Block",
-)
-
-private_subnet_b_cidr = template.add_parameter(
-    Parameter(
-        "PrivateSubnetBCidr",
-        Description="IPv4 CIDR block for the private subnet in the secondary AZ. "
-                    "[Possibly not modifiable after stack creation]",
-        Type="String",
-        Default="10.0.12.0/22",
-        AllowedPattern=PRIVATE_IPV4_CIDR_REGEX,
-        ConstraintDescription=PRIVATE_IPV4_CONSTRAINT,
-    ),
-    group="Global",
-    label="Private Subnet B CIDR Block",
-)
-
-
-vpc = VPC(
-    "Vpc",
-    template=template,
-    CidrBlock=Ref(vpc_cidr),
-    EnableDnsSupport=True,
-    EnableDnsHostnames=True,
-    Tags=Tags(
-        Name=Join("-", [Ref("AWS::StackName"), "vpc"]),
-    ),
-)
+def add_vpc(build):
+    """
+    Add the VPC, its public and private subnets and their routes to the template
+    and return the values that other stack modules use.
+    """
+    template = build.template
+    Parameter = build.Parameter
+    use_eks = "USE_EKS" in build.flags
+    use_nat_gateway = "USE_NAT_GATEWAY" in build.flags
+
+    primary_az = template.add_parameter(
+        Parameter(
+            "PrimaryAZ",
+            Description="The primary availability zone for creating resources.",
+            Type="AWS::EC2::AvailabilityZone::Name",
+        ),
+        group="Global",
+        label="Primary Availability Zone",
+    )
 
+    secondary_az = template.add_parameter(
+        Parameter(
+            "SecondaryAZ",
+            Description="The secondary availability zone for creating resources. Must differ from primary zone.",
+            Type="AWS::EC2::AvailabilityZone::Name",
+        ),
+        group="Global",
+        label="Secondary Availability Zone",
+    )
 
-# Allow outgoing to outside VPC
-internet_gateway = InternetGateway(
-    "InternetGateway",
-    template=template,
-    Tags=Tags(
-        Name=Join("-", [Ref("AWS::StackName"), "igw"]),
-    ),
-)
+    template.add_assertion(
+        "DistinctAvailabilityZones",
+        Not(Equals(Ref(primary_az), Ref(secondary_az))),
+        "SecondaryAZ must differ from PrimaryAZ.",
+    )
 
+    vpc_cidr = template.add_parameter(
+        Parameter(
+            "VpcCidr",
+            Description="The primary IPv4 CIDR block for the VPC. "
+                        "[Possibly not modifiable after stack creation]",
+            Type="String",
+            Default="10.0.0.0/20",
+            AllowedPattern=PRIVATE_IPV4_CIDR_REGEX,
+            ConstraintDescription=PRIVATE_IPV4_CONSTRAINT,
+        ),
+        group="Global",
+        label="VPC IPv4 CIDR Block",
+    )
 
-# Attach Gateway to VPC
-VPCGatewayAttachment(
-    "GatewayAttachement",
-    template=template,
-    VpcId=Ref(vpc),
-    InternetGatewayId=Ref(internet_gateway),
-)
+    public_subnet_a_cidr = template.add_parameter(
+        Parameter(
+            "PublicSubnetACidr",
+            Description="IPv4 CIDR block for the public subnet in the primary AZ. "
+                        "[Possibly not modifiable after stack creation]",
+            Type="String",
+            Default="10.0.0.0/22",
+            AllowedPattern=PRIVATE_IPV4_CIDR_REGEX,
+            ConstraintDescription=PRIVATE_IPV4_CONSTRAINT,
+        ),
+        group="Global",
+        label="Public Subnet A CIDR Block",
+    )
 
+    public_subnet_b_cidr = template.add_parameter(
+        Parameter(
+            "PublicSubnetBCidr",
+            Description="IPv4 CIDR block for the public subnet in the secondary AZ. "
+                        "[Possibly not modifiable after stack creation]",
+            Type="String",
+            Default="10.0.4.0/22",
+            AllowedPattern=PRIVATE_IPV4_CIDR_REGEX,
+            ConstraintDescription=PRIVATE_IPV4_CONSTRAINT,
+        ),
+        group="Global",
+        label="Public Subnet B CIDR Block",
+    )
 
-# Public route table
-public_route_table = RouteTable(
-    "PublicRouteTable",
-    template=template,
-    VpcId=Ref(vpc),
-    Tags=Tags(
-        Name=Join("-", [Ref("AWS::StackName"), "public"]),
-    ),
-)
+    private_subnet_a_cidr = template.add_parameter(
+        Parameter(
+            "PrivateSubnetACidr",
+            Description="IPv4 CIDR block for the private subnet in the primary AZ. "
+                        "[Possibly not modifiable after stack creation]",
+            Type="String",
+            Default="10.0.8.0/22",
+            AllowedPattern=PRIVATE_IPV4_CIDR_REGEX,
+            ConstraintDescription=PRIVATE_IPV4_CONSTRAINT,
+        ),
+        group="Global",
+        label="Private Subnet A CIDR Block",
+    )
 
+    private_subnet_b_cidr = template.add_parameter(
+        Parameter(
+            "PrivateSubnetBCidr",
+            Description="IPv4 CIDR block for the private subnet in the secondary AZ. "
+                        "[Possibly not modifiable after stack creation]",
+            Type="String",
+            Default="10.0.12.0/22",
+            AllowedPattern=PRIVATE_IPV4_CIDR_REGEX,
+            ConstraintDescription=PRIVATE_IPV4_CONSTRAINT,
+        ),
+        group="Global",
+        label="Private Subnet B CIDR Block",
+    )
 
-public_route = Route(
-    "PublicRoute",
-    template=template,
-    GatewayId=Ref(internet_gateway),
-    DestinationCidrBlock="0.0.0.0/0",
-    RouteTableId=Ref(public_route_table),
-)
+    vpc = VPC(
+        "Vpc",
+        template=template,
+        CidrBlock=Ref(vpc_cidr),
+        EnableDnsSupport=True,
+        EnableDnsHostnames=True,
+        Tags=Tags(
+            Name=Join("-", [Ref("AWS::StackName"), "vpc"]),
+        ),
+    )
 
-public_subnet_eks_tags = []
-private_subnet_eks_tags = []
-if USE_EKS:
-    public_subnet_eks_tags.append(Tag("kubernetes.io/role/elb", "1"))
-    # Tag your private subnets so that Kubernetes knows that it can use them for internal load balancers.
-    private_subnet_eks_tags.append(Tag("kubernetes.io/role/internal-elb", "1"))
-
-# Holds load balancer, NAT gateway, and bastion (if specified)
-public_subnet_a = Subnet(
-    "PublicSubnetA",
-    template=template,
-    VpcId=Ref(vpc),
-    CidrBlock=Ref(public_subnet_a_cidr),
-    AvailabilityZone=Ref(primary_az),
-    Tags=Tags(
-        Tag("Name", Join("-", [Ref("AWS::StackName"), "public-a"])),
-        *public_subnet_eks_tags,
-    ),
-)
+    # Allow outgoing to outside VPC
+    internet_gateway = InternetGateway(
+        "InternetGateway",
+        template=template,
+        Tags=Tags(
+            Name=Join("-", [Ref("AWS::StackName"), "igw"]),
+        ),
+    )
 
-SubnetRouteTableAssociation(
-    "PublicSubnetARouteTableAssociation",
-    template=template,
-    RouteTableId=Ref(public_route_table),
-    SubnetId=Ref(public_subnet_a),
-)
+    # Attach Gateway to VPC
+    VPCGatewayAttachment(
+        "GatewayAttachement",
+        template=template,
+        VpcId=Ref(vpc),
+        InternetGatewayId=Ref(internet_gateway),
+    )
 
-public_subnet_b = Subnet(
-    "PublicSubnetB",
-    template=template,
-    VpcId=Ref(vpc),
-    CidrBlock=Ref(public_subnet_b_cidr),
-    AvailabilityZone=Ref(secondary_az),
-    Tags=Tags(
-        Tag("Name", Join("-", [Ref("AWS::StackName"), "public-b"])),
-        *public_subnet_eks_tags,
-    ),
-)
+    # Public route table
+    public_route_table = RouteTable(
+        "PublicRouteTable",
+        template=template,
+        VpcId=Ref(vpc),
+        Tags=Tags(
+            Name=Join("-", [Ref("AWS::StackName"), "public"]),
+        ),
+    )
 
-SubnetRouteTableAssociation(
-    "PublicSubnetBRouteTableAssociation",
-    template=template,
-    RouteTableId=Ref(public_route_table),
-    SubnetId=Ref(public_subnet_b),
-)
+    Route(
+        "PublicRoute",
+        template=template,
+        GatewayId=Ref(internet_gateway),
+        DestinationCidrBlock="0.0.0.0/0",
+        RouteTableId=Ref(public_route_table),
+    )
 
+    public_subnet_eks_tags = []
+    private_subnet_eks_tags = []
+    if use_eks:
+        public_subnet_eks_tags.append(Tag("kubernetes.io/role/elb", "1"))
+        # Tag your private subnets so that Kubernetes knows that it can use them for internal load balancers.
+        private_subnet_eks_tags.append(Tag("kubernetes.io/role/internal-elb", "1"))
 
-if USE_NAT_GATEWAY:
-    # NAT
-    nat_ip = EIP(
-        "NatIp",
+    # Holds load balancer, NAT gateway, and bastion (if specified)
+    public_subnet_a = Subnet(
+        "PublicSubnetA",
         template=template,
-        Domain="vpc",
+        VpcId=Ref(vpc),
+        CidrBlock=Ref(public_subnet_a_cidr),
+        AvailabilityZone=Ref(primary_az),
+        Tags=Tags(
+            Tag("Name", Join("-", [Ref("AWS::StackName"), "public-a"])),
+            *public_subnet_eks_tags,
+        ),
     )
 
-    nat_gateway = NatGateway(
-        "NatGateway",
+    SubnetRouteTableAssociation(
+        "PublicSubnetARouteTableAssociation",
         template=template,
-        AllocationId=GetAtt(nat_ip, "AllocationId"),
+        RouteTableId=Ref(public_route_table),
         SubnetId=Ref(public_subnet_a),
-        Tags=Tags(
-            Name=Join("-", [Ref("AWS::StackName"), "nat"]),
-        ),
     )
 
-    # Private route table
-    nat_gateway_route_table = RouteTable(
-        "NatGatewayRouteTable",
+    public_subnet_b = Subnet(
+        "PublicSubnetB",
         template=template,
         VpcId=Ref(vpc),
+        CidrBlock=Ref(public_subnet_b_cidr),
+        AvailabilityZone=Ref(secondary_az),
         Tags=Tags(
-            Name=Join("-", [Ref("AWS::StackName"), "private"]),
+            Tag("Name", Join("-", [Ref("AWS::StackName"), "public-b"])),
+            *public_subnet_eks_tags,
         ),
     )
 
-    private_nat_route = Route(
-        "NatGatewayRoute",
+    SubnetRouteTableAssociation(
+        "PublicSubnetBRouteTableAssociation",
         template=template,
-        RouteTableId=Ref(nat_gateway_route_table),
-        DestinationCidrBlock="0.0.0.0/0",
-        NatGatewayId=Ref(nat_gateway),
+        RouteTableId=Ref(public_route_table),
+        SubnetId=Ref(public_subnet_b),
     )
 
-    private_route_table = Ref(nat_gateway_route_table)
-
-    # Add a VPC Endpoint for S3 so we can talk directly to S3
-    # (without going through NAT gateway)
-    VPCEndpoint(
-        "VPCS3Endpoint",
+    if use_nat_gateway:
+        # NAT
+        nat_ip = EIP(
+            "NatIp",
+            template=template,
+            Domain="vpc",
+        )
+
+        nat_gateway = NatGateway(
+            "NatGateway",
+            template=template,
+            AllocationId=GetAtt(nat_ip, "AllocationId"),
+            SubnetId=Ref(public_subnet_a),
+            Tags=Tags(
+                Name=Join("-", [Ref("AWS::StackName"), "nat"]),
+            ),
+        )
+
+        # Private route table
+        nat_gateway_route_table = RouteTable(
+            "NatGatewayRouteTable",
+            template=template,
+            VpcId=Ref(vpc),
+            Tags=Tags(
+                Name=Join("-", [Ref("AWS::StackName"), "private"]),
+            ),
+        )
+
+        Route(
+            "NatGatewayRoute",
+            template=template,
+            RouteTableId=Ref(nat_gateway_route_table),
+            DestinationCidrBlock="0.0.0.0/0",
+            NatGatewayId=Ref(nat_gateway),
+        )
+
+        private_route_table = Ref(nat_gateway_route_table)
+
+        # Add a VPC Endpoint for S3 so we can talk directly to S3
+        # (without going through NAT gateway)
+        VPCEndpoint(
+            "VPCS3Endpoint",
+            template=template,
+            ServiceName=Sub("com.amazonaws.${AWS::Region}.s3"),
+            VpcId=Ref(vpc),
+            RouteTableIds=[private_route_table],
+        )
+    else:
+        private_route_table = Ref(public_route_table)
+
+    # Holds backend instances
+    private_subnet_a = Subnet(
+        "PrivateSubnetA",
         template=template,
-        ServiceName=Sub("com.amazonaws.${AWS::Region}.s3"),
         VpcId=Ref(vpc),
-        RouteTableIds=[private_route_table],
+        CidrBlock=Ref(private_subnet_a_cidr),
+        MapPublicIpOnLaunch=not use_nat_gateway,
+        AvailabilityZone=Ref(primary_az),
+        Tags=Tags(
+            Tag("Name", Join("-", [Ref("AWS::StackName"), "private-a"])),
+            *private_subnet_eks_tags,
+        ),
     )
-else:
-    private_route_table = Ref(public_route_table)
-
-
-# Holds backend instances
-private_subnet_a = Subnet(
-    "PrivateSubnetA",
-    template=template,
-    VpcId=Ref(vpc),
-    CidrBlock=Ref(private_subnet_a_cidr),
-    MapPublicIpOnLaunch=not USE_NAT_GATEWAY,
-    AvailabilityZone=Ref(primary_az),
-    Tags=Tags(
-        Tag("Name", Join("-", [Ref("AWS::StackName"), "private-a"])),
-        *private_subnet_eks_tags,
-    ),
-)
-
-
-SubnetRouteTableAssociation(
-    "PrivateSubnetARouteTableAssociation",
-    template=template,
-    SubnetId=Ref(private_subnet_a),
-    RouteTableId=private_route_table,
-)
 
+    SubnetRouteTableAssociation(
+        "PrivateSubnetARouteTableAssociation",
+        template=template,
+        SubnetId=Ref(private_subnet_a),
+        RouteTableId=private_route_table,
+    )
 
-private_subnet_b = Subnet(
-    "PrivateSubnetB",
-    template=template,
-    VpcId=Ref(vpc),
-    CidrBlock=Ref(private_subnet_b_cidr),
-    MapPublicIpOnLaunch=not USE_NAT_GATEWAY,
-    AvailabilityZone=Ref(secondary_az),
-    Tags=Tags(
-        Tag("Name", Join("-", [Ref("AWS::StackName"), "private-b"])),
-        *private_subnet_eks_tags,
-    ),
-)
+    private_subnet_b = Subnet(
+        "PrivateSubnetB",
+        template=template,
+        VpcId=Ref(vpc),
+        CidrBlock=Ref(private_subnet_b_cidr),
+        MapPublicIpOnLaunch=not use_nat_gateway,
+        AvailabilityZone=Ref(secondary_az),
+        Tags=Tags(
+            Tag("Name", Join("-", [Ref("AWS::StackName"), "private-b"])),
+            *private_subnet_eks_tags,
+        ),
+    )
 
+    SubnetRouteTableAssociation(
+        "PrivateSubnetBRouteTableAssociation",
+        template=template,
+        SubnetId=Ref(private_subnet_b),
+        RouteTableId=private_route_table,
+    )
 
-SubnetRouteTableAssociation(
-    "PrivateSubnetBRouteTableAssociation",
-    template=template,
-    SubnetId=Ref(private_subnet_b),
-    RouteTableId=private_route_table,
-)
+    return dict(
+        primary_az=primary_az,
+        private_subnet_a=private_subnet_a,
+        private_subnet_a_cidr=private_subnet_a_cidr,
+        private_subnet_b=private_subnet_b,
+        private_subnet_b_cidr=private_subnet_b_cidr,
+        public_subnet_a=public_subnet_a,
+        public_subnet_b=public_subnet_b,
+        secondary_az=secondary_az,
+        vpc=vpc,
+    )
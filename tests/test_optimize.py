@@ -0,0 +1,180 @@
+import hashlib
+import json
+
+import pytest
+from troposphere import Template
+
+from stack.build import VARIANTS, build_template
+from stack.optimize import NO_VALUE, ConstantFolder, fold_constants, single_key
+
+
+def join(delimiter, items):
+    return {"Fn::Join": [delimiter, items]}
+
+
+def ref(name):
+    return {"Ref": name}
+
+
+def test_join_of_literals():
+    assert fold_constants(join("", ["arn:aws:s3:::", "bucket"])) == "arn:aws:s3:::bucket"
+    assert fold_constants(join(",", [])) == ""
+
+
+def test_join_of_dynamic_parts_joins_adjacent_literals():
+    expr = join("-", ["a", "b", ref("AWS::StackName"), "c", "d"])
+    assert fold_constants(expr) == join("-", ["a-b", ref("AWS::StackName"), "c-d"])
+
+
+def test_join_of_a_list_parameter_is_unchanged():
+    expr = join(",", ref("Subnets"))
+    assert fold_constants(expr) == expr
+
+
+def test_split():
+    assert fold_constants({"Fn::Split": [",", "a,b,c"]}) == ["a", "b", "c"]
+    expr = {"Fn::Split": [",", ref("Subnets")]}
+    assert fold_constants(expr) == expr
+
+
+def test_select():
+    assert fold_constants({"Fn::Select": [1, ["a", "b"]]}) == "b"
+    assert fold_constants({"Fn::Select": ["0", {"Fn::Split": [",", "a,b"]}]}) == "a"
+    assert fold_constants({"Fn::Select": [0, join("", ["a", "b"])]}) == {"Fn::Select": [0, "ab"]}
+    # an index out of range is left for CloudFormation to reject
+    assert fold_constants({"Fn::Select": [2, ["a", "b"]]}) == {"Fn::Select": [2, ["a", "b"]]}
+    expr = {"Fn::Select": [0, {"Fn::GetAZs": ""}]}
+    assert fold_constants(expr) == expr
+
+
+def test_nested_join_with_the_same_delimiter_is_spliced():
+    expr = join("/", ["a", join("/", ["b", ref("Name")]), join("/", [ref("Other"), "c"]), "d"])
+    assert fold_constants(expr) == join("/", ["a/b", ref("Name"), ref("Other"), "c/d"])
+
+
+def test_nested_join_with_another_delimiter_is_kept():
+    expr = join("/", ["a", join("-", ["b", ref("Name")])])
+    assert fold_constants(expr) == expr
+
+
+def test_nested_constant_join_is_folded_first():
+    expr = join("", ["arn:", join(":", ["aws", "s3"]), ":::", ref("Bucket")])
+    assert fold_constants(expr) == join("", ["arn:aws:s3:::", ref("Bucket")])
+
+
+def test_no_value_is_removed():
+    data = {
+        "Properties": {"KeyName": NO_VALUE, "Tags": [NO_VALUE, {"Key": "a", "Value": "b"}]},
+        "Other": NO_VALUE,
+    }
+    assert fold_constants(data) == {"Properties": {"Tags": [{"Key": "a", "Value": "b"}]}}
+
+
+def test_unknown_if_is_preserved():
+    expr = {"Fn::If": ["Condition", NO_VALUE, join("", ["a", "b"])]}
+    # the AWS::NoValue branch isn't removed, and the branches are folded
+    assert fold_constants(expr) == {"Fn::If": ["Condition", NO_VALUE, "ab"]}
+    assert fold_constants({"KeyName": expr}) == {"KeyName": {"Fn::If": ["Condition", NO_VALUE, "ab"]}}
+    # nor is an Fn::If whose condition isn't known folded into a literal
+    expr = join("", ["a", {"Fn::If": ["Condition", "b", "c"]}])
+    assert fold_constants(expr) == expr
+
+
+def test_known_refs_and_conditions():
+    class Folder(ConstantFolder):
+        def ref(self, name):
+            return (True, "value") if name == "Known" else (False, None)
+
+        def condition(self, name):
+            return {"Yes": True, "No": False}.get(name)
+
+    folder = Folder()
+    assert folder.fold(join("-", [ref("Known"), ref("Unknown")])) == join("-", ["value", ref("Unknown")])
+    assert folder.fold({"Fn::If": ["Yes", join("", ["a", ref("Known")]), "b"]}) == "avalue"
+    assert folder.fold({"Key": {"Fn::If": ["No", "a", NO_VALUE]}}) == {}
+    assert folder.fold(join("", ["a", {"Fn::If": ["Yes", "b", "c"]}])) == "ab"
+
+
+class Evaluator(object):
+    """
+    Evaluates a template value as CloudFormation would for the given condition
+    values, with everything that's only known when the stack is created (Refs to
+    parameters and resources, Fn::GetAtt, etc.) as an opaque string, so that
+    a value and its folded copy can be compared.
+    """
+
+    def __init__(self, condition):
+        self.condition = condition
+
+    def opaque(self, expr):
+        text = json.dumps(expr, sort_keys=True)
+        return "<%s>" % hashlib.sha1(text.encode()).hexdigest()
+
+    def string(self, value):
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, (int, float)):
+            return str(value)
+        return value
+
+    def evaluate(self, value):
+        if isinstance(value, list):
+            items = [self.evaluate(item) for item in value]
+            return [item for item in items if item is not NO_VALUE]
+        if not isinstance(value, dict):
+            return value
+        key = single_key(value)
+        if key == "Ref" and value[key] == "AWS::NoValue":
+            return NO_VALUE
+        if key == "Fn::If":
+            name, if_true, if_false = value[key]
+            return self.evaluate(if_true if self.condition(name) else if_false)
+        evaluated = {}
+        for k, v in value.items():
+            v = self.evaluate(v)
+            if v is not NO_VALUE:
+                evaluated[k] = v
+        if key == "Fn::Join":
+            delimiter, items = evaluated[key]
+            if isinstance(items, list):
+                items = [self.string(item) for item in items]
+                if all(isinstance(item, str) for item in items):
+                    return delimiter.join(items)
+        elif key == "Fn::Split":
+            delimiter, source = evaluated[key]
+            if isinstance(source, str) and not source.startswith("<"):
+                return source.split(delimiter)
+        elif key == "Fn::Select":
+            index, items = evaluated[key]
+            if isinstance(items, list) and int(index) < len(items):
+                return items[int(index)]
+        if key is not None and (key == "Ref" or key.startswith("Fn::")):
+            return self.opaque(evaluated)
+        return evaluated
+
+
+@pytest.fixture(scope="module", params=list(VARIANTS))
+def variant_dicts(request):
+    template = build_template(VARIANTS[request.param])
+    folded = template.to_dict()
+    # the same dictionary without the constants folded
+    unfolded = Template.to_dict(template)
+    return folded, unfolded
+
+
+def test_variant_folding_is_idempotent(variant_dicts):
+    folded, _ = variant_dicts
+    assert fold_constants(folded) == folded
+
+
+@pytest.mark.parametrize("conditions", ["true", "false", "mixed"])
+def test_variant_folding_is_equivalent(variant_dicts, conditions):
+    folded, unfolded = variant_dicts
+
+    def condition(name):
+        if conditions == "mixed":
+            return hashlib.sha1(name.encode()).digest()[0] % 2 == 0
+        return conditions == "true"
+
+    evaluator = Evaluator(condition)
+    assert evaluator.evaluate(folded) == evaluator.evaluate(unfolded)
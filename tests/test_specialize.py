@@ -0,0 +1,188 @@
+import pytest
+
+from stack.build import VARIANTS, build_template
+from stack.optimize import NO_VALUE
+from stack.specialize import (
+    Specializer,
+    parameter_value,
+    references,
+    specialize
+)
+
+
+def ref(name):
+    return {"Ref": name}
+
+
+def equals(a, b):
+    return {"Fn::Equals": [a, b]}
+
+
+def not_(expr):
+    return {"Fn::Not": [expr]}
+
+
+def template_dict():
+    return {
+        "Parameters": {
+            "CacheNodeType": {"Type": "String", "Default": "cache.t3.micro"},
+            "DomainName": {"Type": "String"},
+            "Subnets": {"Type": "CommaDelimitedList"},
+            "UseCloudFront": {"Type": "String", "Default": "true"},
+        },
+        "Conditions": {
+            "CacheCondition": not_(equals(ref("CacheNodeType"), "(none)")),
+            "CloudFrontCondition": equals(ref("UseCloudFront"), "true"),
+            "DomainCondition": not_(equals(ref("DomainName"), "")),
+            "CloudFrontDomainCondition": {"Fn::And": [
+                {"Condition": "CloudFrontCondition"},
+                {"Condition": "DomainCondition"},
+            ]},
+            "GovCloudCondition": equals(ref("AWS::Region"), "us-gov-west-1"),
+        },
+        "Resources": {
+            "CacheCluster": {
+                "Condition": "CacheCondition",
+                "Type": "AWS::ElastiCache::CacheCluster",
+                "Properties": {"CacheNodeType": ref("CacheNodeType")},
+            },
+            "Distribution": {
+                "Condition": "CloudFrontCondition",
+                "Type": "AWS::CloudFront::Distribution",
+                "Properties": {
+                    "Aliases": {"Fn::If": ["CloudFrontDomainCondition", [ref("DomainName")], NO_VALUE]},
+                    "Origin": {"Fn::Join": ["", ["bucket.", {"Fn::If": [
+                        "GovCloudCondition", "s3-us-gov-west-1", "s3",
+                    ]}, ".amazonaws.com"]]},
+                },
+            },
+            "Instance": {
+                "Type": "AWS::EC2::Instance",
+                "DependsOn": ["CacheCluster"],
+                "Properties": {"SubnetId": {"Fn::Select": [0, ref("Subnets")]}},
+            },
+        },
+        "Outputs": {
+            "CacheAddress": {
+                "Condition": "CacheCondition",
+                "Value": {"Fn::GetAtt": ["CacheCluster", "RedisEndpoint.Address"]},
+            },
+        },
+        "Rules": {
+            "CacheNodeTypeRule": {
+                "Assertions": [{
+                    "Assert": not_(equals(ref("CacheNodeType"), "")),
+                    "AssertDescription": "CacheNodeType must not be blank",
+                }],
+            },
+        },
+        "Metadata": {
+            "AWS::CloudFormation::Interface": {
+                "ParameterGroups": [
+                    {"Label": {"default": "Cache"}, "Parameters": ["CacheNodeType"]},
+                    {"Label": {"default": "Global"}, "Parameters": ["DomainName", "Subnets", "UseCloudFront"]},
+                ],
+                "ParameterLabels": {"CacheNodeType": {"default": "Cache Node Type"}},
+            },
+        },
+    }
+
+
+def test_parameter_value():
+    assert parameter_value({"Type": "Number"}, 3) == "3"
+    assert parameter_value({"Type": "String"}, True) == "true"
+    assert parameter_value({"Type": "CommaDelimitedList"}, "a, b") == ["a", "b"]
+    assert parameter_value({"Type": "CommaDelimitedList"}, "") == []
+    assert parameter_value({"Type": "List<AWS::EC2::Subnet::Id>"}, ["a", "b"]) == ["a", "b"]
+
+
+def test_conditions():
+    specializer = Specializer(template_dict(), {"CacheNodeType": "(none)", "UseCloudFront": True})
+    assert specializer.condition("CacheCondition") is False
+    assert specializer.condition("CloudFrontCondition") is True
+    assert specializer.condition("DomainCondition") is None
+    assert specializer.condition("CloudFrontDomainCondition") is None
+    assert specializer.condition("GovCloudCondition") is None
+    specializer = Specializer(template_dict(), {"UseCloudFront": "false"})
+    # And is false if any of its operands is, even if the others aren't known
+    assert specializer.condition("CloudFrontDomainCondition") is False
+
+
+def test_values_for_unknown_parameters_are_ignored():
+    specializer = Specializer(template_dict(), {"NotAParameter": "value"})
+    assert specializer.values == {}
+
+
+def test_specialize_removes_resources_whose_condition_is_false():
+    data, removed = specialize(template_dict(), {"CacheNodeType": "(none)"})
+    assert "CacheCluster" not in data["Resources"]
+    assert "CacheAddress" not in data["Outputs"]
+    # and the dependencies on them
+    assert "DependsOn" not in data["Resources"]["Instance"]
+    assert "CacheCondition" not in data["Conditions"]
+    assert "CacheNodeType" not in data["Parameters"]
+    assert "CacheNodeTypeRule" not in data.get("Rules", {})
+    assert data["Metadata"]["AWS::CloudFormation::Interface"] == {
+        "ParameterGroups": [
+            {"Label": {"default": "Global"}, "Parameters": ["DomainName", "Subnets", "UseCloudFront"]},
+        ],
+        "ParameterLabels": {},
+    }
+    assert removed == {"Parameters": 1, "Rules": 1, "Conditions": 1, "Resources": 1, "Outputs": 1}
+
+
+def test_specialize_folds_references_and_conditions():
+    data, removed = specialize(template_dict(), {
+        "CacheNodeType": "cache.t3.small",
+        "DomainName": "",
+        "Subnets": "subnet-1,subnet-2",
+    })
+    resources = data["Resources"]
+    assert "Condition" not in resources["CacheCluster"]
+    assert resources["CacheCluster"]["Properties"] == {"CacheNodeType": "cache.t3.small"}
+    assert resources["Instance"]["Properties"] == {"SubnetId": "subnet-1"}
+    # CloudFrontDomainCondition is false, so the Aliases property is removed
+    assert "Aliases" not in resources["Distribution"]["Properties"]
+    # conditions that depend on other parameters or pseudo parameters are kept
+    assert resources["Distribution"]["Condition"] == "CloudFrontCondition"
+    assert resources["Distribution"]["Properties"]["Origin"] == {"Fn::Join": ["", [
+        "bucket.", {"Fn::If": ["GovCloudCondition", "s3-us-gov-west-1", "s3"]}, ".amazonaws.com",
+    ]]}
+    assert set(data["Conditions"]) == {"CloudFrontCondition", "GovCloudCondition"}
+    assert set(data["Parameters"]) == {"UseCloudFront"}
+    assert "Rules" not in data
+    assert removed["Parameters"] == 3
+
+
+def test_specialize_simplifies_conditions():
+    data, _ = specialize(template_dict(), {"UseCloudFront": "true"})
+    # the known operand of the And is removed, and a condition can't just refer to another
+    assert data["Conditions"]["CloudFrontDomainCondition"] == not_(equals(ref("DomainName"), ""))
+    assert data["Resources"]["Distribution"]["Properties"]["Aliases"] == {
+        "Fn::If": ["CloudFrontDomainCondition", [ref("DomainName")], NO_VALUE],
+    }
+
+
+def test_specialize_keeps_the_unknown_if():
+    data, _ = specialize(template_dict(), {})
+    assert data["Resources"] == template_dict()["Resources"]
+    assert data["Conditions"] == template_dict()["Conditions"]
+
+
+def test_specialize_rejects_values_that_break_a_rule():
+    with pytest.raises(ValueError, match="CacheNodeType must not be blank"):
+        specialize(template_dict(), {"CacheNodeType": ""})
+
+
+@pytest.mark.parametrize("variant", list(VARIANTS))
+def test_specialize_variant_for_the_defaults(variant):
+    data = build_template(VARIANTS[variant]).to_dict()
+    defaults = dict(
+        (name, parameter["Default"]) for name, parameter in data.get("Parameters", {}).items()
+        if "Default" in parameter
+    )
+    specialized, removed = specialize(data, defaults)
+    refs, conditions = references([specialized.get(s) for s in ("Resources", "Outputs", "Rules", "Conditions")])
+    assert not (refs & set(defaults)) - set(specialized.get("Parameters", {}))
+    assert conditions <= set(specialized.get("Conditions", {}))
+    assert removed["Parameters"] > 0 or not defaults